@@ -256,3 +256,28 @@ def fetch_rsrp_data_by_site_id(site_id, zte_rsrp_df, huawei_rsrp_df):
     return site_info
 
 
+
+
+RSRP_RANGE_COLUMNS = [
+    ('RSRP Range 1 (>-105dBm) %', 'RSRP Range 1 (>-105dBm) %'),
+    ('RSRP Range 2 (-105~-110dBm) %', 'RSRP Range 2 (-105~-110dBm) %'),
+    ('RSRP Range 3 (-110~-115dBm) %', 'RSRP Range 3 (-110~-115dBm) %'),
+    ('RSRP < -115dBm', 'RSRP < -115dBm %'),
+]
+
+def iter_rsrp_export_frames(zte_rsrp_df, huawei_rsrp_df, site_id=None):
+    """Yield one normalized RSRP frame per vendor (ZTE fractions scaled to %), vectorized"""
+    for source, vendor_df, scale in (('ZTE', zte_rsrp_df, 100), ('Huawei', huawei_rsrp_df, 1)):
+        if vendor_df is None or vendor_df.empty:
+            continue
+        if site_id:
+            vendor_df = vendor_df[vendor_df['Site_ID'].astype(str) == str(site_id)[:6]]
+        frame = pd.DataFrame({
+            'Site_Name': vendor_df['Site Name'],
+            'Cell_Name': vendor_df['Cell Name'],
+            'Site_ID': vendor_df['Site_ID'],
+        })
+        for src_col, out_col in RSRP_RANGE_COLUMNS:
+            frame[out_col] = (pd.to_numeric(vendor_df[src_col], errors='coerce') * scale).round(2)
+        frame['Source'] = source
+        yield frame
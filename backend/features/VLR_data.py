@@ -1,28 +1,92 @@
 # Add missing pandas import
+import os
+import numpy as np
 import pandas as pd
-#user count by site
-def get_user_count(month=None, district=None, USAGE_FILES=None, VLRD=None, ref_df=None):
-    df_list = []
-    for m, file_info in USAGE_FILES.items():
-        if month and m != month:
-            continue
-        df = pd.read_csv(file_info['filename'], sep="\t", dtype={"MSISDN": str})
-        df.columns = [col.strip().upper() for col in df.columns]
-        df["Month"] = m
-        df_list.append(df)
-    if not df_list or "MSISDN" not in VLRD.columns:
-        return pd.DataFrame()
-    usage_all = pd.concat(df_list, ignore_index=True)
-    usage_all["MSISDN"] = usage_all["MSISDN"].astype(str)
-    VLRD["MSISDN"] = VLRD["MSISDN"].astype(str)
-    merged_df = pd.merge(usage_all, VLRD, on="MSISDN", how="inner")
-    merged_df["SITE_ID"] = merged_df["CELL_CODE"].astype(str).str[:6]
-    if district:
-        district_upper = district.upper()
+from block_store import open_data_file
+#precomputed distinct-user cube
+_cube_cache = {}
+
+def _resolve_district(district, ref_df):
+    """Map a district or site name search term to an upper-case district name"""
+    district_upper = district.upper()
+    if ref_df is not None and not ref_df.empty:
         sitename_match = ref_df[ref_df["sitename"].str.upper() == district_upper]
         if not sitename_match.empty:
             district_upper = sitename_match.iloc[0]["district"].upper()
-        merged_df = merged_df[merged_df["DISTRICT"].str.upper() == district_upper]
-    result_df = merged_df.groupby(['DISTRICT', 'SITE_ID'])['MSISDN'].nunique().reset_index()
-    result_df.rename(columns={'MSISDN': 'User_Count'}, inplace=True)
-    return result_df.sort_values(by='User_Count', ascending=False)
\ No newline at end of file
+    return district_upper
+
+def _usage_files_version(USAGE_FILES):
+    version = []
+    for m, file_info in sorted(USAGE_FILES.items()):
+        try:
+            version.append((m, file_info['filename'], os.path.getmtime(file_info['filename'])))
+        except OSError:
+            version.append((m, file_info['filename'], None))
+    return tuple(version)
+
+def build_user_count_cube(USAGE_FILES, VLRD):
+    """Precompute sorted MSISDN sets per (month, district, site) plus ready-made count tables"""
+    sets = {}
+    if VLRD is not None and "MSISDN" in VLRD.columns:
+        vlrd = pd.DataFrame({
+            "MSISDN": pd.to_numeric(VLRD["MSISDN"], errors="coerce"),
+            "DISTRICT": VLRD["DISTRICT"],
+            "SITE_ID": VLRD["CELL_CODE"].astype(str).str[:6],
+        }).dropna(subset=["MSISDN"])
+        vlrd["MSISDN"] = vlrd["MSISDN"].astype(np.int64)
+        for m, file_info in USAGE_FILES.items():
+            with open_data_file(file_info['filename']) as f:
+                usage = pd.read_csv(f, sep="\t", dtype=str)
+            usage.columns = [col.strip().upper() for col in usage.columns]
+            msisdns = pd.to_numeric(usage["MSISDN"], errors="coerce").dropna().astype(np.int64)
+            merged = vlrd[vlrd["MSISDN"].isin(msisdns.unique())]
+            merged = merged.drop_duplicates().sort_values(["DISTRICT", "SITE_ID", "MSISDN"], kind="mergesort")
+            for (district, site_id), group in merged.groupby(["DISTRICT", "SITE_ID"], sort=False):
+                sets.setdefault((district, site_id), {})[m] = group["MSISDN"].to_numpy(dtype=np.int64)
+
+    cube = {
+        'months': list(USAGE_FILES.keys()),
+        'sets': sets,
+        'tables': {},
+        'version': _usage_files_version(USAGE_FILES),
+    }
+    # Single-month and all-months tables answer the UI without touching the sets
+    for m in cube['months']:
+        cube['tables'][m] = union_user_count(cube, [m])
+    cube['tables'][None] = union_user_count(cube, cube['months'])
+    print(f"[USER COUNT CUBE] Built {len(sets)} district/site cells over {len(cube['months'])} months")
+    return cube
+
+def union_user_count(cube, months, district_upper=None):
+    """Exact distinct-user counts per district/site over the union of the given months"""
+    rows = []
+    for (district, site_id), month_sets in cube['sets'].items():
+        if district_upper and str(district).upper() != district_upper:
+            continue
+        arrays = [month_sets[m] for m in months if m in month_sets]
+        if not arrays:
+            continue
+        count = len(arrays[0]) if len(arrays) == 1 else len(np.unique(np.concatenate(arrays)))
+        rows.append((district, site_id, count))
+    result_df = pd.DataFrame(rows, columns=['DISTRICT', 'SITE_ID', 'User_Count'])
+    return result_df.sort_values(by='User_Count', ascending=False, kind='mergesort').reset_index(drop=True)
+
+def get_user_count_cube(USAGE_FILES, VLRD):
+    """Return the cached cube, rebuilding it only when the USERTD files change"""
+    version = _usage_files_version(USAGE_FILES)
+    cube = _cube_cache.get('cube')
+    if cube is None or cube['version'] != version:
+        cube = build_user_count_cube(USAGE_FILES, VLRD)
+        _cube_cache['cube'] = cube
+    return cube
+
+def query_user_count_cube(cube, month=None, district=None, ref_df=None):
+    """Answer a /user_count style query (month/district filters) from the cube"""
+    month = month or None
+    if month is not None and month not in cube['tables']:
+        return pd.DataFrame(columns=['DISTRICT', 'SITE_ID', 'User_Count'])
+    table = cube['tables'][month]
+    if district:
+        district_upper = _resolve_district(district, ref_df)
+        table = table[table['DISTRICT'].astype(str).str.upper() == district_upper]
+    return table
@@ -0,0 +1,263 @@
+# block_store.py
+"""
+Block-compressed (BGZF) storage for the session dumps and USERTD usage files.
+
+Each file is written as a series of independently deflated gzip members that
+carry the BGZF 'BC' extra field, so the result is still a valid .gz file that
+`gzip -d` can read. Blocks always end on a line boundary, and a sidecar
+`<file>.gzi` JSON index records the block offsets plus a key -> block map, so
+a single MSISDN lookup only inflates the block(s) holding that key.
+"""
+import io
+import json
+import os
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+BLOCK_EXTENSION = '.bgz'
+INDEX_EXTENSION = '.gzi'
+MAX_BLOCK_INPUT = 0xff00  # same input limit as samtools/htslib BGZF
+COMPRESS_LEVEL = 6
+
+_HEADER = struct.Struct('<4BI2BH2BHH')  # gzip header + BC subfield, BSIZE last
+_TRAILER = struct.Struct('<II')  # CRC32, ISIZE
+_EOF_BLOCK = bytes.fromhex('1f8b08040000000000ff0600424302001b0003000000000000000000')
+
+# Layout of the text dumps we know how to index by MSISDN
+FILE_LAYOUTS = {
+    'All_': {'sep': ';', 'key_column': 1, 'has_header': False},
+    'USERTD_': {'sep': '\t', 'key_column': 0, 'has_header': True},
+}
+
+_index_cache = {}
+
+
+def is_block_file(path):
+    return str(path).endswith(BLOCK_EXTENSION)
+
+
+def resolve_data_file(path):
+    """Prefer the block-compressed copy of a data file when one exists"""
+    if is_block_file(path):
+        return path
+    block_path = path + BLOCK_EXTENSION
+    if os.path.exists(block_path) and os.path.exists(block_path + INDEX_EXTENSION):
+        return block_path
+    return path
+
+
+def layout_for(path):
+    name = os.path.basename(path)
+    for prefix, layout in FILE_LAYOUTS.items():
+        if name.startswith(prefix):
+            return layout
+    return {'sep': None, 'key_column': None, 'has_header': False}
+
+
+def _pack_block(data):
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, -15)
+    cdata = compressor.compress(data) + compressor.flush()
+    block_size = _HEADER.size + len(cdata) + _TRAILER.size
+    header = _HEADER.pack(31, 139, 8, 4, 0, 0, 255, 6, 66, 67, 2, block_size - 1)
+    return header + cdata + _TRAILER.pack(zlib.crc32(data) & 0xffffffff, len(data))
+
+
+def _line_key(line, sep, key_column):
+    if sep is None or key_column is None:
+        return None
+    columns = line.rstrip(b'\r\n').split(sep.encode())
+    if len(columns) <= key_column:
+        return None
+    key = columns[key_column].strip()
+    return key.decode('utf-8', 'replace') if key else None
+
+
+def compress_file(src_path, dst_path=None, sep=None, key_column=None, has_header=None):
+    """Write src_path as a BGZF file plus its block/key index and return the new path"""
+    layout = layout_for(src_path)
+    sep = layout['sep'] if sep is None else sep
+    key_column = layout['key_column'] if key_column is None else key_column
+    has_header = layout['has_header'] if has_header is None else has_header
+    dst_path = dst_path or src_path + BLOCK_EXTENSION
+
+    blocks = []
+    keys = {}
+    header_line = None
+    pending = []
+    pending_size = 0
+    offset = 0
+
+    tmp_path = dst_path + '.tmp'
+    with open(src_path, 'rb') as src, open(tmp_path, 'wb') as dst:
+        def flush():
+            nonlocal pending, pending_size, offset
+            if not pending:
+                return
+            data = b''.join(pending)
+            block = _pack_block(data)
+            dst.write(block)
+            blocks.append([offset, len(block), len(data), len(pending)])
+            offset += len(block)
+            pending = []
+            pending_size = 0
+
+        for line_no, line in enumerate(src):
+            if len(line) > MAX_BLOCK_INPUT:
+                raise ValueError(f"Line {line_no + 1} of {src_path} exceeds the BGZF block size")
+            if pending_size + len(line) > MAX_BLOCK_INPUT:
+                flush()
+            if line_no == 0 and has_header:
+                header_line = line.decode('utf-8', 'replace').rstrip('\r\n')
+            else:
+                key = _line_key(line, sep, key_column)
+                if key is not None:
+                    block_ids = keys.setdefault(key, [])
+                    if not block_ids or block_ids[-1] != len(blocks):
+                        block_ids.append(len(blocks))
+            pending.append(line)
+            pending_size += len(line)
+        flush()
+        dst.write(_EOF_BLOCK)
+    os.replace(tmp_path, dst_path)
+
+    index = {
+        'version': 1,
+        'source': os.path.basename(src_path),
+        'sep': sep,
+        'key_column': key_column,
+        'header': header_line,
+        'blocks': blocks,
+        'keys': keys,
+    }
+    tmp_index = dst_path + INDEX_EXTENSION + '.tmp'
+    with open(tmp_index, 'w') as f:
+        json.dump(index, f, separators=(',', ':'))
+    os.replace(tmp_index, dst_path + INDEX_EXTENSION)
+    _index_cache.pop(dst_path, None)
+    return dst_path
+
+
+def load_block_index(path):
+    """Load (and cache per mtime) the sidecar index of a block file"""
+    index_path = path + INDEX_EXTENSION
+    mtime = os.path.getmtime(index_path)
+    cached = _index_cache.get(path)
+    if cached and cached['_mtime'] == mtime:
+        return cached
+    with open(index_path) as f:
+        index = json.load(f)
+    index['_mtime'] = mtime
+    _index_cache[path] = index
+    return index
+
+
+def _inflate(raw):
+    cdata = raw[_HEADER.size:-_TRAILER.size]
+    crc, size = _TRAILER.unpack(raw[-_TRAILER.size:])
+    data = zlib.decompress(cdata, -15)
+    if len(data) != size or (zlib.crc32(data) & 0xffffffff) != crc:
+        raise IOError("Corrupt BGZF block")
+    return data
+
+
+def read_block(path, block_no, index=None):
+    """Decompress a single block by number"""
+    index = index or load_block_index(path)
+    offset, csize, _, _ = index['blocks'][block_no]
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        return _inflate(f.read(csize))
+
+
+def lookup_lines(path, key):
+    """Return the text lines whose key column equals key, inflating only the blocks that hold it"""
+    index = load_block_index(path)
+    block_ids = index['keys'].get(str(key), [])
+    if not block_ids:
+        return []
+    sep = index['sep'].encode()
+    key_column = index['key_column']
+    key_bytes = str(key).encode()
+    lines = []
+    with open(path, 'rb') as f:
+        for block_no in block_ids:
+            offset, csize, _, _ = index['blocks'][block_no]
+            f.seek(offset)
+            for line in _inflate(f.read(csize)).splitlines(keepends=True):
+                columns = line.rstrip(b'\r\n').split(sep)
+                if len(columns) > key_column and columns[key_column].strip() == key_bytes:
+                    lines.append(line.decode('utf-8', 'replace'))
+    return lines
+
+
+def iter_blocks(path, workers=None):
+    """Yield decompressed blocks in file order, inflating up to `workers` blocks in parallel.
+
+    zlib releases the GIL while inflating, so a thread pool spreads the work
+    across cores without pickling block data between processes.
+    """
+    index = load_block_index(path)
+    workers = workers or os.cpu_count() or 1
+    window = workers * 2
+
+    def raw_blocks():
+        with open(path, 'rb') as f:
+            for offset, csize, _, _ in index['blocks']:
+                f.seek(offset)
+                yield f.read(csize)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = []
+        for raw in raw_blocks():
+            pending.append(pool.submit(_inflate, raw))
+            if len(pending) >= window:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+
+
+class _BlockStream(io.RawIOBase):
+    """Read-only byte stream over the decompressed contents of a block file"""
+
+    def __init__(self, path, workers=None):
+        self._blocks = iter_blocks(path, workers)
+        self._buffer = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer:
+            try:
+                self._buffer = next(self._blocks)
+            except StopIteration:
+                return 0
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+    def close(self):
+        self._blocks.close()
+        super().close()
+
+
+def open_data_file(path, workers=None):
+    """Open a plain or block-compressed data file as a text stream (usable by pd.read_csv)"""
+    if is_block_file(path):
+        return io.TextIOWrapper(io.BufferedReader(_BlockStream(path, workers)), encoding='utf-8')
+    return open(path, 'r')
+
+
+def read_lines(path):
+    """Return all lines of a plain or block-compressed data file"""
+    with open_data_file(path) as f:
+        return f.readlines()
+
+
+if __name__ == "__main__":
+    import sys
+    for file_path in sys.argv[1:]:
+        out = compress_file(file_path)
+        print(f"[BLOCK STORE] {file_path} -> {out} ({os.path.getsize(file_path)} -> {os.path.getsize(out)} bytes)")
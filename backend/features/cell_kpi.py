@@ -0,0 +1,209 @@
+# cell_kpi.py
+"""
+Vendor cell-level KPI exports on one schema, with rolling stats per cell.
+
+Huawei ("Huawei Cell Level basic KPI*.xlsx", daily) and ZTE ("ZTE History
+Performance_4G LTE KPI Cell*.xlsx", per query period) exports are mapped onto
+CELL_KPI_COLUMNS, with success and drop rates in percent (ZTE reports
+fractions). Several exports per vendor are appended, and a repeated
+(vendor, cell, period) keeps the newest file's value.
+
+The table is sorted by cell and period. For every KPI it gets the rolling
+mean and p10/p90 over the last ROLLING_PERIODS periods of the same cell, and
+the change from the cell's previous period. These come from group-wise
+windows over the whole table: a (rows x periods) gather masked at cell
+boundaries. Cell and site indexes map to row ranges, so a serving cell's
+trend is a slice.
+"""
+import glob
+import os
+import warnings
+import numpy as np
+import pandas as pd
+
+HUAWEI_PATTERN = 'Huawei Cell Level basic KPI*.xlsx'
+ZTE_PATTERN = 'ZTE History Performance_4G LTE KPI Cell*.xlsx'
+ZTE_HEADER_ROW = 5  # report title / query / editor lines above the header
+ROLLING_PERIODS = 7
+ROLLING_PERCENTILES = (0.1, 0.9)
+TREND_PERIODS = 10
+
+# common KPI -> (Huawei column, ZTE column); ZTE values are fractions
+CELL_KPIS = {
+    'rrc_setup_sr_pct': ('TRCSL_RRC Setup success rate(%)', '[FDD]RRC Establishment Success Rate'),
+    'erab_setup_sr_pct': ('TRCSL_E-RAB Setup Success Rate(%)', '[FDD]E-RAB Setup Success Rate'),
+    'erab_drop_rate_pct': ('TRCSL_E-RAB Drop Rate', '[FDD]E-RAB Drop Rate'),
+}
+CELL_KPI_COLUMNS = ['vendor', 'period_start', 'period_end', 'granularity', 'site_id', 'enodeb_id',
+                    'enodeb_name', 'cell_name'] + list(CELL_KPIS)
+
+_cell_kpi_cache = {}
+
+
+def _clean_columns(df):
+    # Vendor headers carry stray spaces and non-breaking spaces
+    return df.rename(columns=lambda c: ' '.join(str(c).replace('\xa0', ' ').split()))
+
+
+def _site_id(enodeb_names, cell_names):
+    """Site ID: eNodeB name up to the first '_' (falls back to the first 6 characters of the cell name)"""
+    from_enodeb = enodeb_names.astype(str).str.split('_').str[0].str.strip()
+    return from_enodeb.where(from_enodeb.str.len() == 6, cell_names.astype(str).str[:6]).str.upper()
+
+
+def load_huawei_cell_kpis(path):
+    df = _clean_columns(pd.read_excel(path))
+    start = pd.to_datetime(df['Date'], errors='coerce')
+    table = pd.DataFrame({
+        'vendor': 'Huawei',
+        'period_start': start,
+        'period_end': start + pd.Timedelta(days=1),
+        'granularity': '1D',
+        'site_id': _site_id(df['eNodeB Name'], df['Cell Name']),
+        'enodeb_id': -1,
+        'enodeb_name': df['eNodeB Name'].astype(str),
+        'cell_name': df['Cell Name'].astype(str).str.strip(),
+    })
+    for kpi, (huawei_col, _) in CELL_KPIS.items():
+        # Text placeholders such as "NIL" or "/0" become NaN
+        table[kpi] = pd.to_numeric(df[' '.join(huawei_col.split())], errors='coerce')
+    return table
+
+
+def load_zte_cell_kpis(path):
+    df = _clean_columns(pd.read_excel(path, header=ZTE_HEADER_ROW))
+    table = pd.DataFrame({
+        'vendor': 'ZTE',
+        'period_start': pd.to_datetime(df['Start Time'], errors='coerce'),
+        'period_end': pd.to_datetime(df['End Time'], errors='coerce'),
+        'granularity': df['Query Granularity'].astype(str),
+        'site_id': _site_id(df['eNodeB Name'], df['Cell Name']),
+        'enodeb_id': pd.to_numeric(df['eNodeB'], errors='coerce').fillna(-1).astype(np.int64),
+        'enodeb_name': df['eNodeB Name'].astype(str),
+        'cell_name': df['Cell Name'].astype(str).str.strip(),
+    })
+    for kpi, (_, zte_col) in CELL_KPIS.items():
+        table[kpi] = pd.to_numeric(df[zte_col], errors='coerce') * 100
+    return table
+
+
+VENDOR_LOADERS = ((HUAWEI_PATTERN, load_huawei_cell_kpis), (ZTE_PATTERN, load_zte_cell_kpis))
+
+
+def discover_cell_kpi_files(data_dir):
+    """[(path, loader)] of the vendor exports, oldest first per vendor"""
+    files = []
+    for pattern, loader in VENDOR_LOADERS:
+        paths = sorted(glob.glob(os.path.join(data_dir, pattern)), key=os.path.getmtime)
+        files.extend((path, loader) for path in paths)
+    return files
+
+
+def _row_quantile(windowed, q):
+    """Linear-interpolated quantile of each row ignoring NaN (np.nanquantile loops over rows in Python)"""
+    ordered = np.sort(windowed, axis=1)  # NaN sorts last
+    valid = np.isfinite(ordered).sum(axis=1)
+    position = q * np.maximum(valid - 1, 0)
+    lo = np.floor(position).astype(np.int64)
+    hi = np.minimum(lo + 1, np.maximum(valid - 1, 0))
+    lo_values = np.take_along_axis(ordered, lo[:, None], axis=1)[:, 0]
+    hi_values = np.take_along_axis(ordered, hi[:, None], axis=1)[:, 0]
+    result = lo_values + (hi_values - lo_values) * (position - lo)
+    return np.where(valid > 0, result, np.nan)
+
+
+def add_rolling_stats(table, periods=ROLLING_PERIODS):
+    """Per-cell rolling mean/p10/p90 over `periods` periods and period-over-period deltas (table sorted by cell, period)"""
+    n = len(table)
+    keys = (table['vendor'] + '|' + table['cell_name']).to_numpy()
+    new_group = np.r_[True, keys[1:] != keys[:-1]] if n else np.empty(0, dtype=bool)
+    group_start = np.maximum.accumulate(np.where(new_group, np.arange(n), 0)) if n else np.empty(0, dtype=np.int64)
+    # (rows x periods) positions of each row's window; positions before the cell's first row are masked
+    window = np.arange(n)[:, None] - np.arange(periods)[None, :]
+    in_group = window >= group_start[:, None]
+    window = np.where(in_group, window, 0)
+    stats = {}
+    for kpi in CELL_KPIS:
+        values = table[kpi].to_numpy(dtype=float)
+        windowed = np.where(in_group, values[window] if n else np.empty((0, periods)), np.nan)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)  # all-NaN windows give NaN
+            stats[f'{kpi}_mean'] = np.nanmean(windowed, axis=1)
+            for q in ROLLING_PERCENTILES:
+                stats[f'{kpi}_p{int(q * 100)}'] = _row_quantile(windowed, q)
+        previous = np.r_[np.nan, values[:-1]] if n else values
+        stats[f'{kpi}_delta'] = np.where(new_group, np.nan, values - previous)
+    return pd.concat([table, pd.DataFrame(stats, index=table.index)], axis=1)
+
+
+def build_cell_kpi_table(frames):
+    """Common-schema table sorted by (vendor, cell, period) with rolling stats, plus cell and site indexes"""
+    frames = [f for f in frames if f is not None and len(f)]
+    if frames:
+        table = pd.concat(frames, ignore_index=True)
+    else:
+        table = pd.DataFrame({c: pd.Series(dtype=object) for c in CELL_KPI_COLUMNS})
+    table = table.dropna(subset=['period_start'])
+    # Later exports are appended last, so keep='last' lets re-exported periods replace older values
+    table = table.drop_duplicates(['vendor', 'cell_name', 'period_start'], keep='last')
+    table = table.sort_values(['vendor', 'cell_name', 'period_start'], kind='mergesort').reset_index(drop=True)
+    table = add_rolling_stats(table)
+
+    keys = (table['vendor'] + '|' + table['cell_name']).to_numpy()
+    bounds = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1], True]) if len(keys) else np.array([0])
+    cells = {}
+    sites = {}
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        cell = table['cell_name'].iat[start].upper()
+        cells.setdefault(cell, []).append((int(start), int(end)))
+        sites.setdefault(table['site_id'].iat[start], []).append((int(start), int(end)))
+    return {'table': table, 'cells': cells, 'sites': sites}
+
+
+def get_cell_kpis(data_dir):
+    """Cell KPI table for the vendor exports in data_dir, rebuilt when any export changes"""
+    files = discover_cell_kpi_files(data_dir)
+    version = tuple((path, os.path.getmtime(path)) for path, _ in files)
+    if _cell_kpi_cache.get('version') != version:
+        frames = []
+        for path, loader in files:
+            try:
+                frames.append(loader(path))
+            except Exception as e:
+                print(f"[CELL KPI] Skipping {os.path.basename(path)}: {e}")
+        _cell_kpi_cache['bundle'] = build_cell_kpi_table(frames)
+        _cell_kpi_cache['version'] = version
+        bundle = _cell_kpi_cache['bundle']
+        print(f"[CELL KPI] Indexed {len(bundle['table'])} rows for {len(bundle['cells'])} cells, {len(bundle['sites'])} sites")
+    return _cell_kpi_cache['bundle']
+
+
+def _records(table, ranges, periods):
+    rows = []
+    for start, end in ranges:
+        cell = table.iloc[max(start, end - periods):end]
+        cell = cell.assign(period_start=cell['period_start'].dt.strftime('%Y-%m-%d'),
+                           period_end=cell['period_end'].dt.strftime('%Y-%m-%d'))
+        cell = cell.round(3).astype(object).where(cell.notna(), None)
+        rows.append({
+            'cell_name': cell['cell_name'].iat[0],
+            'vendor': cell['vendor'].iat[0],
+            'site_id': cell['site_id'].iat[0],
+            'periods': cell.drop(columns=['cell_name', 'vendor', 'site_id']).to_dict(orient='records'),
+        })
+    return rows
+
+
+def cell_kpi_trend(bundle, cellcode, periods=TREND_PERIODS):
+    """
+    Last `periods` periods of the serving cell, or of every cell of its site
+    when the cell code itself is not in the vendor exports.
+    Returns {'match': 'cell' | 'site' | None, 'cells': [...]}.
+    """
+    cellcode = str(cellcode or '').strip().upper()
+    ranges = bundle['cells'].get(cellcode)
+    match = 'cell' if ranges else None
+    if not ranges:
+        ranges = bundle['sites'].get(cellcode[:6])
+        match = 'site' if ranges else None
+    return {'match': match, 'cells': _records(bundle['table'], ranges or [], periods)}
@@ -0,0 +1,96 @@
+# cell_locator.py
+"""
+Resolves a session LAC/SAC to a reference cell, with a best-guess fallback.
+
+The reference rows are indexed once: an exact (lac, cellid) lookup table,
+the cells of each LAC and each LAC's centroid. When the exact pair is
+missing, the candidates are only the cells of that LAC. The subscriber's
+known cell positions (VLRD common cells) pick the nearest candidate; with
+none available, the candidate closest to the LAC centroid is used. A LAC
+whose cells all lack coordinates falls back to its first reference row.
+"""
+import numpy as np
+import pandas as pd
+from spatial_index import haversine_km
+
+LOCATOR_COLUMNS = ['lac', 'cellid', 'sitename', 'cellcode', 'lon', 'lat', 'region', 'district']
+
+_locator_cache = {}
+
+
+def build_cell_locator(ref_df):
+    """Index reference cells by (lac, cellid) and by LAC, with LAC centroids"""
+    if ref_df is None or ref_df.empty:
+        records = pd.DataFrame(columns=LOCATOR_COLUMNS)
+    else:
+        records = ref_df[[c for c in LOCATOR_COLUMNS if c in ref_df.columns]].reset_index(drop=True)
+    lac = pd.to_numeric(records['lac'], errors='coerce')
+    cellid = pd.to_numeric(records['cellid'], errors='coerce')
+    lat = pd.to_numeric(records['lat'], errors='coerce').to_numpy(dtype=float)
+    lon = pd.to_numeric(records['lon'], errors='coerce').to_numpy(dtype=float)
+
+    keyed = pd.DataFrame({'lac': lac, 'cellid': cellid}).dropna()
+    # First row per pair, same as ref_df[(lac == x) & (cellid == y)].iloc[0]
+    first = keyed[~keyed.duplicated(['lac', 'cellid'])]
+    exact = dict(zip(zip(first['lac'].astype(np.int64), first['cellid'].astype(np.int64)), first.index))
+
+    # First row per LAC (same as ref_df[lac == x].iloc[0]), for LACs with no located cell
+    lacs, first_rows = np.unique(keyed['lac'].to_numpy(dtype=np.int64), return_index=True)
+    lac_first = dict(zip(lacs.tolist(), keyed.index[first_rows]))
+    located = keyed[np.isfinite(lat[keyed.index]) & np.isfinite(lon[keyed.index])]
+    lac_cells = {int(k): v.to_numpy() for k, v in located.groupby(located['lac'].astype(np.int64)).groups.items()}
+    lac_centroids = {k: (float(lat[v].mean()), float(lon[v].mean())) for k, v in lac_cells.items()}
+    return {
+        'records': records,
+        'lat': lat,
+        'lon': lon,
+        'exact': exact,
+        'lac_cells': lac_cells,
+        'lac_centroids': lac_centroids,
+        'lac_first': lac_first,
+    }
+
+
+def get_cell_locator(ref_df, version=None):
+    """
+    Locator for the reference frame, built once per version (e.g. the reference
+    file's mtime); without a version, once per frame object
+    """
+    # The cached frame is kept referenced, so its id() cannot be reused by another frame
+    key = ('version', version) if version is not None else ('frame', id(ref_df))
+    if _locator_cache.get('key') != key:
+        _locator_cache['locator'] = build_cell_locator(ref_df)
+        _locator_cache['key'] = key
+        _locator_cache['frame'] = ref_df
+    return _locator_cache['locator']
+
+
+def resolve_cell(locator, lac, cellid, anchors=None):
+    """
+    Return (reference row, method) for a LAC/SAC. method is 'exact',
+    'nearest_common_cell', 'lac_centroid', 'lac_first' (no cell of the LAC has
+    coordinates) or None when the LAC is unknown.
+    anchors is an optional (lats, lons) pair of the subscriber's known cell positions.
+    """
+    position = locator['exact'].get((lac, cellid))
+    if position is not None:
+        return locator['records'].iloc[position], 'exact'
+    candidates = locator['lac_cells'].get(lac)
+    if candidates is None or not len(candidates):
+        first = locator['lac_first'].get(lac)
+        if first is None:
+            return None, None
+        return locator['records'].iloc[first], 'lac_first'
+
+    cand_lat = locator['lat'][candidates]
+    cand_lon = locator['lon'][candidates]
+    if anchors is not None and len(anchors[0]):
+        anchor_lat = np.asarray(anchors[0], dtype=float)
+        anchor_lon = np.asarray(anchors[1], dtype=float)
+        # candidates x anchors distance matrix; nearest candidate to any anchor wins
+        distances = haversine_km(cand_lat[:, None], cand_lon[:, None], anchor_lat[None, :], anchor_lon[None, :])
+        best = int(np.argmin(distances.min(axis=1)))
+        return locator['records'].iloc[candidates[best]], 'nearest_common_cell'
+    centroid_lat, centroid_lon = locator['lac_centroids'][lac]
+    best = int(np.argmin(haversine_km(centroid_lat, centroid_lon, cand_lat, cand_lon)))
+    return locator['records'].iloc[candidates[best]], 'lac_centroid'
@@ -0,0 +1,95 @@
+# chart_payload.py
+"""
+Chart.js payloads with pre-serialized option blocks.
+
+Each chart's `options` block is constant apart from an optional per-request
+title, so it is serialized once when the chart is registered, split around
+the title. A request encodes only its data block (plus the title and any
+extra keys) and concatenates the pieces into the response body.
+
+Responses carry an ETag built from the chart name and the caller's data
+version, plus Cache-Control: no-cache. A browser revalidating with
+If-None-Match can be answered with a 304 before any data is built.
+"""
+import hashlib
+import json
+from flask import Response
+
+TITLE = '__chart_title__'  # placeholder for the per-request title in an options block
+
+_charts = {}
+
+
+def _dumps(value):
+    return json.dumps(value, separators=(',', ':'))
+
+
+def register_chart(name, chart_type, options):
+    """Serialize a chart's options once; a TITLE value marks where the request's title goes"""
+    prefix, found, suffix = _dumps(options).partition(_dumps(TITLE))
+    _charts[name] = {
+        'head': '{"type":' + _dumps(chart_type) + ',"options":' + prefix,
+        'suffix': suffix if found else None,
+    }
+
+
+def chart_body(name, data, title=None, extra=None):
+    """JSON text of {type, options, data, **extra}; only data, title and extra are encoded here"""
+    chart = _charts[name]
+    parts = [chart['head']]
+    if chart['suffix'] is not None:
+        parts += [_dumps(title), chart['suffix']]
+    parts += [',"data":', _dumps(data)]
+    for key, value in (extra or {}).items():
+        parts += [',', _dumps(key), ':', _dumps(value)]
+    parts.append('}')
+    return ''.join(parts)
+
+
+def chart_etag(name, *version):
+    """Quoted ETag for a chart at a data version (any JSON-able values, e.g. mtimes and query args)"""
+    digest = hashlib.sha1(json.dumps([name, *version], default=str).encode('utf-8')).hexdigest()[:20]
+    return f'"{name}-{digest}"'
+
+
+def chart_response(name, data, etag, title=None, extra=None):
+    response = Response(chart_body(name, data, title, extra), mimetype='application/json')
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'no-cache'  # always revalidate; unchanged data is a 304
+    return response
+
+
+def _options(title, legend_position='top', aspect_ratio=2, x_title=None, y_title=None, title_size=16):
+    options = {
+        'responsive': True,
+        'maintainAspectRatio': True,
+        'aspectRatio': aspect_ratio,
+        'plugins': {
+            'title': {'display': True, 'text': title, 'font': {'size': title_size}},
+            'legend': {'display': True, 'position': legend_position},
+        },
+    }
+    if y_title:
+        options['scales'] = {
+            'y': {'beginAtZero': True, 'title': {'display': True, 'text': y_title}},
+            'x': {'title': {'display': True, 'text': x_title}},
+        }
+    return options
+
+
+# The overview's Chart.js charts (same options the routes used to build per request)
+register_chart('usage', 'bar', _options(TITLE, x_title='Month', y_title='Usage (GB)'))
+register_chart('rsrp_trend', 'doughnut', _options(TITLE, legend_position='bottom', aspect_ratio=1.5))
+register_chart('lte_utilization', 'line', _options(TITLE, x_title='Cell ID', y_title='Throughput (Mbps)'))
+register_chart('call_drop_rate', 'line', _options('3G Call Drop Rate Trend', x_title='Date', y_title='Drop Rate (%)'))
+register_chart('hlr_vlr', 'bar', {
+    'responsive': True,
+    'plugins': {
+        'title': {'display': True, 'text': 'HLR/VLR Subscriber Base Trend'},
+        'legend': {'display': True, 'position': 'top'},
+    },
+    'scales': {
+        'y': {'beginAtZero': True, 'title': {'display': True, 'text': 'Subscriber Count'}},
+        'x': {'title': {'display': True, 'text': 'Date'}},
+    },
+})
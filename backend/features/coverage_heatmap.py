@@ -0,0 +1,141 @@
+# coverage_heatmap.py
+"""
+Measured-coverage heat map from the crowdsourced speed-test exports
+(MobileNetworkPerformance_*.csv).
+
+Measurements are binned into a grid pyramid: at level z a cell is
+360 / 2**(z + 2) degrees wide, i.e. a quarter of a map tile at zoom z.
+Every occupied cell of every level holds count, mean and p10/p50/p90 per
+metric, for all operators together and per operator. Measurements come from
+the columnar store (speed_test_store.py); the pyramid is rebuilt only when
+the store changes, and bbox or point queries read straight from it.
+"""
+import numpy as np
+import pandas as pd
+from speed_test_store import get_speed_test_store, read_speed_tests
+
+PYRAMID_LEVELS = (8, 10, 12, 14, 16)
+PERCENTILES = (0.1, 0.5, 0.9)
+ALL_OPERATORS = 'All'
+
+# metric name -> source column
+HEATMAP_METRICS = {
+    'rsrp': 'val_signal_rsrp_dbm',
+    'rsrq': 'val_signal_rsrq_db',
+    'snr': 'val_signal_rssnr_db',
+    'download_kbps': 'val_download_kbps',
+    'upload_kbps': 'val_upload_kbps',
+    'latency_ms': 'val_latency_iqm_ms',
+}
+LOCATION_COLUMNS = ['attr_location_latitude', 'attr_location_longitude']
+OPERATOR_COLUMN = 'attr_network_operator_common_name'
+
+_pyramid_cache = {}
+
+
+def load_measurements(store_dir, start_date=None, end_date=None):
+    """Located measurements with the heat-map columns only, read from the columnar store"""
+    df = read_speed_tests(store_dir, start_date, end_date,
+                          columns=LOCATION_COLUMNS + [OPERATOR_COLUMN] + list(HEATMAP_METRICS.values()))
+    measurements = pd.DataFrame({
+        'lat': df['attr_location_latitude'],
+        'lon': df['attr_location_longitude'],
+        'operator': df[OPERATOR_COLUMN].astype(object).fillna('Unknown').astype(str),
+    })
+    for metric, column in HEATMAP_METRICS.items():
+        measurements[metric] = df[column].astype(np.float64)
+    return measurements.dropna(subset=['lat', 'lon']).reset_index(drop=True)
+
+
+def cell_size(level):
+    return 360.0 / 2 ** (level + 2)
+
+
+def _aggregate_level(measurements, level):
+    size = cell_size(level)
+    binned = measurements.assign(
+        row=np.floor((measurements['lat'] + 90) / size).astype(np.int64),
+        col=np.floor((measurements['lon'] + 180) / size).astype(np.int64),
+    )
+    # Same rows again under the 'All' operator so both views share one groupby
+    binned = pd.concat([binned, binned.assign(operator=ALL_OPERATORS)], ignore_index=True)
+    grouped = binned.groupby(['operator', 'row', 'col'])
+    metrics = list(HEATMAP_METRICS)
+    stats = grouped[metrics].mean().add_suffix('_mean')
+    stats.insert(0, 'count', grouped.size())
+    for metric in metrics:
+        stats[f'{metric}_count'] = grouped[metric].count()
+    quantiles = grouped[metrics].quantile(list(PERCENTILES)).unstack()
+    for metric in metrics:
+        for q in PERCENTILES:
+            stats[f'{metric}_p{int(q * 100)}'] = quantiles[(metric, q)]
+    stats = stats.reset_index()
+    stats['lat'] = (stats['row'] + 0.5) * size - 90
+    stats['lon'] = (stats['col'] + 0.5) * size - 180
+    return stats.sort_values(['operator', 'row', 'col'], kind='mergesort').reset_index(drop=True)
+
+
+def build_coverage_pyramid(measurements, levels=PYRAMID_LEVELS):
+    tables = {level: _aggregate_level(measurements, level) for level in levels}
+    return {
+        'levels': tables,
+        # (operator, row, col) -> table position, for point lookups
+        'lookup': {level: dict(zip(zip(t['operator'], t['row'], t['col']), range(len(t)))) for level, t in tables.items()},
+        'operators': sorted(measurements['operator'].unique().tolist()),
+        'measurements': len(measurements),
+    }
+
+
+def get_coverage_pyramid(data_dir):
+    """Pyramid over the ingested speed-test exports, rebuilt when the (throttled) store sync changes it"""
+    store_dir, version = get_speed_test_store(data_dir)
+    if _pyramid_cache.get('version') != version:
+        measurements = load_measurements(store_dir)
+        _pyramid_cache['pyramid'] = build_coverage_pyramid(measurements)
+        _pyramid_cache['version'] = version
+        print(f"[COVERAGE] Aggregated {len(measurements)} measurements from {len(version)} export(s)")
+    return _pyramid_cache['pyramid']
+
+
+def pyramid_level(zoom):
+    """Finest level whose cells are no smaller than a quarter tile at this zoom"""
+    levels = [level for level in PYRAMID_LEVELS if level <= zoom]
+    return levels[-1] if levels else PYRAMID_LEVELS[0]
+
+
+def _cell_records(cells, metric, level):
+    stat_columns = ['count', 'mean'] + [f'p{int(q * 100)}' for q in PERCENTILES]
+    cells = cells[cells[f'{metric}_count'] > 0]
+    records = pd.DataFrame({'lat': cells['lat'], 'lon': cells['lon'], 'samples': cells['count']})
+    for stat in stat_columns:
+        records[stat] = cells[f'{metric}_{stat}']
+    records = records.round(3).to_dict(orient='records')
+    for record in records:
+        record['size_deg'] = cell_size(level)
+    return records
+
+
+def query_coverage_bbox(pyramid, zoom, min_lon, min_lat, max_lon, max_lat, metric='rsrp', operator=ALL_OPERATORS):
+    """Heat-map cells of the zoom's level inside the bbox"""
+    level = pyramid_level(zoom)
+    cells = pyramid['levels'][level]
+    cells = cells[(cells['operator'] == operator)
+                  & cells['lon'].between(min_lon, max_lon) & cells['lat'].between(min_lat, max_lat)]
+    return {'level': level, 'metric': metric, 'operator': operator, 'cells': _cell_records(cells, metric, level)}
+
+
+def query_coverage_point(pyramid, lat, lon, metric='rsrp', operator=ALL_OPERATORS):
+    """Stats of the cell containing (lat, lon) at every level, finest first"""
+    result = []
+    for level in sorted(pyramid['levels'], reverse=True):
+        size = cell_size(level)
+        row = int(np.floor((lat + 90) / size))
+        col = int(np.floor((lon + 180) / size))
+        position = pyramid['lookup'][level].get((operator, row, col))
+        if position is None:
+            continue
+        records = _cell_records(pyramid['levels'][level].iloc[[position]], metric, level)
+        if records:
+            records[0]['level'] = level
+            result.append(records[0])
+    return {'lat': lat, 'lon': lon, 'metric': metric, 'operator': operator, 'cells': result}
@@ -1,55 +1,349 @@
 # device_subscriber_insights.py
 """
 Generates Device and Subscriber Insights for the dashboard.
+
+Each session shard is read once per (mtime, size) and reduced to its
+contribution: the distinct IMEIs and MSISDNs it holds and its per-TAC row
+counts. Contributions are merged into running totals, so a new shard only
+costs a read of that shard, and the final insights are cached until the set
+of shards or the TAC file changes.
+
+TAC counts are kept per shard as a compact pair of sorted int64 arrays
+(distinct TACs, row counts). Only those distinct TACs are looked up in the
+TAC table, which is loaded once per file version, and the device breakdowns
+(model, brand, OS, VoLTE, 5G) are all taken from that one small join.
+
+In approximate mode each shard instead contributes HyperLogLog sketches of
+its IMEIs and MSISDNs, overall and per district, tagged with the shard's day
+(see hyperloglog.py for the error bounds). Distinct counts over any union of
+shards, days or districts then cost a register-wise max of fixed-size
+sketches, with no exact sets held in memory.
 """
+import glob
+import heapq
 import os
+import re
+import threading
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
+from block_store import BLOCK_EXTENSION, open_data_file
+from hyperloglog import DEFAULT_PRECISION, HyperLogLog, relative_error
+
+SESSION_PREFIX = 'All_2025-4-2_'
+SESSION_COLUMNS = ['IMSI', 'MSISDN', 'IMEI', 'Status', 'Cell', 'Other']
+SHARD_DAY_PATTERN = re.compile(r"All_(\d{4})-(\d{1,2})-(\d{1,2})_")
+LOCATION_PATTERN = r"(\d+)-(\w+)-([a-fA-F0-9]+)"
+TAC_COLUMNS = ['tac', 'brand', 'model', 'software_os_name', 'volte', 'technology']
+FIVE_G_PATTERN = r"\b(?:NR|5G)\b"
+EMPTY_TAC_COUNTS = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+SKETCH_CACHE_PRECISIONS = 2  # precisions whose shard sketches stay cached (least recently used evicted)
+
+_shard_cache = {}  # path -> {'version', 'imei', 'msisdn', 'tac_counts'}
+_sketch_cache = OrderedDict()  # precision -> {path -> {'version', 'day', 'imei', 'msisdn', 'districts', 'tac_counts'}}
+_reference_cache = {}
+_tac_table_cache = {}
+_totals = {'shards': frozenset(), 'imei': set(), 'msisdn': set(), 'tac_counts': EMPTY_TAC_COUNTS}
+_insights_cache = {}
+# Guards the caches and running totals above; RLock since the insights call get_distinct_counts
+_cache_lock = threading.RLock()
+
+def _is_data_file(fname, prefix):
+    return fname.startswith(prefix) and (fname.endswith('.txt') or fname.endswith('.txt' + BLOCK_EXTENSION))
+
+def _list_data_files(data_dir, prefix):
+    """List data files by prefix, preferring a block-compressed copy over its plain text source"""
+    names = [f for f in os.listdir(data_dir) if _is_data_file(f, prefix)]
+    return [f for f in names if f + BLOCK_EXTENSION not in names]
+
+def _file_version(path):
+    stat = os.stat(path)
+    return (stat.st_mtime, stat.st_size)
+
+def _read_shard(path):
+    try:
+        with open_data_file(path) as f:
+            return pd.read_csv(f, sep=';', header=None, names=SESSION_COLUMNS, dtype={'MSISDN': str, 'IMEI': str})
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame(columns=SESSION_COLUMNS, dtype=str)
+
+def _tac_counts(df):
+    """Row counts per TAC (first 8 IMEI digits) as sorted (tacs, counts) int64 arrays"""
+    tacs = pd.to_numeric(df['IMEI'].dropna().str[:8], errors='coerce').dropna()
+    if tacs.empty:
+        return EMPTY_TAC_COUNTS
+    values, counts = np.unique(tacs.to_numpy(dtype=np.int64), return_counts=True)
+    return values, counts.astype(np.int64)
+
+def _merge_tac_counts(parts):
+    """Sum several (tacs, counts) pairs into one"""
+    parts = [p for p in parts if len(p[0])]
+    if not parts:
+        return EMPTY_TAC_COUNTS
+    if len(parts) == 1:
+        return parts[0]
+    values, inverse = np.unique(np.concatenate([p[0] for p in parts]), return_inverse=True)
+    counts = np.bincount(inverse, weights=np.concatenate([p[1] for p in parts]), minlength=len(values))
+    return values, counts.astype(np.int64)
+
+def _load_shard(path):
+    """Reduce one session shard to its distinct IMEI/MSISDN sets and TAC row counts"""
+    df = _read_shard(path)
+    imeis = df['IMEI'].dropna()
+    return {
+        'imei': set(imeis.unique()),
+        'msisdn': set(df['MSISDN'].dropna().unique()),
+        'tac_counts': _tac_counts(df),
+    }
+
+def _refresh_totals(shard_versions):
+    """Bring the running totals in line with the current shards, reading only new or changed ones"""
+    global _totals
+    for path, version in shard_versions.items():
+        cached = _shard_cache.get(path)
+        if cached is None or cached['version'] != version:
+            shard = _load_shard(path)
+            shard['version'] = version
+            _shard_cache[path] = shard
+    for path in list(_shard_cache):
+        if path not in shard_versions:
+            del _shard_cache[path]
+
+    current = frozenset(shard_versions.items())
+    previous = _totals['shards']
+    if previous <= current:
+        # Only additions: merge the new shards' contributions
+        added = [_shard_cache[path] for path, version in current - previous]
+        for shard in added:
+            _totals['imei'] |= shard['imei']
+            _totals['msisdn'] |= shard['msisdn']
+        _totals['tac_counts'] = _merge_tac_counts([_totals['tac_counts']] + [shard['tac_counts'] for shard in added])
+        print(f"[INSIGHTS] Merged {len(current - previous)} new shard(s) into running totals")
+    else:
+        # A shard changed or disappeared: rebuild from cached contributions, no rescans
+        totals = {'imei': set(), 'msisdn': set()}
+        for path in shard_versions:
+            shard = _shard_cache[path]
+            totals['imei'] |= shard['imei']
+            totals['msisdn'] |= shard['msisdn']
+        totals['tac_counts'] = _merge_tac_counts([_shard_cache[path]['tac_counts'] for path in shard_versions])
+        _totals = totals
+        print(f"[INSIGHTS] Rebuilt running totals from {len(shard_versions)} shard(s)")
+    _totals['shards'] = current
+
+def _shard_day(path):
+    match = SHARD_DAY_PATTERN.search(os.path.basename(path))
+    if not match:
+        return None
+    year, month, day = (int(g) for g in match.groups())
+    return f"{year:04d}-{month:02d}-{day:02d}"
+
+def _cell_districts(data_dir):
+    """(lac, cellid) -> district from the newest reference cell file, cached per mtime"""
+    ref_files = sorted(glob.glob(os.path.join(data_dir, 'Reference_Data_Cell_Locations_*.csv')))
+    if not ref_files:
+        return None
+    ref_file = ref_files[-1]
+    version = (ref_file, _file_version(ref_file))
+    if _reference_cache.get('version') != version:
+        ref_df = pd.read_csv(ref_file, usecols=['lac', 'cellid', 'district'])
+        _reference_cache['version'] = version
+        _reference_cache['districts'] = ref_df.drop_duplicates(['lac', 'cellid'])
+    return _reference_cache['districts']
 
-def get_device_subscriber_insights(data_dir=None):
+def _sketch_shard(path, precision, cell_districts):
+    """Reduce one session shard to HyperLogLog sketches, overall and per district"""
+    df = _read_shard(path)
+    sketches = {
+        'day': _shard_day(path),
+        'imei': HyperLogLog(precision).add(df['IMEI']),
+        'msisdn': HyperLogLog(precision).add(df['MSISDN']),
+        'districts': {},
+        'tac_counts': _tac_counts(df),
+    }
+    if cell_districts is not None and not df.empty:
+        parts = df['Cell'].fillna('').astype(str).str.extract(LOCATION_PATTERN)
+        located = parts[1].notna()
+        cells = pd.DataFrame({
+            'lac': parts.loc[located, 1].map(lambda v: int(v, 16)),
+            'cellid': parts.loc[located, 2].map(lambda v: int(v, 16)),
+        }, index=df.index[located])
+        district = cells.merge(cell_districts, on=['lac', 'cellid'], how='left').set_index(cells.index)['district']
+        df = df.assign(DISTRICT=district.reindex(df.index).fillna('Unknown'))
+        for name, group in df.groupby('DISTRICT'):
+            sketches['districts'][str(name).upper()] = {
+                'imei': HyperLogLog(precision).add(group['IMEI']),
+                'msisdn': HyperLogLog(precision).add(group['MSISDN']),
+            }
+    return sketches
+
+def _refresh_sketches(shard_versions, precision, data_dir):
+    """Return current per-shard sketches, sketching only new or changed shards"""
+    cell_districts = _cell_districts(data_dir)
+    cached_sketches = _sketch_cache.setdefault(precision, {})
+    _sketch_cache.move_to_end(precision)
+    while len(_sketch_cache) > SKETCH_CACHE_PRECISIONS:
+        _sketch_cache.popitem(last=False)
+    sketches = {}
+    for path, version in shard_versions.items():
+        cached = cached_sketches.get(path)
+        if cached is None or cached['version'] != version:
+            cached = _sketch_shard(path, precision, cell_districts)
+            cached['version'] = version
+            cached_sketches[path] = cached
+        sketches[path] = cached
+    for path in list(cached_sketches):
+        if path not in shard_versions:
+            del cached_sketches[path]
+    return sketches
+
+def _session_shard_versions(data_dir):
+    session_files = _list_data_files(data_dir, SESSION_PREFIX)
+    return {os.path.join(data_dir, f): _file_version(os.path.join(data_dir, f)) for f in session_files}
+
+def get_distinct_counts(data_dir=None, shards=None, days=None, districts=None, precision=DEFAULT_PRECISION):
+    """
+    Approximate distinct IMEIs / MSISDNs over the union of the selected shards,
+    days (YYYY-MM-DD) and districts. Any filter left as None means "all".
+    """
+    if data_dir is None:
+        data_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data_files'))
+    with _cache_lock:
+        shard_sketches = _refresh_sketches(_session_shard_versions(data_dir), precision, data_dir)
+    shards = set(shards) if shards else None
+    days = set(days) if days else None
+    districts = {d.upper() for d in districts} if districts else None
+
+    imei_sketches = []
+    msisdn_sketches = []
+    selected_shards = []
+    for path, sketch in shard_sketches.items():
+        if shards is not None and os.path.basename(path) not in shards:
+            continue
+        if days is not None and sketch['day'] not in days:
+            continue
+        selected_shards.append(os.path.basename(path))
+        if districts is None:
+            imei_sketches.append(sketch['imei'])
+            msisdn_sketches.append(sketch['msisdn'])
+        else:
+            for name in districts:
+                if name in sketch['districts']:
+                    imei_sketches.append(sketch['districts'][name]['imei'])
+                    msisdn_sketches.append(sketch['districts'][name]['msisdn'])
+    return {
+        'unique_devices': HyperLogLog.union(imei_sketches, precision).count(),
+        'active_subscribers': HyperLogLog.union(msisdn_sketches, precision).count(),
+        'shards': sorted(selected_shards),
+        'days': sorted(days) if days else None,
+        'districts': sorted(districts) if districts else None,
+        'precision': precision,
+        'relative_std_error': round(float(relative_error(precision)), 5),
+        'approximate': True
+    }
+
+def _tac_table(tac_file):
+    """TAC attributes sorted by integer TAC, loaded once per file version"""
+    version = _file_version(tac_file)
+    if _tac_table_cache.get('version') != version:
+        tac_df = pd.read_csv(tac_file, usecols=lambda c: c in TAC_COLUMNS, dtype=str)
+        for col in TAC_COLUMNS:
+            if col not in tac_df.columns:
+                tac_df[col] = None
+        tac_df['tac'] = pd.to_numeric(tac_df['tac'], errors='coerce')
+        tac_df = tac_df.dropna(subset=['tac'])
+        tac_df['tac'] = tac_df['tac'].astype(np.int64)
+        # First row per TAC, same as tac_df[tac_df['tac'] == tac].iloc[0]
+        tac_df = tac_df.drop_duplicates('tac').sort_values('tac', kind='mergesort').reset_index(drop=True)
+        _tac_table_cache['version'] = version
+        _tac_table_cache['table'] = tac_df
+    return _tac_table_cache['table']
+
+def _top_k(counts, limit):
+    """Largest entries of a {label: count} mapping via a bounded heap (ties keep label order)"""
+    return heapq.nlargest(limit, counts.items(), key=lambda item: item[1])
+
+def _device_breakdown(tac_counts, tac_file, limit=5):
+    """Top models plus brand / OS / VoLTE / 5G row counts from the distinct TACs only"""
+    breakdown = {'top_models': [], 'brand': [], 'os': [], 'volte': {}, '5g': {}}
+    tacs, counts = tac_counts
+    if not len(tacs) or not os.path.exists(tac_file):
+        return breakdown
+    table = _tac_table(tac_file)
+    keys = table['tac'].to_numpy(dtype=np.int64)
+    positions = np.searchsorted(keys, tacs)
+    matched = positions < len(keys)
+    matched[matched] = keys[positions[matched]] == tacs[matched]
+    devices = table.iloc[positions[matched]].assign(count=counts[matched])
+
+    def tally(column):
+        return devices.groupby(column)['count'].sum().to_dict()
+
+    breakdown['top_models'] = [{'model': m, 'count': int(c)} for m, c in _top_k(tally('model'), limit)]
+    breakdown['brand'] = [{'brand': b, 'count': int(c)} for b, c in _top_k(tally('brand'), limit)]
+    breakdown['os'] = [{'os': o, 'count': int(c)} for o, c in _top_k(tally('software_os_name'), limit)]
+    volte = devices['volte'].fillna('').str.strip().str.upper().isin(['YES', 'Y', 'TRUE', '1'])
+    five_g = devices['technology'].fillna('').str.upper().str.contains(FIVE_G_PATTERN, regex=True)
+    unknown = int(counts[~matched].sum())
+    breakdown['volte'] = {'capable': int(devices.loc[volte, 'count'].sum()), 'not_capable': int(devices.loc[~volte, 'count'].sum()), 'unknown_tac': unknown}
+    breakdown['5g'] = {'capable': int(devices.loc[five_g, 'count'].sum()), 'not_capable': int(devices.loc[~five_g, 'count'].sum()), 'unknown_tac': unknown}
+    return breakdown
+
+def _build_insights(data_dir, shard_versions, tac_file, data_version, approximate, precision):
+    """Cached insights for data_version, built from the running totals or sketches; call with _cache_lock held"""
+    if _insights_cache.get('version') == data_version:
+        return _insights_cache['insights']
+
+    if shard_versions:
+        if approximate:
+            counts = get_distinct_counts(data_dir, precision=precision)
+            total_unique_devices = counts['unique_devices']
+            total_active_subscribers = counts['active_subscribers']
+            tac_counts = _merge_tac_counts([_sketch_cache[precision][path]['tac_counts'] for path in shard_versions])
+        else:
+            _refresh_totals(shard_versions)
+            total_unique_devices = len(_totals['imei'])
+            total_active_subscribers = len(_totals['msisdn'])
+            tac_counts = _totals['tac_counts']
+        breakdown = _device_breakdown(tac_counts, tac_file)
+        insights = {
+            'total_unique_devices': int(total_unique_devices),
+            'total_active_subscribers': int(total_active_subscribers),
+            'average_devices_per_user': round(total_unique_devices / max(1, total_active_subscribers), 2),
+            'top_5_device_models': [entry['model'] for entry in breakdown['top_models']],
+            'device_breakdown': breakdown,
+            'approximate': approximate
+        }
+    else:
+        insights = {
+            'total_unique_devices': 0,
+            'total_active_subscribers': 0,
+            'average_devices_per_user': 0,
+            'top_5_device_models': [],
+            'device_breakdown': _device_breakdown(EMPTY_TAC_COUNTS, tac_file),
+            'approximate': approximate
+        }
+    _insights_cache['version'] = data_version
+    _insights_cache['insights'] = insights
+    return insights
+
+def get_device_subscriber_insights(data_dir=None, approximate=False, precision=DEFAULT_PRECISION):
     """
     Returns a dictionary with:
       - total_unique_devices (IMEI)
       - total_active_subscribers (MSISDN)
       - average_devices_per_user
       - top_5_device_models
+      - device_breakdown (top models/brands/OS, VoLTE and 5G capable counts)
+    With approximate=True the distinct counts come from merged HyperLogLog sketches.
     """
     if data_dir is None:
         data_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data_files'))
-    # Aggregate from all USERTD and All_2025-4-2 files
-    usage_files = [f for f in os.listdir(data_dir) if f.startswith('USERTD_') and f.endswith('.txt')]
-    session_files = [f for f in os.listdir(data_dir) if f.startswith('All_2025-4-2_') and f.endswith('.txt')]
-    usage_df_list = []
-    session_df_list = []
-    for fname in usage_files:
-        df = pd.read_csv(os.path.join(data_dir, fname), sep='\t', dtype={'MSISDN': str})
-        usage_df_list.append(df)
-    for fname in session_files:
-        df = pd.read_csv(os.path.join(data_dir, fname), sep=';', header=None, names=['IMSI','MSISDN','IMEI','Status','Cell','Other'], dtype={'MSISDN': str, 'IMEI': str})
-        session_df_list.append(df)
-    # Use session files for device/subscriber analysis
-    if session_df_list:
-        session_df = pd.concat(session_df_list, ignore_index=True)
-        total_unique_devices = session_df['IMEI'].nunique()
-        total_active_subscribers = session_df['MSISDN'].nunique()
-        avg_devices_per_user = round(total_unique_devices / max(1, total_active_subscribers), 2)
-        # Top 5 device models (if TACD_UPDATED.csv available)
-        tac_file = os.path.join(data_dir, 'TACD_UPDATED.csv')
-        top_5_models = []
-        if os.path.exists(tac_file):
-            tac_df = pd.read_csv(tac_file)
-            session_df['TAC'] = session_df['IMEI'].str[:8].astype(str)
-            tac_df['tac'] = tac_df['tac'].astype(str)
-            model_counts = session_df.merge(tac_df, left_on='TAC', right_on='tac', how='left')['model'].value_counts()
-            top_5_models = model_counts.head(5).index.tolist()
-        return {
-            'total_unique_devices': int(total_unique_devices),
-            'total_active_subscribers': int(total_active_subscribers),
-            'average_devices_per_user': avg_devices_per_user,
-            'top_5_device_models': top_5_models
-        }
-    return {
-        'total_unique_devices': 0,
-        'total_active_subscribers': 0,
-        'average_devices_per_user': 0,
-        'top_5_device_models': []
-    }
+    shard_versions = _session_shard_versions(data_dir)
+    tac_file = os.path.join(data_dir, 'TACD_UPDATED.csv')
+    tac_version = _file_version(tac_file) if os.path.exists(tac_file) else None
+
+    data_version = (frozenset(shard_versions.items()), tac_version, approximate, precision)
+    # Held from the version check to the cache update, so concurrent cold requests merge new shards once
+    with _cache_lock:
+        return _build_insights(data_dir, shard_versions, tac_file, data_version, approximate, precision)
@@ -0,0 +1,213 @@
+# hlr_vlr_series.py
+"""
+Daily HLR/VLR subscriber-base series ('Daily HLR Subs' in HLR_VLR_Subbase.xls).
+
+The sheet is parsed once into date-sorted NumPy arrays (one float array per
+subscriber column) shared by the subbase data route, the Chart.js route and
+the Dash app. For each column, ROLLING_WINDOWS-day rolling means and growth
+rates (change against the last value at least that many days earlier) are
+precomputed from running sums. These sums and the date search depend only
+on earlier rows.
+
+The sheet is read with xlrd, cell by cell. When the workbook is re-saved
+with rows appended, only the sheet is loaded (on demand) and only the rows
+from the stored offset on are read with row_values(); their rolling values
+are computed from the extended sums and the arrays are extended. The last
+cached row is re-read as an anchor: if it changed, or the header changed,
+or a new date is out of order, the whole sheet is re-parsed.
+"""
+import os
+import numpy as np
+import pandas as pd
+import xlrd
+
+HLR_VLR_FILE = 'HLR_VLR_Subbase.xls'
+HLR_VLR_SHEET = 'Daily HLR Subs'
+ROLLING_WINDOWS = (7, 30, 90)
+
+_hlr_vlr_cache = {}
+
+
+def _cell_value(value, ctype, datemode):
+    """Cell value as pandas' xlrd reader gives it: dates as datetime, integral numbers as int, blanks as NaN"""
+    if ctype == xlrd.XL_CELL_DATE:
+        return xlrd.xldate.xldate_as_datetime(value, datemode)
+    if ctype == xlrd.XL_CELL_NUMBER:
+        return int(value) if float(value).is_integer() else value
+    if ctype == xlrd.XL_CELL_BOOLEAN:
+        return bool(value)
+    if ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK, xlrd.XL_CELL_ERROR) or value == '':
+        return np.nan
+    return value
+
+
+def _read_rows(file_path, sheet_name, start=0):
+    """
+    (header, rows, row count) of a sheet: stripped column names, the converted data rows from
+    data row `start` on, and the total number of data rows. Rows before `start` are not read.
+    """
+    book = xlrd.open_workbook(file_path, on_demand=True)
+    try:
+        sheet = book.sheet_by_name(sheet_name)
+
+        def row(i):
+            return [_cell_value(v, t, book.datemode) for v, t in zip(sheet.row_values(i), sheet.row_types(i))]
+
+        header = [f'Unnamed: {i}' if pd.isna(v) else str(v).strip() for i, v in enumerate(row(0))] if sheet.nrows else []
+        return header, [row(i) for i in range(start + 1, sheet.nrows)], max(sheet.nrows - 1, 0)
+    finally:
+        book.release_resources()
+
+
+def _frame(header, rows):
+    """Data rows as a DataFrame, blank rows dropped (as read_excel does)"""
+    return pd.DataFrame(rows, columns=header).dropna(how='all')
+
+
+def _anchor(rows):
+    """Last row as (date label, float values); compared numerically since dtype inference differs between reads"""
+    if not rows:
+        return None
+    row = rows[-1]
+    return str(row[0]), pd.to_numeric(pd.Series(row[1:], dtype=object), errors='coerce').to_numpy(dtype=float)
+
+
+def _same_anchor(a, b):
+    return a is not None and b is not None and a[0] == b[0] and np.array_equal(a[1], b[1], equal_nan=True)
+
+
+def _cumulative(values):
+    """Running sum and count of the finite values, with a leading 0 (window sums are differences)"""
+    finite = np.isfinite(values)
+    return np.r_[0.0, np.cumsum(np.where(finite, values, 0.0))], np.r_[0, np.cumsum(finite)]
+
+
+def _window_stats(days, sums, counts, values, window, positions):
+    """Rolling mean over (day - window, day] and growth % against the last value at least `window` days earlier"""
+    day = days[positions]
+    start = np.searchsorted(days, day - window, side='right')
+    n = counts[positions + 1] - counts[start]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(n > 0, (sums[positions + 1] - sums[start]) / n, np.nan)
+        earlier = start - 1
+        base = np.where(earlier >= 0, values[np.maximum(earlier, 0)], np.nan)
+        growth = np.where(base != 0, (values[positions] / base - 1) * 100, np.nan)
+    return mean, growth
+
+
+def _columns(df, x_col, y_cols):
+    dates = pd.to_datetime(df[x_col], errors='coerce')
+    valid = dates.notnull().to_numpy()
+    return (
+        dates[valid].to_numpy(),
+        df[x_col].astype(str).to_numpy()[valid],
+        {col: pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=float)[valid] for col in y_cols},
+    )
+
+
+def _add_rolling(series, positions):
+    """Rolling arrays for `positions` (the appended rows) from the series' running sums"""
+    days = series['days']
+    rolling = {}
+    for col in series['y_cols']:
+        values = series['values'][col]
+        sums, counts = series['cumulative'][col]
+        for window in ROLLING_WINDOWS:
+            mean, growth = _window_stats(days, sums, counts, values, window, positions)
+            rolling[(col, f'mean_{window}d')] = mean
+            rolling[(col, f'growth_{window}d_pct')] = growth
+    return rolling
+
+
+def parse_hlr_vlr_series(file_path, sheet_name=HLR_VLR_SHEET):
+    """Full parse: date-sorted arrays plus rolling means and growth rates for every subscriber column"""
+    header, rows, sheet_rows = _read_rows(file_path, sheet_name)
+    df = _frame(header, rows)
+    x_col, y_cols = df.columns[0], list(df.columns[1:])
+    dates, labels, values = _columns(df, x_col, y_cols)
+    order = np.argsort(dates, kind='stable')
+    series = {
+        'x_col': x_col,
+        'y_cols': y_cols,
+        'dates': dates[order],
+        'labels': labels[order],
+        'values': {col: v[order] for col, v in values.items()},
+        'sheet_rows': sheet_rows,
+        'anchor': _anchor(rows),
+    }
+    series['days'] = series['dates'].astype('datetime64[D]').astype(np.int64)
+    series['cumulative'] = {col: _cumulative(series['values'][col]) for col in y_cols}
+    series['rolling'] = {}
+    for key, array in _add_rolling(series, np.arange(len(order))).items():
+        series['rolling'].setdefault(key[0], {})[key[1]] = array
+    return series
+
+
+def append_hlr_vlr_rows(series, file_path, sheet_name=HLR_VLR_SHEET):
+    """
+    Extend the series with rows appended to the sheet since it was parsed.
+    Returns None when the sheet no longer starts with the cached rows (caller re-parses).
+    """
+    if not series['sheet_rows']:
+        return None
+    # Re-read from the last cached row, so an edit to it is detected
+    header, rows, sheet_rows = _read_rows(file_path, sheet_name, start=series['sheet_rows'] - 1)
+    if header != [series['x_col']] + series['y_cols']:
+        return None
+    if not _same_anchor(_anchor(rows[:1]), series['anchor']):
+        return None
+    new = _frame(header, rows[1:])
+    dates, labels, values = _columns(new, series['x_col'], series['y_cols'])
+    if len(dates) and ((len(series['dates']) and dates[0] < series['dates'][-1]) or np.any(np.diff(dates) < np.timedelta64(0))):
+        return None
+    old_n = len(series['dates'])
+    series = dict(series)
+    series['dates'] = np.concatenate([series['dates'], dates])
+    series['labels'] = np.concatenate([series['labels'], labels])
+    series['days'] = series['dates'].astype('datetime64[D]').astype(np.int64)
+    series['values'] = {col: np.concatenate([series['values'][col], values[col]]) for col in series['y_cols']}
+    cumulative = {}
+    for col in series['y_cols']:
+        sums, counts = series['cumulative'][col]
+        new_sums, new_counts = _cumulative(values[col])
+        cumulative[col] = (np.r_[sums, sums[-1] + new_sums[1:]], np.r_[counts, counts[-1] + new_counts[1:]])
+    series['cumulative'] = cumulative
+    appended = _add_rolling(series, np.arange(old_n, len(series['dates'])))
+    series['rolling'] = {
+        col: {name: np.concatenate([array, appended[(col, name)]]) for name, array in stats.items()}
+        for col, stats in series['rolling'].items()
+    }
+    series['sheet_rows'] = sheet_rows
+    series['anchor'] = _anchor(rows)
+    return series
+
+
+def get_hlr_vlr_series(file_path, sheet_name=HLR_VLR_SHEET):
+    """Cached series for the workbook; a changed mtime appends the new rows, or re-parses when rows were edited"""
+    key = (file_path, sheet_name)
+    mtime = os.path.getmtime(file_path)
+    cached = _hlr_vlr_cache.get(key)
+    if cached is not None and cached['mtime'] != mtime:
+        series = append_hlr_vlr_rows(cached['series'], file_path, sheet_name)
+        if series is None:
+            cached = None
+        else:
+            print(f"[HLR VLR] Appended {len(series['dates']) - len(cached['series']['dates'])} rows from {os.path.basename(file_path)}")
+            cached = {'mtime': mtime, 'series': series}
+            _hlr_vlr_cache[key] = cached
+    if cached is None:
+        series = parse_hlr_vlr_series(file_path, sheet_name)
+        cached = {'mtime': mtime, 'series': series}
+        _hlr_vlr_cache[key] = cached
+        print(f"[HLR VLR] Parsed {len(series['dates'])} days x {len(series['y_cols'])} columns from {os.path.basename(file_path)}")
+    return cached['series']
+
+
+def latest_growth(series):
+    """Latest value, rolling means and growth rates per column (the summary the charts show)"""
+    summary = {}
+    for col in series['y_cols']:
+        values = series['values'][col]
+        summary[col] = {name: (None if not len(array) or np.isnan(array[-1]) else round(float(array[-1]), 3))
+                        for name, array in [('value', values)] + list(series['rolling'][col].items())}
+    return summary
@@ -0,0 +1,139 @@
+# hyperloglog.py
+"""
+Mergeable HyperLogLog distinct-count sketches built with NumPy.
+
+A sketch of precision p keeps 2**p one-byte registers, so its memory and
+count time do not grow with the number of values added. The relative standard
+error of a count is about 1.04 / sqrt(2**p):
+
+    p = 10  ->  1 KiB  per sketch, ~3.25 % error
+    p = 12  ->  4 KiB  per sketch, ~1.63 % error
+    p = 14  -> 16 KiB  per sketch, ~0.81 % error (default)
+    p = 16  -> 64 KiB  per sketch, ~0.41 % error
+
+About 95 % of estimates fall within two standard errors. Small cardinalities
+use linear counting, which is close to exact. Two sketches merge with an
+element-wise max, which gives exactly the sketch of the union of their
+inputs. A sketch can also be folded down to a lower precision.
+"""
+import numpy as np
+import pandas as pd
+
+MIN_PRECISION = 4
+MAX_PRECISION = 18
+DEFAULT_PRECISION = 14
+
+
+def relative_error(precision):
+    """Relative standard error of a count at the given precision"""
+    return 1.04 / np.sqrt(1 << precision)
+
+
+def _bit_length(values):
+    """Vectorized int.bit_length() for a uint64 array"""
+    values = values.copy()
+    length = np.zeros(values.shape, dtype=np.uint8)
+    for shift in (32, 16, 8, 4, 2, 1):
+        mask = values >= np.uint64(1 << shift)
+        length[mask] += shift
+        values[mask] >>= np.uint64(shift)
+    length += (values > 0).astype(np.uint8)
+    return length
+
+
+def _hash_values(values):
+    """64-bit hashes of arbitrary values (strings are hashed by content)"""
+    series = pd.Series(values).dropna().astype(str)
+    return pd.util.hash_pandas_object(series, index=False).to_numpy(dtype=np.uint64)
+
+
+class HyperLogLog:
+    def __init__(self, precision=DEFAULT_PRECISION, registers=None):
+        if not MIN_PRECISION <= precision <= MAX_PRECISION:
+            raise ValueError(f"precision must be between {MIN_PRECISION} and {MAX_PRECISION}")
+        self.precision = precision
+        self.m = 1 << precision
+        if registers is None:
+            registers = np.zeros(self.m, dtype=np.uint8)
+        self.registers = registers
+
+    def add_hashes(self, hashes):
+        """Add pre-hashed uint64 values"""
+        if len(hashes) == 0:
+            return self
+        p = np.uint64(self.precision)
+        index = (hashes >> (np.uint64(64) - p)).astype(np.int64)
+        rest = hashes & np.uint64((1 << (64 - self.precision)) - 1)
+        rank = (np.uint8(64 - self.precision + 1) - _bit_length(rest)).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+        return self
+
+    def add(self, values):
+        """Add an iterable / Series / array of values"""
+        return self.add_hashes(_hash_values(values))
+
+    def merge(self, other):
+        """In-place union with another sketch (folded to the lower precision if they differ)"""
+        if other.precision != self.precision:
+            if other.precision > self.precision:
+                other = other.fold(self.precision)
+            else:
+                folded = self.fold(other.precision)
+                self.precision, self.m, self.registers = folded.precision, folded.m, folded.registers
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def copy(self):
+        return HyperLogLog(self.precision, self.registers.copy())
+
+    def fold(self, precision):
+        """Return an equivalent sketch at a lower precision"""
+        if precision > self.precision:
+            raise ValueError("Cannot fold a sketch to a higher precision")
+        if precision == self.precision:
+            return self.copy()
+        drop = self.precision - precision
+        index = np.arange(self.m, dtype=np.uint64)
+        low_bits = index & np.uint64((1 << drop) - 1)
+        # Dropped index bits become the leading bits of the rank
+        rank = np.where(
+            low_bits > 0,
+            np.uint8(drop) - _bit_length(low_bits) + 1,
+            np.uint8(drop) + self.registers
+        ).astype(np.uint8)
+        rank[self.registers == 0] = 0
+        registers = np.zeros(1 << precision, dtype=np.uint8)
+        np.maximum.at(registers, (index >> np.uint64(drop)).astype(np.int64), rank)
+        return HyperLogLog(precision, registers)
+
+    def count(self):
+        """Estimated number of distinct values added"""
+        m = self.m
+        if m == 16:
+            alpha = 0.673
+        elif m == 32:
+            alpha = 0.697
+        elif m == 64:
+            alpha = 0.709
+        else:
+            alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)  # linear counting for small cardinalities
+        return int(round(estimate))
+
+    def __len__(self):
+        return self.count()
+
+    @classmethod
+    def union(cls, sketches, precision=None):
+        """Sketch of the union of several sketches"""
+        sketches = list(sketches)
+        if not sketches:
+            return cls(precision or DEFAULT_PRECISION)
+        precision = min([s.precision for s in sketches] + ([precision] if precision else []))
+        result = cls(precision)
+        for sketch in sketches:
+            result.merge(sketch)
+        return result
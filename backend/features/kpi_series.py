@@ -0,0 +1,163 @@
+# kpi_series.py
+"""
+Parsed KPI time series from the network KPI workbooks.
+
+A workbook sheet is read once per file mtime into sorted NumPy arrays:
+datetime64 dates, the original date labels, int years and float values.
+Routes slice these with searchsorted instead of re-reading the workbook
+(xlrd parse time is paid once, not per request). Long ranges can be
+downsampled for charts with LTTB or per-bucket min/max, both of which keep
+visual peaks.
+"""
+import os
+import numpy as np
+import pandas as pd
+
+CALL_DROP_RATE_FILE = 'Call_Drop_Rate_3G.xls'
+CALL_DROP_RATE_COLUMN = '3G Call Drop Rate'
+DOWNSAMPLE_METHODS = ('lttb', 'minmax')
+MIN_POINTS = 3
+
+_series_cache = {}
+
+
+def _read_sheet(file_path, sheet_name, fallback_sheet):
+    try:
+        return pd.read_excel(file_path, sheet_name=sheet_name)
+    except Exception:
+        if fallback_sheet is None:
+            raise
+        return pd.read_excel(file_path, sheet_name=fallback_sheet)
+
+
+def _value_column(df, preferred):
+    """preferred column, else the first '... drop ... rate ...' column, else the last column"""
+    if preferred in df.columns:
+        return preferred
+    for col in df.columns:
+        if 'drop' in col.lower() and 'rate' in col.lower():
+            return col
+    return df.columns[-1]
+
+
+def parse_kpi_series(file_path, sheet_name=1, fallback_sheet=0, value_col=CALL_DROP_RATE_COLUMN):
+    """Read one sheet into a date-sorted series (rows with an unparseable date are dropped)"""
+    df = _read_sheet(file_path, sheet_name, fallback_sheet)
+    df = df.rename(columns=lambda x: str(x).strip())
+    date_col = 'Start' if 'Start' in df.columns else df.columns[0]
+    value_col = _value_column(df, value_col)
+    df = df[df[date_col].notnull()]
+    dates = pd.to_datetime(df[date_col], errors='coerce')
+    valid = dates.notnull().to_numpy()
+    dates = dates[valid]
+    order = np.argsort(dates.to_numpy(), kind='stable')
+    values = pd.to_numeric(df[value_col], errors='coerce').to_numpy(dtype=float)[valid][order]
+    values[~np.isfinite(values)] = np.nan
+    return {
+        'dates': dates.to_numpy()[order],
+        'labels': df[date_col].astype(str).to_numpy()[valid][order],
+        'years': dates.dt.year.to_numpy()[order],
+        'values': values,
+        'date_col': date_col,
+        'value_col': value_col,
+        'columns': list(df.columns),
+    }
+
+
+def get_kpi_series(file_path, sheet_name=1, fallback_sheet=0, value_col=CALL_DROP_RATE_COLUMN):
+    """Cached series for a workbook sheet, re-parsed only when the file's mtime changes"""
+    key = (file_path, sheet_name, value_col)
+    mtime = os.path.getmtime(file_path)
+    cached = _series_cache.get(key)
+    if cached is None or cached['mtime'] != mtime:
+        series = parse_kpi_series(file_path, sheet_name, fallback_sheet, value_col)
+        cached = {'mtime': mtime, 'series': series}
+        _series_cache[key] = cached
+        print(f"[KPI SERIES] Parsed {len(series['dates'])} points from {os.path.basename(file_path)}")
+    return cached['series']
+
+
+def slice_series(series, start=None, end=None, min_year=None, last=None):
+    """Index range of the series within [start, end] (dates) and from min_year, optionally only the last N points"""
+    dates = series['dates']
+    lo, hi = 0, len(dates)
+    if min_year is not None:
+        lo = max(lo, int(np.searchsorted(series['years'], min_year, side='left')))
+    if start is not None:
+        lo = max(lo, int(np.searchsorted(dates, np.datetime64(start), side='left')))
+    if end is not None:
+        hi = min(hi, int(np.searchsorted(dates, np.datetime64(end), side='right')))
+    if last is not None:
+        lo = max(lo, hi - last)
+    return slice(lo, max(lo, hi))
+
+
+def json_values(values, fill=None):
+    """Float array as a JSON-safe list (NaN -> fill)"""
+    return [fill if np.isnan(v) else float(v) for v in values]
+
+
+def _lttb(x, y, points):
+    """Largest-Triangle-Three-Buckets: positions of `points` samples that keep the visual shape"""
+    n = len(x)
+    every = (n - 2) / (points - 2)
+    # Interior bucket b covers [edges[b], edges[b + 1]); first and last points are always kept
+    edges = np.floor(np.arange(points - 1) * every).astype(np.int64) + 1
+    edges[-1] = n - 1
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[:-1], edges[:-1]) / counts
+    mean_y = np.add.reduceat(y[:-1], edges[:-1]) / counts
+    # The bucket after the last interior one is the final point itself
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+    selected = np.empty(points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for b in range(points - 2):
+        lo, hi = edges[b], edges[b + 1]
+        # Twice the triangle area (a, candidate, next-bucket mean); the constant factor doesn't change the argmax
+        area = np.abs((x[a] - next_x[b]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y[b] - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[b + 1] = a
+    return selected
+
+
+def _minmax(y, points):
+    """Positions of the min and max of each of points // 2 equal buckets (plus first and last)"""
+    n = len(y)
+    buckets = max(points // 2, 1)
+    bucket = (np.arange(n) * buckets) // n
+    # Sort by (bucket, value): first of each bucket is its min, last is its max
+    order = np.lexsort((y, bucket))
+    starts = np.searchsorted(bucket[order], np.arange(buckets), side='left')
+    ends = np.searchsorted(bucket[order], np.arange(buckets), side='right') - 1
+    return np.unique(np.concatenate(([0, n - 1], order[starts], order[ends])))
+
+
+def downsample_indices(x, y, points, method='lttb'):
+    """
+    Positions (ascending) of at most ~points samples of the series that keep its
+    peaks. NaN values are skipped; series already within `points` are returned whole.
+    """
+    y = np.asarray(y, dtype=float)
+    if points is None or len(y) <= points:
+        return np.arange(len(y))
+    finite = np.flatnonzero(np.isfinite(y))
+    if len(finite) <= points:
+        return finite
+    x = np.asarray(x, dtype=float)[finite]
+    values = y[finite]
+    if method == 'minmax':
+        return finite[_minmax(values, points)]
+    return finite[_lttb(x, values, points)]
+
+
+def date_axis(dates):
+    """datetime64 dates as float days, the x axis used for LTTB"""
+    return dates.astype('datetime64[s]').astype(np.int64) / 86400.0
+
+
+def downsample_union(x, series, points, method='lttb'):
+    """Positions kept for several series sharing one x axis: the union of each series' samples"""
+    kept = [downsample_indices(x, values, points, method) for values in series]
+    return np.unique(np.concatenate(kept)) if kept else np.arange(len(x))
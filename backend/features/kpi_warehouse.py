@@ -0,0 +1,440 @@
+# kpi_warehouse.py
+"""
+Long-format KPI warehouse over the monthly KPI workbook drops
+(data_files/<YYYY_Month>/*.xls[x], e.g. 2025_June).
+
+Every dated sheet is normalised into rows of (date, element, kpi, value),
+with source and sheet kept alongside. The element is the network element
+or site the value belongs to: the NE-name column of tall sheets (e.g.
+"VMSC05"), the column header of wide per-element sheets, or ALL_ELEMENTS
+for network totals. Headers are mapped to canonical KPI names through
+KPI_ALIASES, since the yearly sheets name one metric differently. A KPI
+observed by several sheets of one workbook (pivot copies) is kept once.
+
+Rows are partitioned by data month and stored as one .npy per column:
+
+    <store>/month=2025-06/<source>/<column>.npy   (+ index.json)
+
+Each part is sorted by (element, kpi, date), and index.json maps every
+element to its row range. A windowed query mmaps only the months in the
+window and slices the element's range, without opening Excel. When the
+same workbook appears in several monthly folders, the newest folder wins.
+"""
+import glob
+import json
+import os
+import re
+import shutil
+import numpy as np
+import pandas as pd
+
+STORE_DIRNAME = 'kpi_warehouse'
+MANIFEST_FILE = 'manifest.json'
+INDEX_FILE = 'index.json'
+WORKBOOK_PATTERNS = ('*.xls', '*.xlsx')
+MONTH_FOLDER_PATTERN = re.compile(r'^(\d{4})_([A-Za-z]+)$')
+ALL_ELEMENTS = 'ALL'
+MIN_DATE = pd.Timestamp('2000-01-01')  # numbers parsed as dates land near the epoch
+
+ELEMENT_PATTERN = re.compile(r'^((?:V?MSC|RNC|BSC)\s*\d+)\.?$', re.IGNORECASE)
+ELEMENT_COLUMNS = ('NE Name', 'Site_ID', 'Site ID', 'Cell Name', 'VMSC')
+AGGREGATE_PATTERN = re.compile(r'^(.*?)\s*\b(grand total|total|average)$', re.IGNORECASE)
+IGNORED_COLUMNS = {'period', 'index', 'end time', 'query granularity', 'integrity'}
+SCHEMA_VERSION = 2  # bump when normalisation changes; stored parts of an older schema are re-ingested
+
+# workbook (source) -> sheet header -> canonical KPI. A dict value picks the name by the
+# sheet's technology prefix (e.g. sheet '3G-2017'). Headers not listed keep their label.
+KPI_ALIASES = {
+    '2G_Call_Drops_Rate': {
+        '2G_Call_Drops_Rate': '2G Call Drop Rate (%)',
+        'Call Drop Rate (%)': '2G Call Drop Rate (%)',
+        'Call drops': '2G Call Drop Rate (%)',
+    },
+    '2G_3G Call Set Up Time': {
+        '2G': '2G Call Setup Time (s)',
+        '3G': '3G Call Setup Time (s)',
+        '2G_3G Call Set Up Time': '2G Call Setup Time (s)',
+        'GSM Call Setup Time': '2G Call Setup Time (s)',
+        'Call setup time': '2G Call Setup Time (s)',
+        'Setup': '2G Call Setup Time (s)',
+        'Average Call Setup Time (s)': {'2G': '2G Call Setup Time (s)', '3G': '3G Call Setup Time (s)'},
+    },
+}
+SHEET_TECH_PATTERN = re.compile(r'^([234]G)\b', re.IGNORECASE)
+
+_warehouse_cache = {}
+
+
+def default_store_dir(data_dir):
+    return os.path.join(data_dir, STORE_DIRNAME)
+
+
+def source_name(path):
+    """Workbook name without its list number and extension: '5) 2G_3G Call Set Up Time.xlsx' -> '2G_3G Call Set Up Time'"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return re.sub(r'^\s*\d+\)\s*', '', stem).strip()
+
+
+def _folder_month(folder):
+    match = MONTH_FOLDER_PATTERN.match(os.path.basename(folder))
+    if not match:
+        return None
+    month = pd.to_datetime(f'{match.group(2)} {match.group(1)}', format='%B %Y', errors='coerce')
+    return None if pd.isna(month) else month
+
+
+def discover_workbooks(data_dir):
+    """source name -> newest workbook path across the monthly folders"""
+    folders = [(month, path) for path in glob.glob(os.path.join(data_dir, '*'))
+               if os.path.isdir(path) and (month := _folder_month(path)) is not None]
+    workbooks = {}
+    for _, folder in sorted(folders):
+        for pattern in WORKBOOK_PATTERNS:
+            for path in sorted(glob.glob(os.path.join(folder, pattern))):
+                workbooks[source_name(path)] = path
+    return workbooks
+
+
+def _label(value):
+    return ' '.join(str(value).split()) if pd.notna(value) else ''
+
+
+def _dates(column):
+    dates = pd.to_datetime(column, errors='coerce', format='mixed').dt.normalize()
+    return dates.where(dates >= MIN_DATE)
+
+
+def _date_layout(raw):
+    """(date column, first data row) of a raw sheet, or None when it has no date column"""
+    for col in raw.columns[:3]:
+        dates = _dates(raw[col])
+        valid = dates.notna().to_numpy()
+        if valid.sum() < max(3, 0.5 * len(raw)):
+            continue
+        first = int(np.argmax(valid))
+        if first > 0:
+            return col, first
+    return None
+
+
+def _header(raw, header_row):
+    """Column labels of the header row, prefixed groups (a sparse row above it) forward-filled"""
+    labels = [_label(v) for v in raw.iloc[header_row]]
+    groups = [''] * len(labels)
+    if header_row > 0:
+        above = [_label(v) for v in raw.iloc[header_row - 1]]
+        # Group row: blank above the date column, labels over some value columns (pivot titles sit in column 0)
+        if not above[0] and any(above[1:]) and not any(ELEMENT_PATTERN.match(a) for a in above):
+            current = ''
+            for i, value in enumerate(above):
+                current = value or current
+                groups[i] = current if i else ''
+    return labels, groups
+
+
+def _element(value):
+    """Canonical element name: 'VMSC 07' and 'vmsc07' -> 'VMSC07'"""
+    return re.sub(r'\s+', '', str(value)).upper()
+
+
+def _kpi_name(source, sheet, label):
+    """Canonical KPI for a sheet header (see KPI_ALIASES)"""
+    alias = KPI_ALIASES.get(source, {}).get(label, label)
+    if isinstance(alias, dict):
+        tech = SHEET_TECH_PATTERN.match(str(sheet))
+        return alias.get(tech.group(1).upper() if tech else None, label)
+    return alias
+
+
+def _value_columns(raw, labels, data, date_col):
+    columns = []
+    for i, col in enumerate(raw.columns):
+        label = labels[i]
+        if col == date_col or not label or label.lower() in IGNORED_COLUMNS or re.fullmatch(r'[\d.]+', label):
+            continue
+        values = pd.to_numeric(data[col], errors='coerce')
+        if values.notna().sum() >= max(1, 0.5 * data[col].notna().sum()):
+            columns.append((i, col, values))
+    return columns
+
+
+def _element_column(raw, labels, data, date_col):
+    """Column holding element names in tall sheets (mostly VMSC/RNC/BSC names, or a known label)"""
+    for i, col in enumerate(raw.columns):
+        if col == date_col:
+            continue
+        values = data[col].dropna().astype(str).str.strip()
+        if len(values) and values.str.match(ELEMENT_PATTERN).mean() >= 0.5:
+            return col
+    for i, col in enumerate(raw.columns):
+        if labels[i] in ELEMENT_COLUMNS:
+            return col
+    return None
+
+
+def normalize_sheet(raw, source, sheet):
+    """Long rows (date, element, kpi, value, source, sheet) of one raw sheet (read with header=None)"""
+    raw = raw.dropna(how='all', axis=1)
+    layout = _date_layout(raw) if len(raw) else None
+    if layout is None:
+        return None
+    date_col, first = layout
+    labels, groups = _header(raw, first - 1)
+    data = raw.iloc[first:]
+    dates = _dates(data[date_col])
+    element_col = _element_column(raw, labels, data, date_col)
+    frames = []
+    for i, col, values in _value_columns(raw, labels, data, date_col):
+        if col == element_col:
+            continue
+        label, group = labels[i], groups[i]
+        element_match = ELEMENT_PATTERN.match(label)
+        aggregate = AGGREGATE_PATTERN.match(label)
+        if element_col is not None:
+            element, kpi = data[element_col].map(_element), label
+        elif element_match:
+            element, kpi = _element(element_match.group(1)), group or source
+        elif aggregate and (group or not aggregate.group(1)):
+            element, kpi = ALL_ELEMENTS, aggregate.group(1) or group or source
+        else:
+            element, kpi = ALL_ELEMENTS, f'{group} {label}'.strip()
+        frames.append(pd.DataFrame({'date': dates, 'element': element, 'kpi': _kpi_name(source, sheet, kpi), 'value': values}))
+    if not frames:
+        return None
+    rows = pd.concat(frames, ignore_index=True).dropna(subset=['date', 'value'])
+    return rows.assign(source=source, sheet=str(sheet))
+
+
+def normalize_workbook(path):
+    """All sheets of a workbook as long rows, one value per (date, element, kpi)"""
+    source = source_name(path)
+    frames = []
+    for sheet, raw in pd.read_excel(path, sheet_name=None, header=None).items():
+        rows = normalize_sheet(raw, source, sheet)
+        if rows is not None and len(rows):
+            frames.append(rows)
+    if not frames:
+        return pd.DataFrame(columns=['date', 'element', 'kpi', 'value', 'source', 'sheet'])
+    rows = pd.concat(frames, ignore_index=True)
+    # Pivot copies repeat KPIs across sheets; the first sheet that has a value wins
+    return rows.drop_duplicates(['date', 'element', 'kpi'], keep='first').reset_index(drop=True)
+
+
+def _load_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_json(path, payload):
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(payload, f, indent=1)
+    os.replace(temp_path, path)
+
+
+def _write_part(part_dir, rows):
+    """Write one (month, source) part sorted by (element, kpi, date) with its element index"""
+    rows = rows.sort_values(['element', 'kpi', 'date'], kind='mergesort').reset_index(drop=True)
+    temp_dir = part_dir + '.tmp'
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    os.makedirs(temp_dir)
+    categories = {}
+    for column in ('element', 'kpi', 'sheet'):
+        codes, uniques = pd.factorize(rows[column].astype(str), sort=True)
+        np.save(os.path.join(temp_dir, column + '.npy'), codes.astype(np.int32))
+        categories[column] = uniques.tolist()
+    np.save(os.path.join(temp_dir, 'date.npy'), rows['date'].to_numpy(dtype='datetime64[ns]').view(np.int64))
+    np.save(os.path.join(temp_dir, 'value.npy'), rows['value'].to_numpy(dtype=np.float64))
+    elements = rows['element'].to_numpy()
+    bounds = np.flatnonzero(np.r_[True, elements[1:] != elements[:-1], True])
+    index = {str(elements[s]): [int(s), int(e)] for s, e in zip(bounds[:-1], bounds[1:])}
+    _save_json(os.path.join(temp_dir, INDEX_FILE), {'categories': categories, 'elements': index})
+    shutil.rmtree(part_dir, ignore_errors=True)
+    os.replace(temp_dir, part_dir)
+
+
+def ingest_workbook(path, store_dir):
+    """Normalise a workbook into month partitions; returns (parts, catalog entry)"""
+    rows = normalize_workbook(path)
+    source = source_name(path)
+    parts = []
+    months = rows['date'].dt.strftime('%Y-%m')
+    for month, frame in rows.groupby(months, sort=True):
+        part = os.path.join(f'month={month}', source)
+        _write_part(os.path.join(store_dir, part), frame)
+        parts.append(part)
+    catalog = {
+        'kpis': sorted(rows['kpi'].unique().tolist()),
+        'elements': sorted(rows['element'].unique().tolist()),
+        'rows': int(len(rows)),
+        'first_date': rows['date'].min().strftime('%Y-%m-%d') if len(rows) else None,
+        'last_date': rows['date'].max().strftime('%Y-%m-%d') if len(rows) else None,
+    }
+    # element -> kpi -> latest date, so a trailing window ends at that element's own data
+    last_dates = {}
+    for (element, kpi), date in rows.groupby(['element', 'kpi'])['date'].max().items():
+        last_dates.setdefault(element, {})[kpi] = date.strftime('%Y-%m-%d')
+    catalog['last_dates'] = last_dates
+    return parts, catalog
+
+
+def sync_kpi_warehouse(data_dir, store_dir=None):
+    """Ingest new or changed workbooks of the monthly folders; drop parts of workbooks no longer present"""
+    store_dir = store_dir or default_store_dir(data_dir)
+    os.makedirs(store_dir, exist_ok=True)
+    manifest_path = os.path.join(store_dir, MANIFEST_FILE)
+    manifest = _load_json(manifest_path, {'sources': {}})
+    workbooks = discover_workbooks(data_dir)
+    changed = False
+    for source in list(manifest['sources']):
+        if source not in workbooks:
+            for part in manifest['sources'].pop(source)['parts']:
+                shutil.rmtree(os.path.join(store_dir, part), ignore_errors=True)
+            changed = True
+    for source, path in workbooks.items():
+        stat = os.stat(path)
+        version = [os.path.relpath(path, data_dir), stat.st_mtime, stat.st_size]
+        entry = manifest['sources'].get(source)
+        if entry and entry['version'] == version and entry.get('schema') == SCHEMA_VERSION:
+            continue
+        if entry:
+            for part in entry['parts']:
+                shutil.rmtree(os.path.join(store_dir, part), ignore_errors=True)
+        parts, catalog = ingest_workbook(path, store_dir)
+        manifest['sources'][source] = {'version': version, 'schema': SCHEMA_VERSION, 'parts': parts, **catalog}
+        changed = True
+        print(f"[KPI WAREHOUSE] Ingested {version[0]}: {catalog['rows']} rows into {len(parts)} month(s)")
+    if changed:
+        _save_json(manifest_path, manifest)
+    return manifest
+
+
+def get_kpi_warehouse(data_dir):
+    """Synced manifest of the warehouse; the sync runs at most once per change of the monthly folders"""
+    workbooks = discover_workbooks(data_dir)
+    version = tuple(sorted((s, p, os.path.getmtime(p)) for s, p in workbooks.items()))
+    if _warehouse_cache.get('version') != version:
+        _warehouse_cache['manifest'] = sync_kpi_warehouse(data_dir)
+        _warehouse_cache['version'] = version
+    return _warehouse_cache['manifest']
+
+
+def _read_range(part_dir, start, end):
+    index = _load_json(os.path.join(part_dir, INDEX_FILE), None)
+    data = {}
+    for column in ('date', 'value', 'element', 'kpi', 'sheet'):
+        array = np.load(os.path.join(part_dir, column + '.npy'), mmap_mode='r')
+        data[column] = np.asarray(array[start:end])
+    frame = pd.DataFrame({
+        'date': data['date'].view('datetime64[ns]'),
+        'element': np.asarray(index['categories']['element'], dtype=object)[data['element']],
+        'kpi': np.asarray(index['categories']['kpi'], dtype=object)[data['kpi']],
+        'value': data['value'],
+        'sheet': np.asarray(index['categories']['sheet'], dtype=object)[data['sheet']],
+    })
+    return frame
+
+
+def _empty_rows():
+    return pd.DataFrame({
+        'date': pd.Series(dtype='datetime64[ns]'),
+        'element': pd.Series(dtype=object),
+        'kpi': pd.Series(dtype=object),
+        'value': pd.Series(dtype=np.float64),
+        'sheet': pd.Series(dtype=object),
+        'source': pd.Series(dtype=object),
+    })
+
+
+def _sources(manifest, source):
+    return {name: entry for name, entry in manifest['sources'].items() if source in (None, name)}
+
+
+def kpi_last_date(manifest, element=None, kpi=None, source=None):
+    """Latest date (YYYY-MM-DD) held for the element/KPI filter, or None; older than the window end means stale data"""
+    element = _element(element) if element is not None else None
+    dates = []
+    for entry in _sources(manifest, source).values():
+        by_element = entry.get('last_dates', {})
+        for name in ([element] if element is not None else by_element):
+            dates += [date for k, date in by_element.get(name, {}).items() if kpi in (None, k)]
+    return max(dates) if dates else None
+
+
+def kpi_window(manifest, source=None, start=None, end=None, days=None):
+    """
+    (start, end) Timestamps (None when open) of a query. days selects the trailing
+    window ending at end, or at the warehouse's last date (of the source, when given).
+    """
+    if end is None and days is not None:
+        last_dates = [entry['last_date'] for entry in _sources(manifest, source).values() if entry.get('last_date')]
+        end = max(last_dates) if last_dates else None
+    end_ts = pd.Timestamp(end) if end else None
+    start_ts = pd.Timestamp(start) if start else None
+    if days is not None and end_ts is not None:
+        window_start = end_ts - pd.Timedelta(days=days - 1)
+        start_ts = max(start_ts, window_start) if start_ts is not None else window_start
+    return start_ts, end_ts
+
+
+def query_kpis(store_dir, manifest, element=None, kpi=None, source=None, start=None, end=None, days=None):
+    """
+    Long rows matching the filters, sorted by date. start/end are YYYY-MM-DD
+    (inclusive); days selects the trailing window ending at end, or at the
+    warehouse's last date when end is not given (see kpi_window).
+    """
+    element = _element(element) if element is not None else None
+    sources = _sources(manifest, source)
+    start_ts, end_ts = kpi_window(manifest, source, start, end, days)
+    first_month = start_ts.strftime('%Y-%m') if start_ts is not None else None
+    last_month = end_ts.strftime('%Y-%m') if end_ts is not None else None
+
+    frames = []
+    for name, entry in sources.items():
+        if element is not None and element not in entry['elements']:
+            continue
+        for part in entry['parts']:
+            month = part.split(os.sep)[0].split('=', 1)[1]
+            if (first_month and month < first_month) or (last_month and month > last_month):
+                continue
+            part_dir = os.path.join(store_dir, part)
+            if element is None:
+                start_row, end_row = 0, None
+            else:
+                bounds = _load_json(os.path.join(part_dir, INDEX_FILE), {})['elements'].get(element)
+                if bounds is None:
+                    continue
+                start_row, end_row = bounds
+            frame = _read_range(part_dir, start_row, end_row)
+            frames.append(frame.assign(source=name))
+    if not frames:
+        return _empty_rows()
+    rows = pd.concat(frames, ignore_index=True)
+    mask = np.ones(len(rows), dtype=bool)
+    if kpi is not None:
+        mask &= (rows['kpi'] == kpi).to_numpy()
+    if start_ts is not None:
+        mask &= (rows['date'] >= start_ts).to_numpy()
+    if end_ts is not None:
+        mask &= (rows['date'] <= end_ts).to_numpy()
+    return rows[mask].sort_values(['date', 'source', 'kpi', 'element'], kind='mergesort').reset_index(drop=True)
+
+
+def kpi_catalog(manifest):
+    """Sources with their KPIs, elements and date range"""
+    return {
+        name: {key: entry[key] for key in ('kpis', 'elements', 'rows', 'first_date', 'last_date')}
+        | {'file': entry['version'][0]}
+        for name, entry in manifest['sources'].items()
+    }
+
+
+if __name__ == "__main__":
+    import sys
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data_files'))
+    manifest = sync_kpi_warehouse(data_dir)
+    for name, entry in kpi_catalog(manifest).items():
+        print(f"[KPI WAREHOUSE] {name}: {entry['rows']} rows, {len(entry['kpis'])} KPIs, "
+              f"{len(entry['elements'])} elements, {entry['first_date']} to {entry['last_date']}")
@@ -103,12 +103,8 @@ def get_lte_utilization_by_cell_code(cell_code, lte_df=None):
     
     return records
 
-def get_all_lte_utilization_data(filters=None, sort_by=None, sort_order='asc'):
-    lte_df = load_lte_utilization_data()
-    
-    if lte_df is None:
-        return []
-    
+def filter_lte_utilization_df(lte_df, filters=None, sort_by=None, sort_order='asc'):
+    """Filter, sort and project the LTE utilization frame without materializing records"""
     # Apply filters if provided
     if filters:
         for column, value in filters.items():
@@ -139,7 +135,16 @@ def get_all_lte_utilization_data(filters=None, sort_by=None, sort_order='asc'):
     
     # Only include columns that exist in the dataframe
     available_columns = [col for col in columns_to_include if col in lte_df.columns]
-    result_data = lte_df[available_columns]
+    return lte_df[available_columns]
+
+def get_all_lte_utilization_data(filters=None, sort_by=None, sort_order='asc'):
+    lte_df = load_lte_utilization_data()
+    
+    if lte_df is None:
+        return []
+    
+    result_data = filter_lte_utilization_df(lte_df, filters, sort_by, sort_order)
+    available_columns = list(result_data.columns)
     
     # Convert to dictionary records and handle NaN values
     records = []
@@ -0,0 +1,147 @@
+# map_store.py
+"""
+Content-addressed store for rendered folium map HTML.
+
+A map is keyed by a hash of the inputs it is drawn from (coordinates, site,
+district, cell identifiers), so every subscriber on the same cell shares one
+file. Files are written to a temp name and renamed into place, so readers
+never see a partial map. The store keeps an LRU order over its files and
+evicts the least recently used ones once the total size exceeds the byte
+budget. Maps are handed out as HTML bytes read under the store lock, never
+as paths, so an eviction cannot delete a map between lookup and serving. On startup it adopts the files already in its directory and deletes
+leftover temp files and legacy per-MSISDN maps.
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+
+MAP_EXTENSION = '.html'
+TEMP_SUFFIX = '.tmp'
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+LEGACY_MAP_PATTERN = re.compile(r"^temp_map_\d+\.html$")
+MAP_INPUT_FIELDS = ['Lat', 'Lon', 'Sitename', 'District', 'Region', 'Cellcode', 'LAC', 'SAC']
+
+
+def map_key(inputs):
+    """Stable hash of the values a map is rendered from"""
+    payload = json.dumps(inputs, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+def location_map_key(result_data):
+    """Key for a subscriber location map; the MSISDN is deliberately left out"""
+    return map_key({field: result_data.get(field) for field in MAP_INPUT_FIELDS})
+
+
+class MapArtifactStore:
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES, legacy_dir=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.legacy_dir = legacy_dir
+        self._entries = OrderedDict()  # key -> size in bytes, least recently used first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.reconcile()
+
+    def path_for(self, key):
+        return os.path.join(self.directory, key + MAP_EXTENSION)
+
+    def reconcile(self):
+        """Rebuild the LRU from the files on disk and remove orphans"""
+        removed = 0
+        found = []
+        with self._lock:
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                if name.endswith(TEMP_SUFFIX):
+                    removed += self._remove(path)
+                elif name.endswith(MAP_EXTENSION):
+                    stat = os.stat(path)
+                    found.append((stat.st_atime, name[:-len(MAP_EXTENSION)], stat.st_size))
+            if self.legacy_dir and os.path.isdir(self.legacy_dir):
+                for name in os.listdir(self.legacy_dir):
+                    if LEGACY_MAP_PATTERN.match(name):
+                        removed += self._remove(os.path.join(self.legacy_dir, name))
+            self._entries.clear()
+            self._bytes = 0
+            for _, key, size in sorted(found):
+                self._entries[key] = size
+                self._bytes += size
+            evicted = self._evict()
+        print(f"[MAP STORE] Adopted {len(self._entries)} map(s) ({self._bytes} bytes), removed {removed} orphan(s), evicted {evicted}")
+
+    def contains(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key):
+        """HTML of a stored map (marking it recently used), or None"""
+        path = self.path_for(key)
+        with self._lock:
+            if key not in self._entries:
+                return None
+            try:
+                with open(path, 'rb') as f:
+                    html = f.read()
+            except FileNotFoundError:
+                self._bytes -= self._entries.pop(key)
+                return None
+            self._entries.move_to_end(key)
+        return html
+
+    def put(self, key, map_obj):
+        """Save a folium map atomically under key and return its HTML"""
+        path = self.path_for(key)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix=key + '.', suffix=TEMP_SUFFIX)
+        os.close(fd)
+        try:
+            map_obj.save(temp_path)
+            with open(temp_path, 'rb') as f:
+                html = f.read()
+            os.replace(temp_path, path)
+        except Exception:
+            self._remove(temp_path)
+            raise
+        size = len(html)
+        with self._lock:
+            self._bytes += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._evict(keep=key)
+        return html
+
+    def get_or_create(self, key, render):
+        """Return the stored map HTML for key, rendering it with render() on a miss"""
+        html = self.get(key)
+        if html is not None:
+            return html
+        return self.put(key, render())
+
+    def stats(self):
+        with self._lock:
+            return {'maps': len(self._entries), 'bytes': self._bytes, 'max_bytes': self.max_bytes}
+
+    def _evict(self, keep=None):
+        """Drop least recently used maps until under budget (caller holds the lock)"""
+        evicted = 0
+        for key in list(self._entries):
+            if self._bytes <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            self._bytes -= self._entries.pop(key)
+            self._remove(self.path_for(key))
+            evicted += 1
+        return evicted
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+            return 1
+        except OSError:
+            return 0
@@ -0,0 +1,171 @@
+# mobility.py
+"""
+Subscriber mobility profiles from the VLRD common cells.
+
+For each MSISDN: radius of gyration around the centroid of its located cells,
+the largest distance between any two of its cells, the home (most frequent)
+cell and the number of distinct districts. The batch builder works on the
+MSISDN-sorted VLRD index. Per-subscriber sums are np.bincount over a group id
+per row. Pairwise distances are computed for subscribers with the same
+cell count together, as (subscribers, n, n) arrays of bounded size.
+"""
+import numpy as np
+import pandas as pd
+from spatial_index import haversine_km
+from vlrd_index import get_common_cells
+
+# Triage bands on the max inter-cell distance (km)
+STATIONARY_KM = 2.0
+LOCAL_KM = 20.0
+PROFILE_CACHE_SIZE = 10000
+PAIRWISE_CHUNK = 1 << 21  # distances per (subscribers, n, n) batch in the table builder
+
+PROFILE_COLUMNS = ['MSISDN', 'cell_count', 'located_cells', 'radius_of_gyration_km',
+                   'max_inter_cell_km', 'home_cell', 'home_site', 'district_count', 'mobility_class']
+
+_profile_cache = {}
+_table_cache = {}
+
+
+def mobility_class(max_inter_cell_km, located_cells):
+    if located_cells == 0:
+        return 'unknown'
+    if max_inter_cell_km < STATIONARY_KM:
+        return 'stationary'
+    if max_inter_cell_km < LOCAL_KM:
+        return 'local'
+    return 'roaming'
+
+
+def _coordinates(cells):
+    lat = pd.to_numeric(pd.Series(cells['LAT'], dtype=object), errors='coerce').to_numpy(dtype=float)
+    lon = pd.to_numeric(pd.Series(cells['LON'], dtype=object), errors='coerce').to_numpy(dtype=float)
+    return lat, lon
+
+
+def _home_cell(cell_codes, site_names):
+    """Most frequent cell code (first seen wins ties) and its site"""
+    if not len(cell_codes):
+        return None, None
+    codes, first, counts = np.unique(cell_codes.astype(str), return_index=True, return_counts=True)
+    best = first[np.lexsort((first, -counts))[0]]
+    cell, site = cell_codes[best], site_names[best]
+    return (None if pd.isna(cell) else str(cell)), (None if pd.isna(site) else str(site))
+
+
+def compute_mobility_profile(cells, msisdn=None):
+    """Profile of one subscriber from its common cells ({column: array}, see vlrd_index)"""
+    lat, lon = _coordinates(cells)
+    located = np.isfinite(lat) & np.isfinite(lon)
+    lat, lon = lat[located], lon[located]
+    radius = max_distance = 0.0
+    if len(lat):
+        centroid_lat, centroid_lon = lat.mean(), lon.mean()
+        radius = float(np.sqrt(np.mean(haversine_km(centroid_lat, centroid_lon, lat, lon) ** 2)))
+        max_distance = float(haversine_km(lat[:, None], lon[:, None], lat[None, :], lon[None, :]).max())
+    home_cell, home_site = _home_cell(cells['CELL_CODE'], cells['SITE_NAME'])
+    districts = {str(d).upper() for d in cells['DISTRICT'] if pd.notna(d)}
+    return {
+        'MSISDN': msisdn,
+        'cell_count': int(len(cells['CELL_CODE'])),
+        'located_cells': int(len(lat)),
+        'radius_of_gyration_km': round(radius, 3),
+        'max_inter_cell_km': round(max_distance, 3),
+        'home_cell': home_cell,
+        'home_site': home_site,
+        'district_count': len(districts),
+        'mobility_class': mobility_class(max_distance, len(lat)),
+    }
+
+
+def get_mobility_profile(vlrd_index, msisdn):
+    """Online profile for one MSISDN, cached per index version (indexes built without one are not cached)"""
+    version = vlrd_index.get('version')
+    if version is None:
+        return compute_mobility_profile(get_common_cells(vlrd_index, msisdn), str(msisdn))
+    key = (version, str(msisdn))
+    profile = _profile_cache.get(key)
+    if profile is None:
+        profile = compute_mobility_profile(get_common_cells(vlrd_index, msisdn), str(msisdn))
+        if len(_profile_cache) >= PROFILE_CACHE_SIZE:
+            _profile_cache.pop(next(iter(_profile_cache)))
+        _profile_cache[key] = profile
+    return profile
+
+
+def _max_pairwise(lat, lon, starts, sizes):
+    """Max pairwise distance per group, batching groups of equal size (at most PAIRWISE_CHUNK distances per batch)"""
+    result = np.zeros(len(starts))
+    for size in np.unique(sizes[sizes > 1]):
+        same_size = np.flatnonzero(sizes == size)
+        step = max(1, PAIRWISE_CHUNK // (int(size) * int(size)))
+        for chunk in range(0, len(same_size), step):
+            groups = same_size[chunk:chunk + step]
+            rows = starts[groups][:, None] + np.arange(size)[None, :]
+            glat, glon = lat[rows], lon[rows]
+            distances = haversine_km(glat[:, :, None], glon[:, :, None], glat[:, None, :], glon[:, None, :])
+            result[groups] = distances.reshape(len(groups), -1).max(axis=1)
+    return result
+
+
+def build_mobility_table(vlrd_index):
+    """Mobility profiles of every MSISDN in the VLRD index as a DataFrame"""
+    msisdns = vlrd_index['msisdn']
+    if not len(msisdns):
+        return pd.DataFrame(columns=PROFILE_COLUMNS)
+    columns = vlrd_index['columns']
+    keys, counts = np.unique(msisdns, return_counts=True)
+    group = np.repeat(np.arange(len(keys)), counts)
+
+    lat, lon = _coordinates(columns)
+    located = np.isfinite(lat) & np.isfinite(lon)
+    # Located rows stay grouped by MSISDN, since the index is sorted
+    loc_group = group[located]
+    lat, lon = lat[located], lon[located]
+    located_counts = np.bincount(loc_group, minlength=len(keys))
+    safe_counts = np.maximum(located_counts, 1)
+    centroid_lat = np.bincount(loc_group, weights=lat, minlength=len(keys)) / safe_counts
+    centroid_lon = np.bincount(loc_group, weights=lon, minlength=len(keys)) / safe_counts
+    squared = haversine_km(centroid_lat[loc_group], centroid_lon[loc_group], lat, lon) ** 2
+    radius = np.sqrt(np.bincount(loc_group, weights=squared, minlength=len(keys)) / safe_counts)
+    loc_starts = np.concatenate(([0], np.cumsum(located_counts)[:-1]))
+    max_distance = _max_pairwise(lat, lon, loc_starts, located_counts)
+
+    rows = pd.DataFrame({
+        'MSISDN': msisdns,
+        'CELL_CODE': columns['CELL_CODE'].astype(str),
+        'SITE_NAME': columns['SITE_NAME'],
+        'DISTRICT': pd.Series(columns['DISTRICT'], dtype=object).str.upper(),
+    })
+    cell_counts = rows.groupby(['MSISDN', 'CELL_CODE'], sort=False).size().rename('hits').reset_index()
+    home = cell_counts.sort_values('hits', ascending=False, kind='mergesort').drop_duplicates('MSISDN')
+    home = home.merge(rows.drop_duplicates(['MSISDN', 'CELL_CODE']), on=['MSISDN', 'CELL_CODE'], how='left')
+    home = home.set_index('MSISDN').reindex(keys)
+    districts = rows.groupby('MSISDN')['DISTRICT'].nunique().reindex(keys)
+
+    table = pd.DataFrame({
+        'MSISDN': keys.astype(str),
+        'cell_count': counts,
+        'located_cells': located_counts,
+        'radius_of_gyration_km': np.round(radius, 3),
+        'max_inter_cell_km': np.round(max_distance, 3),
+        'home_cell': home['CELL_CODE'].to_numpy(),
+        'home_site': home['SITE_NAME'].astype(object).where(home['SITE_NAME'].notna(), None).to_numpy(),
+        'district_count': districts.to_numpy(dtype=np.int64),
+    })
+    table['mobility_class'] = np.select(
+        [located_counts == 0, max_distance < STATIONARY_KM, max_distance < LOCAL_KM],
+        ['unknown', 'stationary', 'local'],
+        'roaming'
+    )
+    return table
+
+
+def get_mobility_table(vlrd_index):
+    """Batch table for the index, built once per index version"""
+    version = vlrd_index.get('version')
+    if version is None or _table_cache.get('version') != version:
+        _table_cache['table'] = build_mobility_table(vlrd_index)
+        _table_cache['version'] = version
+        print(f"[MOBILITY] Built profiles for {len(_table_cache['table'])} subscribers")
+    return _table_cache['table']
@@ -1,6 +1,26 @@
-def get_msisdn_data(msisdn, INPUT_FILE, SIM_TYPE_MAPPING, ref_df, tac_df, usage_df, USAGE_FILES, VLRD, fetch_rsrp_data_by_site_id, fetch_rsrp_data_directly, fetch_lte_util_by_site_id=None, fetch_lte_util_by_cell_code=None):
-    with open(INPUT_FILE, "r") as file:
-        lines = file.readlines()
+import pandas as pd
+from block_store import is_block_file, lookup_lines
+from cell_locator import get_cell_locator, resolve_cell
+from mobility import get_mobility_profile
+from vlrd_index import build_vlrd_index, get_common_cells, is_vlrd_index, iter_common_cells
+
+def _common_cell_anchors(vlrd_index, msisdn, lac):
+    """LAT/LON of the subscriber's VLRD cells, preferring those in the given LAC"""
+    cells = get_common_cells(vlrd_index, msisdn)
+    lat = pd.to_numeric(pd.Series(cells['LAT']), errors='coerce')
+    lon = pd.to_numeric(pd.Series(cells['LON']), errors='coerce')
+    valid = lat.notna() & lon.notna()
+    same_lac = valid & (pd.to_numeric(pd.Series(cells['LAC']), errors='coerce') == lac)
+    use = same_lac if same_lac.any() else valid
+    return lat[use].to_numpy(), lon[use].to_numpy()
+
+def get_msisdn_data(msisdn, INPUT_FILE, SIM_TYPE_MAPPING, ref_df, tac_df, usage_df, USAGE_FILES, VLRD, fetch_rsrp_data_by_site_id, fetch_rsrp_data_directly, fetch_lte_util_by_site_id=None, fetch_lte_util_by_cell_code=None, ref_version=None):
+    if is_block_file(INPUT_FILE):
+        # Indexed lookup: only the block holding this MSISDN is decompressed
+        lines = lookup_lines(INPUT_FILE, msisdn)
+    else:
+        with open(INPUT_FILE, "r") as file:
+            lines = file.readlines()
     for line in lines:
         columns = line.strip().split(";")
         if len(columns) < 5:
@@ -18,6 +38,9 @@ def get_msisdn_data(msisdn, INPUT_FILE, SIM_TYPE_MAPPING, ref_df, tac_df, usage_
                 if imsi_digit in SIM_TYPE_MAPPING:
                     sim_type, connection_type = SIM_TYPE_MAPPING[imsi_digit]
             lac_dec = sac_dec = "Not Found"
+            location_match = "Not Found"
+            # VLRD may be passed pre-indexed (see vlrd_index); build the index on the fly otherwise
+            vlrd_index = VLRD if is_vlrd_index(VLRD) else build_vlrd_index(VLRD, ref_df)
             if location.strip():
                 import re
                 match = re.match(r"(\d+)-(\w+)-([a-fA-F0-9]+)", location)
@@ -25,25 +48,19 @@ def get_msisdn_data(msisdn, INPUT_FILE, SIM_TYPE_MAPPING, ref_df, tac_df, usage_
                     try:
                         lac_dec = int(match.group(2), 16)
                         sac_dec = int(match.group(3), 16)
-                        matched_row = ref_df[(ref_df['lac'] == lac_dec) & (ref_df['cellid'] == sac_dec)]
-                        if not matched_row.empty:
-                            row = matched_row.iloc[0]
-                            sitename = row['sitename']
+                        # Exact (lac, cellid) hit, else the best cell of the same LAC
+                        locator = get_cell_locator(ref_df, ref_version)
+                        anchors = None
+                        if (lac_dec, sac_dec) not in locator['exact'] and vlrd_index['size']:
+                            anchors = _common_cell_anchors(vlrd_index, msisdn, lac_dec)
+                        row, location_match = resolve_cell(locator, lac_dec, sac_dec, anchors)
+                        if row is not None:
+                            sitename = row['sitename'] if location_match == 'exact' else f"{row['sitename']} (Approximate)"
                             cellcode = row['cellcode']
                             lon = float(row['lon'])
                             lat = float(row['lat'])
                             region = row['region']
                             district = row['district']
-                        else:
-                            alt_match = ref_df[ref_df['lac'] == lac_dec]
-                            if not alt_match.empty:
-                                closest_match = alt_match.iloc[0]
-                                sitename = f"{closest_match['sitename']} (Approximate)"
-                                cellcode = closest_match['cellcode']
-                                lon = float(closest_match['lon'])
-                                lat = float(closest_match['lat'])
-                                region = closest_match['region']
-                                district = closest_match['district']
                     except ValueError:
                         return {"error": "Invalid hex values for LAC or SAC"}
                     except Exception as e:
@@ -94,52 +111,50 @@ def get_msisdn_data(msisdn, INPUT_FILE, SIM_TYPE_MAPPING, ref_df, tac_df, usage_
                     monthly_usage["Total"].append(total)
             common_cells = []
             try:
-                if not VLRD.empty:
-                    vlrd_matches = VLRD[VLRD["MSISDN"] == int(msisdn)]
-                    if not vlrd_matches.empty:
-                        for _, row in vlrd_matches.iterrows():
-                            cell_data = {
-                                'CELL_CODE': row.get('CELL_CODE', 'Unknown'),
-                                'SITE_NAME': row.get('SITE_NAME', 'Unknown'),
-                                'DISTRICT': row.get('DISTRICT', 'Unknown'),
-                                'LAC': row.get('LAC', 'Unknown'),
-                                'CELL': row.get('CELL', 'Unknown'),
-                                'LON': 'Not Found',
-                                'LAT': 'Not Found',
-                                'RSRP_DATA': []
-                            }
-                            if cell_data['CELL_CODE'] != 'Unknown':
-                                ref_match = ref_df[ref_df['cellcode'] == cell_data['CELL_CODE']]
-                                if not ref_match.empty:
-                                    cell_data['LON'] = ref_match.iloc[0]['lon']
-                                    cell_data['LAT'] = ref_match.iloc[0]['lat']
-                                site_id = str(cell_data['CELL_CODE'])[:6]
-                                try:
-                                    rsrp_data_for_site = fetch_rsrp_data_by_site_id(site_id)
-                                    cell_data['RSRP_DATA'] = rsrp_data_for_site if rsrp_data_for_site else []
-                                except Exception as e:
-                                    cell_data['RSRP_DATA'] = []
-                                
-                                # Add LTE utilization data for this common cell location
+                if vlrd_index['size']:
+                    for row in iter_common_cells(vlrd_index, msisdn):
+                        cell_data = {
+                            'CELL_CODE': row['CELL_CODE'],
+                            'SITE_NAME': row['SITE_NAME'],
+                            'DISTRICT': row['DISTRICT'],
+                            'LAC': row['LAC'],
+                            'CELL': row['CELL'],
+                            'LON': row['LON'],
+                            'LAT': row['LAT'],
+                            'RSRP_DATA': []
+                        }
+                        if cell_data['CELL_CODE'] != 'Unknown':
+                            site_id = str(cell_data['CELL_CODE'])[:6]
+                            try:
+                                rsrp_data_for_site = fetch_rsrp_data_by_site_id(site_id)
+                                cell_data['RSRP_DATA'] = rsrp_data_for_site if rsrp_data_for_site else []
+                            except Exception as e:
+                                cell_data['RSRP_DATA'] = []
+                            
+                            # Add LTE utilization data for this common cell location
+                            try:
+                                if fetch_lte_util_by_site_id:
+                                    lte_util_data_for_site = fetch_lte_util_by_site_id(site_id)
+                                    cell_data['LTE_UTIL_DATA'] = lte_util_data_for_site if lte_util_data_for_site else []
+                                else:
+                                    cell_data['LTE_UTIL_DATA'] = []
+                            except Exception as e:
+                                cell_data['LTE_UTIL_DATA'] = []
+                            
+                            # Also try to get LTE data by specific cell code if site-level data is empty
+                            if not cell_data.get('LTE_UTIL_DATA') and fetch_lte_util_by_cell_code:
                                 try:
-                                    if fetch_lte_util_by_site_id:
-                                        lte_util_data_for_site = fetch_lte_util_by_site_id(site_id)
-                                        cell_data['LTE_UTIL_DATA'] = lte_util_data_for_site if lte_util_data_for_site else []
-                                    else:
-                                        cell_data['LTE_UTIL_DATA'] = []
+                                    lte_util_data_for_cell = fetch_lte_util_by_cell_code(cell_data['CELL_CODE'])
+                                    cell_data['LTE_UTIL_DATA'] = lte_util_data_for_cell if lte_util_data_for_cell else []
                                 except Exception as e:
-                                    cell_data['LTE_UTIL_DATA'] = []
-                                
-                                # Also try to get LTE data by specific cell code if site-level data is empty
-                                if not cell_data.get('LTE_UTIL_DATA') and fetch_lte_util_by_cell_code:
-                                    try:
-                                        lte_util_data_for_cell = fetch_lte_util_by_cell_code(cell_data['CELL_CODE'])
-                                        cell_data['LTE_UTIL_DATA'] = lte_util_data_for_cell if lte_util_data_for_cell else []
-                                    except Exception as e:
-                                        pass
-                            common_cells.append(cell_data)
+                                    pass
+                        common_cells.append(cell_data)
             except Exception as e:
                 common_cells = []
+            try:
+                mobility_profile = get_mobility_profile(vlrd_index, msisdn)
+            except Exception as e:
+                mobility_profile = None
             rsrp_data = []
             lte_util_data = []
             if cellcode and cellcode != "Not Found":
@@ -177,6 +192,7 @@ def get_msisdn_data(msisdn, INPUT_FILE, SIM_TYPE_MAPPING, ref_df, tac_df, usage_
                 "Connection Type": connection_type,
                 "LAC": lac_dec,
                 "SAC": sac_dec,
+                "Location Match": location_match or "Not Found",
                 "Sitename": sitename,
                 "Cellcode": cellcode,
                 "Lon": lon,
@@ -195,6 +211,7 @@ def get_msisdn_data(msisdn, INPUT_FILE, SIM_TYPE_MAPPING, ref_df, tac_df, usage_
                 "Primary Hardware Type": primary_hardware_type,
                 "Monthly Usage": monthly_usage,
                 "Common Cell Locations": common_cells,
+                "Mobility Profile": mobility_profile,
                 "RSRP Data": rsrp_data,
                 "LTE Utilization Data": lte_util_data
             }
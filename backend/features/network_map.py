@@ -0,0 +1,178 @@
+# network_map.py
+"""
+Network-wide site map: every reference site coloured by RSRP quality and LTE
+utilization, grid-clustered on the server.
+
+Site metrics are joined once per data version. For each cluster zoom level
+the sites are binned into a grid about a quarter of a map tile wide, and each
+occupied cell becomes one GeoJSON feature (site count, centroid, mean
+metrics, worst-case counts). At POINT_ZOOM and above the individual sites are
+served instead. A bbox query only filters the precomputed features of one
+level, so a view never receives more features than fit on screen.
+"""
+import numpy as np
+import pandas as pd
+
+CLUSTER_ZOOMS = (5, 7, 9, 11)
+POINT_ZOOM = 12
+CELLS_PER_TILE = 4
+
+# Share of samples above -110 dBm (RSRP Range 1 + 2)
+RSRP_BANDS = [(80.0, 'good', '#2e7d32'), (60.0, 'fair', '#f9a825'), (0.0, 'poor', '#c62828')]
+# Mean cell utilization (%)
+UTILIZATION_BANDS = [(80.0, 'high', '#c62828'), (50.0, 'medium', '#f9a825'), (0.0, 'low', '#2e7d32')]
+UNKNOWN_COLOR = '#9e9e9e'
+
+_layer_cache = {}
+
+
+def _band(value, bands):
+    if value is None or not np.isfinite(value):
+        return 'unknown', UNKNOWN_COLOR
+    for threshold, name, color in bands:
+        if value >= threshold:
+            return name, color
+    return bands[-1][1], bands[-1][2]
+
+
+def _rsrp_good_share(zte_rsrp_df, huawei_rsrp_df):
+    """Mean share (%) of RSRP samples above -110 dBm per site ID (ZTE reports fractions)"""
+    frames = []
+    for df, scale in ((zte_rsrp_df, 100.0), (huawei_rsrp_df, 1.0)):
+        if df is None or df.empty:
+            continue
+        good = (pd.to_numeric(df['RSRP Range 1 (>-105dBm) %'], errors='coerce')
+                + pd.to_numeric(df['RSRP Range 2 (-105~-110dBm) %'], errors='coerce')) * scale
+        frames.append(pd.DataFrame({'site_id': df['Site_ID'].astype(str), 'good_rsrp_pct': good}))
+    if not frames:
+        return pd.Series(dtype=float, name='good_rsrp_pct')
+    return pd.concat(frames).groupby('site_id')['good_rsrp_pct'].mean()
+
+
+def _cell_utilization(lte_df):
+    if lte_df is None or lte_df.empty or 'Cell Utilization (%)' not in lte_df.columns:
+        return pd.Series(dtype=float, name='cell_utilization_pct')
+    util = pd.DataFrame({
+        'site_id': lte_df['Site ID'].astype(str),
+        'cell_utilization_pct': pd.to_numeric(lte_df['Cell Utilization (%)'], errors='coerce'),
+    })
+    return util.groupby('site_id')['cell_utilization_pct'].mean()
+
+
+def build_site_metrics(ref_df, zte_rsrp_df=None, huawei_rsrp_df=None, lte_df=None):
+    """One row per located site with its RSRP quality and LTE utilization bands"""
+    if ref_df is None or ref_df.empty:
+        return pd.DataFrame(columns=['site_id', 'sitename', 'district', 'lat', 'lon',
+                                     'good_rsrp_pct', 'cell_utilization_pct'])
+    sites = ref_df.assign(site_id=ref_df['cellcode'].astype(str).str[:6])
+    sites = sites.drop_duplicates('site_id')[['site_id', 'sitename', 'district', 'lat', 'lon']].copy()
+    sites['lat'] = pd.to_numeric(sites['lat'], errors='coerce')
+    sites['lon'] = pd.to_numeric(sites['lon'], errors='coerce')
+    sites = sites[sites['lat'].notna() & sites['lon'].notna()]
+    sites = sites.merge(_rsrp_good_share(zte_rsrp_df, huawei_rsrp_df), left_on='site_id', right_index=True, how='left')
+    sites = sites.merge(_cell_utilization(lte_df), left_on='site_id', right_index=True, how='left')
+    return sites.reset_index(drop=True)
+
+
+def _feature(lon, lat, properties):
+    return {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [lon, lat]}, 'properties': properties}
+
+
+def _clean(value, digits=2):
+    return None if value is None or not np.isfinite(value) else round(float(value), digits)
+
+
+def _point_features(sites):
+    features = []
+    for row in sites.itertuples(index=False):
+        rsrp_band, rsrp_color = _band(row.good_rsrp_pct, RSRP_BANDS)
+        util_band, util_color = _band(row.cell_utilization_pct, UTILIZATION_BANDS)
+        features.append(_feature(float(row.lon), float(row.lat), {
+            'cluster': False,
+            'site_id': row.site_id,
+            'sitename': row.sitename if pd.notna(row.sitename) else None,
+            'district': row.district if pd.notna(row.district) else None,
+            'good_rsrp_pct': _clean(row.good_rsrp_pct),
+            'cell_utilization_pct': _clean(row.cell_utilization_pct),
+            'rsrp_band': rsrp_band,
+            'rsrp_color': rsrp_color,
+            'utilization_band': util_band,
+            'utilization_color': util_color,
+        }))
+    return features
+
+
+def _cluster_features(sites, zoom):
+    grid = 360.0 / (2 ** zoom) / CELLS_PER_TILE
+    binned = sites.assign(
+        row=np.floor((sites['lat'] + 90) / grid).astype(np.int64),
+        col=np.floor((sites['lon'] + 180) / grid).astype(np.int64),
+        poor_rsrp=sites['good_rsrp_pct'] < RSRP_BANDS[1][0],
+        high_util=sites['cell_utilization_pct'] >= UTILIZATION_BANDS[0][0],
+    )
+    clusters = binned.groupby(['row', 'col']).agg(
+        count=('site_id', 'size'),
+        lat=('lat', 'mean'),
+        lon=('lon', 'mean'),
+        good_rsrp_pct=('good_rsrp_pct', 'mean'),
+        cell_utilization_pct=('cell_utilization_pct', 'mean'),
+        poor_rsrp_sites=('poor_rsrp', 'sum'),
+        high_util_sites=('high_util', 'sum'),
+    )
+    features = []
+    for row in clusters.itertuples(index=False):
+        rsrp_band, rsrp_color = _band(row.good_rsrp_pct, RSRP_BANDS)
+        util_band, util_color = _band(row.cell_utilization_pct, UTILIZATION_BANDS)
+        features.append(_feature(float(row.lon), float(row.lat), {
+            'cluster': True,
+            'count': int(row.count),
+            'good_rsrp_pct': _clean(row.good_rsrp_pct),
+            'cell_utilization_pct': _clean(row.cell_utilization_pct),
+            'poor_rsrp_sites': int(row.poor_rsrp_sites),
+            'high_util_sites': int(row.high_util_sites),
+            'rsrp_band': rsrp_band,
+            'rsrp_color': rsrp_color,
+            'utilization_band': util_band,
+            'utilization_color': util_color,
+        }))
+    return features
+
+
+def _layer(features):
+    coords = np.array([f['geometry']['coordinates'] for f in features], dtype=float).reshape(-1, 2)
+    return {'features': features, 'lon': coords[:, 0], 'lat': coords[:, 1]}
+
+
+def build_network_layers(sites):
+    """Precomputed GeoJSON features per cluster zoom level, plus the point level"""
+    layers = {zoom: _layer(_cluster_features(sites, zoom)) for zoom in CLUSTER_ZOOMS}
+    layers[POINT_ZOOM] = _layer(_point_features(sites))
+    return layers
+
+
+def get_network_layers(version, ref_df, zte_rsrp_df=None, huawei_rsrp_df=None, lte_df=None):
+    """Layers for a data version, rebuilt only when the version changes"""
+    if _layer_cache.get('version') != version:
+        sites = build_site_metrics(ref_df, zte_rsrp_df, huawei_rsrp_df, lte_df)
+        _layer_cache['layers'] = build_network_layers(sites)
+        _layer_cache['version'] = version
+        print(f"[NETWORK MAP] Built layers for {len(sites)} sites (version {version})")
+    return _layer_cache['layers']
+
+
+def layer_zoom(zoom):
+    """Precomputed level used for a map zoom"""
+    if zoom >= POINT_ZOOM:
+        return POINT_ZOOM
+    levels = [z for z in CLUSTER_ZOOMS if z <= zoom]
+    return levels[-1] if levels else CLUSTER_ZOOMS[0]
+
+
+def query_bbox(layers, zoom, min_lon, min_lat, max_lon, max_lat):
+    """GeoJSON FeatureCollection of the features of the zoom's level inside the bbox"""
+    level = layer_zoom(zoom)
+    layer = layers[level]
+    inside = ((layer['lon'] >= min_lon) & (layer['lon'] <= max_lon)
+              & (layer['lat'] >= min_lat) & (layer['lat'] <= max_lat))
+    features = [layer['features'][i] for i in np.flatnonzero(inside)]
+    return {'type': 'FeatureCollection', 'zoom_level': level, 'features': features}
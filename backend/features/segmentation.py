@@ -0,0 +1,339 @@
+# segmentation.py
+"""
+Network-wide subscriber segmentation with the overview's rule thresholds.
+
+overview.rule_based_pattern_analysis and generate_basic_summary apply their
+thresholds to one subscriber's lists in Python. Here the same rules run for
+every subscriber at once:
+  - over the (subscriber x month) usage arrays (usage_figures),
+  - with device years from the TAC catalogue,
+  - with district/site from the session dump through the reference cells
+    (VLRD fills in subscribers whose session location is unknown).
+
+Each subscriber gets a uint32 bitset with one bit per rule in FLAGS.
+Segment queries are bit tests plus district/site code matches, and
+per-district/site counts are bincounts.
+"""
+import os
+import re
+import numpy as np
+import pandas as pd
+from block_store import open_data_file
+from usage_figures import VOICE_METRICS
+
+# Same thresholds as overview.rule_based_pattern_analysis / generate_basic_summary
+HEAVY_DATA_MB = 1000
+LIGHT_DATA_MB = 500
+HEAVY_PROFILE_MB = 5000
+HEAVY_VOICE_MIN = 5000
+FREQUENT_SMS = 500
+LOW_VOICE_MIN = 100
+LOW_SMS = 50
+STABLE_VOICE_DELTA = 10
+VOICE_SWING = 100
+NEW_DEVICE_YEAR = 2022
+
+# flag name -> description (bit i is FLAGS' i-th entry)
+FLAGS = {
+    'data_spike': 'Significant spike in data usage detected in some months.',
+    'data_dip': 'Some months show very low data usage.',
+    'heavy_data': 'Average monthly data above 1000 MB (higher data plan suggested).',
+    'light_data': 'Average monthly data below 500 MB (downgrade suggested).',
+    'heavy_voice': 'Heavy voice call activity detected.',
+    'frequent_sms': 'Frequent SMS usage detected.',
+    'low_activity': 'Low voice and SMS activity.',
+    'voice_increasing': 'Voice usage is consistently increasing month over month.',
+    'voice_decreasing': 'Voice usage is consistently decreasing month over month.',
+    'voice_stable': 'Voice usage is stable across months.',
+    'voice_surge': 'Significant increase in voice usage detected in some months.',
+    'voice_drop': 'Significant decrease in voice usage detected in some months.',
+    'old_device': 'Device released before 2022 (upgrade suggested).',
+    'profile_heavy': 'Heavy user profile (average data above 5000 MB).',
+    'profile_moderate': 'Regular user profile (average data 1000-5000 MB).',
+    'profile_light': 'Basic user profile (average data up to 1000 MB).',
+}
+FLAG_BITS = {name: np.uint32(1 << i) for i, name in enumerate(FLAGS)}
+GROUP_KINDS = ('district', 'site')
+UNKNOWN = 'UNKNOWN'
+
+_LOCATION_PATTERN = re.compile(r"(\d+)-(\w+)-([a-fA-F0-9]+)")
+
+_segments_cache = {}
+
+
+def flag_mask(names):
+    """Bitmask for flag names (ValueError on an unknown name)"""
+    mask = np.uint32(0)
+    for name in names or []:
+        if name not in FLAG_BITS:
+            raise ValueError(f"Unknown flag '{name}'")
+        mask |= FLAG_BITS[name]
+    return mask
+
+
+def flag_names(bits):
+    return [name for name, bit in FLAG_BITS.items() if int(bits) & int(bit)]
+
+
+def _session_attributes(session_file, ref_df):
+    """MSISDN, device TAC, district and cell code per session row (cells resolved by exact (lac, cellid))"""
+    try:
+        with open_data_file(session_file) as f:
+            sessions = pd.read_csv(f, sep=';', header=None, usecols=[1, 2, 4], names=['MSISDN', 'IMEI', 'LOCATION'],
+                                   dtype=str)
+    except (OSError, pd.errors.EmptyDataError) as e:
+        print(f"[SEGMENTS] Could not read session file {session_file}: {e}")
+        return pd.DataFrame(columns=['MSISDN', 'TAC', 'DISTRICT', 'CELL_CODE'])
+    parts = sessions['LOCATION'].fillna('').str.extract(_LOCATION_PATTERN)
+    attributes = pd.DataFrame({
+        'MSISDN': pd.to_numeric(sessions['MSISDN'], errors='coerce'),
+        'TAC': pd.to_numeric(sessions['IMEI'].str[:8], errors='coerce'),
+        'lac': parts[1].map(lambda v: int(v, 16), na_action='ignore'),
+        'cellid': parts[2].map(lambda v: int(v, 16), na_action='ignore'),
+    })
+    if ref_df is not None and not ref_df.empty:
+        cells = ref_df[['lac', 'cellid', 'cellcode', 'district']].drop_duplicates(['lac', 'cellid'])
+        attributes = attributes.merge(cells, on=['lac', 'cellid'], how='left')
+    else:
+        attributes['cellcode'] = attributes['district'] = None
+    return attributes.rename(columns={'cellcode': 'CELL_CODE', 'district': 'DISTRICT'})[['MSISDN', 'TAC', 'DISTRICT', 'CELL_CODE']]
+
+
+def _vlrd_districts(VLRD, ref_df):
+    """
+    Reference district names for VLRD rows, which carry 2-letter district codes (e.g. GM for
+    GAMPAHA): by exact cell code first, then by the name the code's reference cells use
+    (cell codes start with the district code); rows neither resolves keep their code.
+    """
+    codes = VLRD['DISTRICT'].astype(str).str.strip().str.upper().where(VLRD['DISTRICT'].notna())
+    if ref_df is None or ref_df.empty or not {'cellcode', 'district'} <= set(ref_df.columns):
+        return codes
+    cells = ref_df[['cellcode', 'district']].dropna()
+    cell_codes = cells['cellcode'].astype(str).str.strip().str.upper()
+    by_cell = pd.Series(cells['district'].to_numpy(), index=cell_codes)
+    by_cell = by_cell[~by_cell.index.duplicated()]
+    by_code = by_cell.groupby(by_cell.index.str[:2]).agg(lambda names: names.mode().iat[0])
+    districts = pd.Series(np.nan, index=VLRD.index, dtype=object)
+    if 'CELL_CODE' in VLRD.columns:
+        districts = VLRD['CELL_CODE'].astype(str).str.strip().str.upper().map(by_cell)
+    return districts.fillna(codes.map(by_code)).fillna(codes)
+
+
+def _vlrd_attributes(VLRD, ref_df):
+    if VLRD is None or VLRD.empty or 'MSISDN' not in VLRD.columns:
+        return pd.DataFrame(columns=['MSISDN', 'TAC', 'DISTRICT', 'CELL_CODE'])
+    return pd.DataFrame({
+        'MSISDN': pd.to_numeric(VLRD['MSISDN'], errors='coerce'),
+        'TAC': pd.to_numeric(VLRD['TAC'], errors='coerce') if 'TAC' in VLRD.columns else np.nan,
+        'DISTRICT': _vlrd_districts(VLRD, ref_df) if 'DISTRICT' in VLRD.columns else None,
+        'CELL_CODE': VLRD['CELL_CODE'] if 'CELL_CODE' in VLRD.columns else None,
+    })
+
+
+def subscriber_attributes(session_file, ref_df, VLRD):
+    """One row per MSISDN: session values first, VLRD for whatever the session dump could not resolve"""
+    frames = [_session_attributes(session_file, ref_df) if session_file else None, _vlrd_attributes(VLRD, ref_df)]
+    frames = [f.dropna(subset=['MSISDN']).astype({'MSISDN': np.int64}).drop_duplicates('MSISDN') for f in frames if f is not None]
+    attributes = frames[0].set_index('MSISDN')
+    for frame in frames[1:]:
+        attributes = attributes.combine_first(frame.set_index('MSISDN'))
+    return attributes
+
+
+def _tac_years(tac_df, tacs):
+    """Release year for each TAC (NaN when unknown), first catalogue row per TAC like get_msisdn_data"""
+    if tac_df is None or tac_df.empty:
+        return np.full(len(tacs), np.nan)
+    catalogue = pd.DataFrame({
+        'tac': pd.to_numeric(tac_df['tac'], errors='coerce'),
+        'year': pd.to_numeric(tac_df['year_released'], errors='coerce'),
+    }).dropna(subset=['tac']).drop_duplicates('tac')
+    if catalogue.empty:
+        return np.full(len(tacs), np.nan)
+    keys = catalogue['tac'].to_numpy(dtype=np.int64)
+    order = np.argsort(keys)
+    keys, years = keys[order], catalogue['year'].to_numpy(dtype=float)[order]
+    tacs = np.nan_to_num(np.asarray(tacs, dtype=float), nan=-1).astype(np.int64)  # -1 never matches
+    pos = np.minimum(np.searchsorted(keys, tacs), len(keys) - 1)
+    return np.where(keys[pos] == tacs, years[pos], np.nan)
+
+
+def _group_codes(values):
+    labels = pd.Series(values, dtype=object).where(pd.notna(values), UNKNOWN).astype(str).str.strip().str.upper()
+    labels = labels.replace('', UNKNOWN)
+    codes, uniques = pd.factorize(labels, sort=True)
+    return codes.astype(np.int32), np.asarray(uniques, dtype=object)
+
+
+def _usage_flags(arrays, rows, has_usage):
+    """Bitsets for the usage rules; rows index the usage arrays where has_usage"""
+    metrics = arrays['metrics']
+    n = len(rows)
+
+    def monthly(key):
+        values = metrics[key][rows] if len(arrays['msisdns']) else np.zeros((n, len(arrays['months'])))
+        # get_msisdn_data rounds voice minutes and truncates volumes/counts
+        values = np.round(values, 2) if key in VOICE_METRICS else np.trunc(values)
+        return np.where(has_usage[:, None], values, 0.0)
+
+    total = monthly('2G') + monthly('3G') + monthly('4G') + monthly('5G')
+    voice = monthly('outgoing_voice') + monthly('incoming_voice')
+    sms = monthly('outgoing_sms') + monthly('incoming_sms')
+    months = total.shape[1]
+    flags = np.zeros(n, dtype=np.uint32)
+
+    def mark(name, condition):
+        flags[condition] |= FLAG_BITS[name]
+
+    # An empty usage list skips the average rules, as in the single-subscriber code
+    with_data = has_usage & (months > 0)
+    avg = total.mean(axis=1) if months else np.zeros(n)
+    mark('data_spike', with_data & (total.max(axis=1, initial=0) > avg))
+    mark('data_dip', with_data & (total.min(axis=1, initial=np.inf) < avg))
+    mark('heavy_data', with_data & (avg > HEAVY_DATA_MB))
+    mark('light_data', with_data & (avg < LIGHT_DATA_MB))
+    # Subscribers without usage records have empty lists there, so they count as low activity too
+    total_voice, total_sms = voice.sum(axis=1), sms.sum(axis=1)
+    mark('heavy_voice', total_voice > HEAVY_VOICE_MIN)
+    mark('frequent_sms', total_sms > FREQUENT_SMS)
+    mark('low_activity', (total_voice < LOW_VOICE_MIN) & (total_sms < LOW_SMS))
+
+    # Voice trend: the first matching rule wins, as in the if/elif chain
+    if months >= 2:
+        diffs = np.diff(voice, axis=1)
+        increasing = has_usage & (diffs > 0).all(axis=1)
+        decreasing = has_usage & ~increasing & (diffs < 0).all(axis=1)
+        stable = has_usage & ~increasing & ~decreasing & (np.abs(diffs) < STABLE_VOICE_DELTA).all(axis=1)
+        other = has_usage & ~increasing & ~decreasing & ~stable
+        surge = other & (diffs.max(axis=1) > VOICE_SWING)
+        mark('voice_increasing', increasing)
+        mark('voice_decreasing', decreasing)
+        mark('voice_stable', stable)
+        mark('voice_surge', surge)
+        mark('voice_drop', other & ~surge & (diffs.min(axis=1) < -VOICE_SWING))
+
+    mark('profile_heavy', with_data & (avg > HEAVY_PROFILE_MB))
+    mark('profile_moderate', with_data & (avg > HEAVY_DATA_MB) & (avg <= HEAVY_PROFILE_MB))
+    mark('profile_light', with_data & (avg > 0) & (avg <= HEAVY_DATA_MB))
+    return flags, avg
+
+
+def build_segments(usage_arrays, tac_df, attributes):
+    """Flag bitsets, device year, district/site codes and average data for every subscriber seen anywhere"""
+    usage_msisdns = usage_arrays['msisdns']
+    msisdns = np.union1d(usage_msisdns, attributes.index.to_numpy(dtype=np.int64))
+    if len(usage_msisdns):
+        rows = np.minimum(np.searchsorted(usage_msisdns, msisdns), len(usage_msisdns) - 1)
+        has_usage = usage_msisdns[rows] == msisdns
+    else:
+        rows, has_usage = np.zeros(len(msisdns), dtype=np.int64), np.zeros(len(msisdns), dtype=bool)
+    flags, avg = _usage_flags(usage_arrays, rows, has_usage)
+
+    attributes = attributes.reindex(msisdns)
+    years = _tac_years(tac_df, attributes['TAC'].to_numpy(dtype=float))
+    flags[years < NEW_DEVICE_YEAR] |= FLAG_BITS['old_device']
+
+    districts, district_names = _group_codes(attributes['DISTRICT'].to_numpy(dtype=object))
+    cell_codes = attributes['CELL_CODE'].astype(object)
+    sites, site_names = _group_codes(cell_codes.where(cell_codes.isna(), cell_codes.astype(str).str[:6]).to_numpy())
+    return {
+        'msisdns': msisdns,
+        'flags': flags,
+        'avg_data_mb': np.where(has_usage, avg, np.nan),
+        'year_released': years,
+        'district': districts,
+        'districts': district_names,
+        'site': sites,
+        'sites': site_names,
+    }
+
+
+def get_segments(usage_arrays, tac_df, session_file, ref_df, VLRD, frames_version):
+    """
+    Segments for the current inputs, rebuilt when the usage arrays, session dump or
+    frames_version (the caller's version of tac_df/ref_df/VLRD, e.g. their files' mtimes) change
+    """
+    session_mtime = os.path.getmtime(session_file) if session_file and os.path.exists(session_file) else None
+    version = (usage_arrays['version'], frames_version, session_file, session_mtime)
+    if _segments_cache.get('version') != version:
+        segments = build_segments(usage_arrays, tac_df, subscriber_attributes(session_file, ref_df, VLRD))
+        _segments_cache['segments'] = segments
+        _segments_cache['version'] = version
+        print(f"[SEGMENTS] Flagged {len(segments['msisdns'])} subscribers in {len(segments['districts'])} districts, {len(segments['sites'])} sites")
+    return _segments_cache['segments']
+
+
+def _group_filter(segments, kind, names):
+    wanted = {str(n).strip().upper() for n in names}
+    if kind == 'site':
+        wanted = {n[:6] for n in wanted}
+    codes = [i for i, name in enumerate(segments[kind + 's']) if name in wanted]
+    return np.isin(segments[kind], codes)
+
+
+def segment_mask(segments, all_of=None, any_of=None, none_of=None, districts=None, sites=None):
+    """Boolean mask over subscribers: every all_of flag, at least one any_of flag, no none_of flag, in the districts/sites"""
+    flags = segments['flags']
+    mask = np.ones(len(flags), dtype=bool)
+    required = flag_mask(all_of)
+    if required:
+        mask &= (flags & required) == required
+    if any_of:
+        mask &= (flags & flag_mask(any_of)) != 0
+    if none_of:
+        mask &= (flags & flag_mask(none_of)) == 0
+    if districts:
+        mask &= _group_filter(segments, 'district', districts)
+    if sites:
+        mask &= _group_filter(segments, 'site', sites)
+    return mask
+
+
+def segment_rows(segments, mask, limit=None):
+    """Matching subscribers as records (MSISDN, flags, device year, district, site, average data)"""
+    if limit is not None and limit < 1:
+        raise ValueError('limit must be a positive integer')
+    positions = np.flatnonzero(mask)[:limit]
+    return [{
+        'msisdn': str(segments['msisdns'][p]),
+        'flags': flag_names(segments['flags'][p]),
+        'year_released': None if np.isnan(segments['year_released'][p]) else int(segments['year_released'][p]),
+        'district': segments['districts'][segments['district'][p]],
+        'site': segments['sites'][segments['site'][p]],
+        'avg_data_mb': None if np.isnan(segments['avg_data_mb'][p]) else round(float(segments['avg_data_mb'][p]), 2),
+    } for p in positions]
+
+
+def segment_table(segments, mask):
+    """Matching subscribers as a DataFrame (flags joined with '|'), for exports"""
+    positions = np.flatnonzero(mask)
+    flags = segments['flags'][positions]
+    # Distinct bitsets are few, so flag names are joined once per bitset
+    bitsets, inverse = np.unique(flags, return_inverse=True)
+    names = np.array(['|'.join(flag_names(b)) for b in bitsets], dtype=object)
+    return pd.DataFrame({
+        'msisdn': segments['msisdns'][positions].astype(str),
+        'flags': names[inverse] if len(positions) else np.empty(0, dtype=object),
+        'year_released': pd.array(segments['year_released'][positions], dtype='Int64'),
+        'district': segments['districts'][segments['district'][positions]],
+        'site': segments['sites'][segments['site'][positions]],
+        'avg_data_mb': np.round(segments['avg_data_mb'][positions], 2),
+    })
+
+
+def segment_counts(segments, by='district', mask=None):
+    """group -> {'subscribers': n, <flag>: n, ...} for the subscribers in mask (all when None)"""
+    if by not in GROUP_KINDS:
+        raise ValueError(f"by must be one of {', '.join(GROUP_KINDS)}")
+    codes, names = segments[by], segments[by + 's']
+    if mask is not None:
+        codes, flags = codes[mask], segments['flags'][mask]
+    else:
+        flags = segments['flags']
+    totals = np.bincount(codes, minlength=len(names))
+    per_flag = {name: np.bincount(codes, weights=(flags & bit) != 0, minlength=len(names)).astype(np.int64)
+                for name, bit in FLAG_BITS.items()}
+    counts = {}
+    for i in np.flatnonzero(totals):
+        counts[names[i]] = {'subscribers': int(totals[i]), **{name: int(c[i]) for name, c in per_flag.items()}}
+    return counts
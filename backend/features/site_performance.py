@@ -0,0 +1,148 @@
+# site_performance.py
+"""
+Measured performance per site from the crowdsourced speed-test exports.
+
+Speed-test rows identify the serving LTE cell by eNodeB ID (plus PCI/TAC),
+while our data is keyed by site ID. The join index maps each of our
+network's eNodeB IDs (HOME_MCC/HOME_MNC) to a site ID:
+
+  - 'enodeb': ZTE RSRP site names end in the eNodeB ID, e.g.
+    "LKY021_0UL00_Ambagamuwa_Ka(81111)".
+  - 'nearest_site': eNodeBs not named there (e.g. Huawei) take the nearest
+    reference site within NEAREST_SITE_KM of their measurements' median
+    location.
+
+When id_cell_lte_enodeb is empty, the eNodeB comes from the LTE cell
+identity (id_cell_primary = eNodeB * 256 + cell). Download/upload,
+latency and RSRP distributions per site are computed once per store
+version, so a site lookup is a dict access.
+"""
+import numpy as np
+import pandas as pd
+from spatial_index import query_radius
+from speed_test_store import MISSING_ID, get_speed_test_store, read_speed_tests
+
+HOME_MCC = 413
+HOME_MNC = 1  # SLT-Mobitel
+NEAREST_SITE_KM = 3.0
+CELLS_PER_ENODEB = 256
+PERCENTILES = (0.1, 0.5, 0.9)
+ENODEB_NAME_PATTERN = r'\((\d+)\)\s*$'
+
+# metric name -> store column
+SITE_METRICS = {
+    'download_kbps': 'val_download_kbps',
+    'upload_kbps': 'val_upload_kbps',
+    'latency_ms': 'val_latency_iqm_ms',
+    'rsrp_dbm': 'val_signal_rsrp_dbm',
+}
+JOIN_COLUMNS = ['attr_network_operator_mcc', 'attr_network_operator_mnc', 'id_cell_lte_enodeb',
+                'id_cell_primary', 'attr_cell_pci', 'attr_cell_tac',
+                'attr_location_latitude', 'attr_location_longitude']
+
+_performance_cache = {}
+
+
+def enodeb_site_map(zte_rsrp_df):
+    """eNodeB ID -> site ID from the ZTE RSRP site names (most frequent site per eNodeB)"""
+    if zte_rsrp_df is None or zte_rsrp_df.empty:
+        return {}
+    enodeb = pd.to_numeric(zte_rsrp_df['Site Name'].astype(str).str.extract(ENODEB_NAME_PATTERN)[0], errors='coerce')
+    pairs = pd.DataFrame({'enodeb': enodeb, 'site_id': zte_rsrp_df['Site_ID'].astype(str)}).dropna()
+    counts = pairs.groupby(['enodeb', 'site_id']).size().rename('n').reset_index()
+    best = counts.sort_values('n', ascending=False, kind='mergesort').drop_duplicates('enodeb')
+    return dict(zip(best['enodeb'].astype(np.int64), best['site_id']))
+
+
+def home_measurements(df):
+    """Rows measured on our network, with an eNodeB ID (derived from the cell identity when missing)"""
+    home = df[(df['attr_network_operator_mcc'] == HOME_MCC) & (df['attr_network_operator_mnc'] == HOME_MNC)].copy()
+    enodeb = home['id_cell_lte_enodeb'].to_numpy(dtype=np.int64)
+    primary = home['id_cell_primary'].to_numpy(dtype=np.int64)
+    derived = (enodeb == MISSING_ID) & (primary != MISSING_ID)
+    enodeb = np.where(derived, primary // CELLS_PER_ENODEB, enodeb)
+    home['enodeb'] = enodeb
+    return home[enodeb != MISSING_ID].reset_index(drop=True)
+
+
+def build_join_index(measurements, named_enodebs, site_index):
+    """eNodeB ID -> (site ID, method) for every eNodeB seen in the measurements"""
+    join = {}
+    located = measurements.dropna(subset=['attr_location_latitude', 'attr_location_longitude'])
+    medians = located.groupby('enodeb')[['attr_location_latitude', 'attr_location_longitude']].median()
+    for enodeb in np.unique(measurements['enodeb'].to_numpy()):
+        enodeb = int(enodeb)
+        if enodeb in named_enodebs:
+            join[enodeb] = (named_enodebs[enodeb], 'enodeb')
+        elif enodeb in medians.index and site_index is not None:
+            lat, lon = medians.loc[enodeb]
+            positions, _ = query_radius(site_index, lat, lon, NEAREST_SITE_KM, limit=1)
+            if len(positions):
+                join[enodeb] = (str(site_index['records']['site_id'].iloc[positions[0]]), 'nearest_site')
+    return join
+
+
+def _distribution(values):
+    values = values[np.isfinite(values)]
+    if not len(values):
+        return {'count': 0, 'mean': None, **{f'p{int(q * 100)}': None for q in PERCENTILES}}
+    quantiles = np.quantile(values, PERCENTILES)
+    return {
+        'count': int(len(values)),
+        'mean': round(float(values.mean()), 2),
+        **{f'p{int(q * 100)}': round(float(v), 2) for q, v in zip(PERCENTILES, quantiles)},
+    }
+
+
+def _date(value):
+    return value.strftime('%Y-%m-%d') if pd.notna(value) else None
+
+
+def build_site_performance(measurements, join):
+    """site ID -> {samples, enodebs, match, first/last date, metric distributions}"""
+    site_ids = measurements['enodeb'].map(lambda e: join.get(int(e), (None, None))[0])
+    matched = measurements[site_ids.notna()].assign(site_id=site_ids[site_ids.notna()])
+    sites = {}
+    for site_id, rows in matched.groupby('site_id', sort=True):
+        enodebs = sorted(int(e) for e in rows['enodeb'].unique())
+        entry = {
+            'site_id': site_id,
+            'samples': int(len(rows)),
+            'enodebs': enodebs,
+            'pcis': sorted(int(p) for p in rows['attr_cell_pci'].unique() if p != MISSING_ID),
+            'match': sorted({join[e][1] for e in enodebs}),
+            'first_date': _date(rows['ts_result'].min()),
+            'last_date': _date(rows['ts_result'].max()),
+        }
+        for metric, column in SITE_METRICS.items():
+            entry[metric] = _distribution(rows[column].to_numpy(dtype=np.float64))
+        sites[site_id] = entry
+    return sites
+
+
+def get_site_performance(data_dir, zte_rsrp_df, site_index, frames_version):
+    """
+    Join index and per-site aggregates, rebuilt when the speed-test store or
+    frames_version (the caller's version of zte_rsrp_df/site_index, e.g. file mtimes) changes
+    """
+    store_dir, store_version = get_speed_test_store(data_dir)
+    version = (store_version, frames_version)
+    if _performance_cache.get('version') != version:
+        columns = JOIN_COLUMNS + ['ts_result'] + list(SITE_METRICS.values())
+        measurements = home_measurements(read_speed_tests(store_dir, columns=columns))
+        join = build_join_index(measurements, enodeb_site_map(zte_rsrp_df), site_index)
+        sites = build_site_performance(measurements, join)
+        _performance_cache['performance'] = {'join': join, 'sites': sites, 'measurements': len(measurements)}
+        _performance_cache['version'] = version
+        print(f"[SITE PERFORMANCE] Joined {len(measurements)} measurements via {len(join)} eNodeBs to {len(sites)} sites")
+    return _performance_cache['performance']
+
+
+def site_performance_rows(performance, site_ids):
+    """Aggregates for the given site IDs (in order, without duplicates or unmeasured sites)"""
+    rows = []
+    for site_id in dict.fromkeys(str(s)[:6] for s in site_ids if s):
+        entry = performance['sites'].get(site_id)
+        if entry:
+            rows.append(entry)
+    return rows
@@ -0,0 +1,114 @@
+# spatial_index.py
+"""
+Uniform-grid spatial index over reference cell/site coordinates.
+
+Points are bucketed into GRID_DEGREES x GRID_DEGREES cells and stored sorted
+by bucket id, so each grid row touched by a query is one contiguous slice
+found with a binary search. Candidate points from those slices are filtered
+with a vectorized haversine distance. kNN queries widen the search radius
+until k points are inside it, so the k-th distance found is exact.
+"""
+import numpy as np
+import pandas as pd
+
+EARTH_RADIUS_KM = 6371.0
+GRID_DEGREES = 0.05  # ~5.5 km at the equator
+KM_PER_DEGREE = 111.32
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km; any argument may be a NumPy array (broadcast)"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def build_spatial_index(points, lat_col='lat', lon_col='lon', grid_degrees=GRID_DEGREES):
+    """Index the rows of a DataFrame by their lat/lon (rows without valid coordinates are dropped)"""
+    lat = pd.to_numeric(points[lat_col], errors='coerce') if lat_col in points else pd.Series(dtype=float)
+    lon = pd.to_numeric(points[lon_col], errors='coerce') if lon_col in points else pd.Series(dtype=float)
+    valid = lat.between(-90, 90) & lon.between(-180, 180) & ~((lat == 0) & (lon == 0))
+    records = points[valid].reset_index(drop=True)
+    lat = lat[valid].to_numpy(dtype=float)
+    lon = lon[valid].to_numpy(dtype=float)
+
+    rows = np.floor((lat + 90) / grid_degrees).astype(np.int64)
+    cols = np.floor((lon + 180) / grid_degrees).astype(np.int64)
+    n_cols = int(np.ceil(360 / grid_degrees)) + 1
+    bucket = rows * n_cols + cols
+    order = np.argsort(bucket, kind='stable')
+    return {
+        'records': records.iloc[order].reset_index(drop=True),
+        'lat': lat[order],
+        'lon': lon[order],
+        'bucket': bucket[order],
+        'grid_degrees': grid_degrees,
+        'n_cols': n_cols,
+        'size': len(order),
+    }
+
+
+def build_site_index(ref_df):
+    """
+    Spatial index with one point per site ID (cellcode[:6]), at its first located
+    reference row; sitename is kept as an attribute, so sites sharing a name stay apart
+    """
+    if ref_df is None or ref_df.empty:
+        return build_spatial_index(pd.DataFrame(columns=['site_id', 'sitename', 'lat', 'lon']))
+    sites = ref_df[ref_df['cellcode'].notna()].copy()
+    sites['site_id'] = sites['cellcode'].astype(str).str[:6]
+    cell_counts = sites.groupby('site_id')['cellcode'].nunique().rename('cell_count')
+    located = pd.to_numeric(sites['lat'], errors='coerce').notna() & pd.to_numeric(sites['lon'], errors='coerce').notna()
+    sites = sites.iloc[np.argsort(~located.to_numpy(), kind='stable')]
+    columns = [c for c in ['sitename', 'site_id', 'lat', 'lon', 'district', 'region'] if c in sites.columns]
+    sites = sites.drop_duplicates('site_id')[columns].merge(cell_counts, left_on='site_id', right_index=True)
+    return build_spatial_index(sites)
+
+
+def _candidates(index, lat, lon, radius_km):
+    """Positions of all points in grid buckets overlapping the query circle's bounding box"""
+    if index['size'] == 0:
+        return np.empty(0, dtype=np.int64)
+    grid = index['grid_degrees']
+    n_cols = index['n_cols']
+    dlat = radius_km / KM_PER_DEGREE
+    dlon = radius_km / (KM_PER_DEGREE * max(np.cos(np.radians(min(abs(lat) + dlat, 89.9))), 1e-6))
+    row0 = int(np.floor((max(lat - dlat, -90) + 90) / grid))
+    row1 = int(np.floor((min(lat + dlat, 90) + 90) / grid))
+    col0 = max(int(np.floor((lon - dlon + 180) / grid)), 0)
+    col1 = min(int(np.floor((lon + dlon + 180) / grid)), n_cols - 1)
+    rows = np.arange(row0, row1 + 1, dtype=np.int64)
+    starts = np.searchsorted(index['bucket'], rows * n_cols + col0, side='left')
+    ends = np.searchsorted(index['bucket'], rows * n_cols + col1, side='right')
+    slices = [np.arange(s, e) for s, e in zip(starts, ends) if e > s]
+    return np.concatenate(slices) if slices else np.empty(0, dtype=np.int64)
+
+
+def query_radius(index, lat, lon, radius_km, limit=None):
+    """(positions, distances_km) of the points within radius_km, nearest first"""
+    candidates = _candidates(index, lat, lon, radius_km)
+    distances = haversine_km(lat, lon, index['lat'][candidates], index['lon'][candidates])
+    inside = distances <= radius_km
+    candidates, distances = candidates[inside], distances[inside]
+    order = np.argsort(distances, kind='stable')[:limit]
+    return candidates[order], distances[order]
+
+
+def query_nearest(index, lat, lon, k=5):
+    """(positions, distances_km) of the k nearest points, nearest first"""
+    k = min(k, index['size'])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=float)
+    radius_km = index['grid_degrees'] * KM_PER_DEGREE
+    while True:
+        positions, distances = query_radius(index, lat, lon, radius_km)
+        if len(positions) >= k or radius_km > 2 * np.pi * EARTH_RADIUS_KM:
+            return positions[:k], distances[:k]
+        radius_km *= 2
+
+
+def describe(index, positions, distances):
+    """Records for query results, with distance_km added"""
+    records = index['records'].iloc[positions].copy()
+    records['distance_km'] = np.round(distances, 3)
+    return records.where(pd.notna(records), None).to_dict(orient='records')
@@ -0,0 +1,247 @@
+# speed_test_store.py
+"""
+Columnar store for the crowdsourced speed-test exports.
+
+The exports have ~180 mostly-text columns; only SPEED_TEST_SCHEMA (28 of
+them) is read, chunk by chunk, with compact dtypes: float32 signal and
+performance metrics, int64 IDs (MISSING_ID when empty) and categorical text.
+Each chunk is split by local measurement date and written as one part per
+date partition:
+
+    <store>/date=2025-06-28/<source>-00000/<column>.npy   (+ categories.json)
+
+Numeric columns load with mmap, so reading a month of exports only
+materialises the columns asked for. manifest.json records which source
+files (mtime, size) have been ingested. A changed file has its parts
+replaced; unchanged files are skipped. Request handlers go through
+get_speed_test_store, which re-scans the exports at most once per
+SYNC_INTERVAL seconds.
+"""
+import glob
+import json
+import os
+import shutil
+import time
+import numpy as np
+import pandas as pd
+
+STORE_DIRNAME = 'speed_test_store'
+MANIFEST_FILE = 'manifest.json'
+CATEGORIES_FILE = 'categories.json'
+SPEED_TEST_PATTERN = 'MobileNetworkPerformance_*.csv'
+CHUNK_ROWS = 50000
+MISSING_ID = -1
+LOCAL_UTC_OFFSET = pd.Timedelta(hours=5, minutes=30)  # Asia/Colombo, no DST
+SYNC_INTERVAL = 300  # seconds between export re-scans in get_speed_test_store
+
+SPEED_TEST_SCHEMA = {
+    'id_result': 'int64',
+    'ts_result': 'datetime',
+    'attr_location_latitude': 'float64',
+    'attr_location_longitude': 'float64',
+    'val_signal_rsrp_dbm': 'float32',
+    'val_signal_rsrq_db': 'float32',
+    'val_signal_rssnr_db': 'float32',
+    'val_signal_ss_rsrp_dbm': 'float32',
+    'val_signal_ss_rsrq_db': 'float32',
+    'val_signal_ss_snr_db': 'float32',
+    'val_signal_cqi': 'float32',
+    'val_download_kbps': 'float32',
+    'val_upload_kbps': 'float32',
+    'val_latency_iqm_ms': 'float32',
+    'val_jitter_ms': 'float32',
+    'metric_packet_loss_percent': 'float32',
+    'id_cell_lte_enodeb': 'int64',
+    'id_cell_primary': 'int64',
+    'attr_cell_pci': 'int64',
+    'attr_cell_tac': 'int64',
+    'attr_network_operator_mcc': 'int64',
+    'attr_network_operator_mnc': 'int64',
+    'attr_network_operator_common_name': 'category',
+    'attr_device_manufacturer': 'category',
+    'attr_device_model': 'category',
+    'attr_connection_type_end_string': 'category',
+    'attr_place_subregion': 'category',
+    'is_device_5g_capable': 'category',
+}
+
+_READ_DTYPES = {
+    column: ('float64' if kind == 'int64' else 'str' if kind == 'datetime' else kind)
+    for column, kind in SPEED_TEST_SCHEMA.items()
+}
+
+_sync_cache = {}  # data_dir -> {'store_dir', 'version', 'synced_at'}
+
+
+def default_store_dir(data_dir):
+    return os.path.join(data_dir, STORE_DIRNAME)
+
+
+def _load_manifest(store_dir):
+    path = os.path.join(store_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {'files': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_manifest(store_dir, manifest):
+    path = os.path.join(store_dir, MANIFEST_FILE)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(temp_path, path)
+
+
+def _compact(chunk):
+    """Apply SPEED_TEST_SCHEMA dtypes to one parsed chunk"""
+    for column, kind in SPEED_TEST_SCHEMA.items():
+        if kind == 'int64':
+            chunk[column] = chunk[column].fillna(MISSING_ID).astype(np.int64)
+        elif kind == 'datetime':
+            chunk[column] = pd.to_datetime(chunk[column], errors='coerce', utc=True).dt.tz_localize(None)
+        elif kind == 'category':
+            chunk[column] = chunk[column].astype(str).where(chunk[column].notna()).astype('category')
+    return chunk
+
+
+def _write_part(part_dir, frame):
+    temp_dir = part_dir + '.tmp'
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    os.makedirs(temp_dir)
+    categories = {}
+    for column, kind in SPEED_TEST_SCHEMA.items():
+        values = frame[column]
+        if kind == 'category':
+            categories[column] = [str(c) for c in values.cat.categories]
+            array = values.cat.codes.to_numpy(dtype=np.int32)
+        elif kind == 'datetime':
+            array = values.to_numpy(dtype='datetime64[ns]').view(np.int64)
+        else:
+            array = values.to_numpy()
+        np.save(os.path.join(temp_dir, column + '.npy'), array)
+    with open(os.path.join(temp_dir, CATEGORIES_FILE), 'w') as f:
+        json.dump(categories, f)
+    shutil.rmtree(part_dir, ignore_errors=True)
+    os.replace(temp_dir, part_dir)
+
+
+def _remove_parts(store_dir, parts):
+    for part in parts:
+        shutil.rmtree(os.path.join(store_dir, part), ignore_errors=True)
+
+
+def ingest_speed_test_file(path, store_dir, chunk_rows=CHUNK_ROWS):
+    """Stream one export into date partitions; returns the part paths written (relative to store_dir)"""
+    source = os.path.splitext(os.path.basename(path))[0]
+    parts = []
+    reader = pd.read_csv(path, usecols=list(SPEED_TEST_SCHEMA), dtype=_READ_DTYPES, chunksize=chunk_rows)
+    for chunk_number, chunk in enumerate(reader):
+        chunk = _compact(chunk)
+        local_date = (chunk['ts_result'] + LOCAL_UTC_OFFSET).dt.strftime('%Y-%m-%d').fillna('unknown')
+        for date, frame in chunk.groupby(local_date, sort=True):
+            part = os.path.join(f'date={date}', f'{source}-{chunk_number:05d}')
+            _write_part(os.path.join(store_dir, part), frame)
+            parts.append(part)
+    return parts
+
+
+def sync_speed_test_store(data_dir, store_dir=None):
+    """Ingest new or changed exports from data_dir and drop parts of removed ones"""
+    store_dir = store_dir or default_store_dir(data_dir)
+    os.makedirs(store_dir, exist_ok=True)
+    manifest = _load_manifest(store_dir)
+    files = sorted(glob.glob(os.path.join(data_dir, SPEED_TEST_PATTERN)))
+    current = {os.path.basename(f): f for f in files}
+    changed = False
+    for name in list(manifest['files']):
+        if name not in current:
+            _remove_parts(store_dir, manifest['files'].pop(name)['parts'])
+            changed = True
+    for name, path in current.items():
+        stat = os.stat(path)
+        version = [stat.st_mtime, stat.st_size]
+        entry = manifest['files'].get(name)
+        if entry and entry['version'] == version:
+            continue
+        if entry:
+            _remove_parts(store_dir, entry['parts'])
+        parts = ingest_speed_test_file(path, store_dir)
+        manifest['files'][name] = {'version': version, 'parts': parts}
+        changed = True
+        print(f"[SPEED TEST STORE] Ingested {name} into {len(parts)} part(s)")
+    if changed:
+        _save_manifest(store_dir, manifest)
+    return manifest
+
+
+def _manifest_version(manifest):
+    return tuple(sorted((name, tuple(entry['version'])) for name, entry in manifest['files'].items()))
+
+
+def store_version(store_dir):
+    """Hashable version of the store contents (changes whenever a file is ingested)"""
+    return _manifest_version(_load_manifest(store_dir))
+
+
+def get_speed_test_store(data_dir):
+    """(store_dir, version) of the synced store; the exports are re-scanned at most once per SYNC_INTERVAL"""
+    cached = _sync_cache.get(data_dir)
+    if cached is None or time.time() - cached['synced_at'] >= SYNC_INTERVAL:
+        store_dir = default_store_dir(data_dir)
+        manifest = sync_speed_test_store(data_dir, store_dir)
+        cached = {'store_dir': store_dir, 'version': _manifest_version(manifest), 'synced_at': time.time()}
+        _sync_cache[data_dir] = cached
+    return cached['store_dir'], cached['version']
+
+
+def list_partitions(store_dir):
+    """Partition dates present in the store"""
+    return sorted(name.split('=', 1)[1] for name in os.listdir(store_dir) if name.startswith('date=')) \
+        if os.path.isdir(store_dir) else []
+
+
+def _read_part(part_dir, columns):
+    with open(os.path.join(part_dir, CATEGORIES_FILE)) as f:
+        categories = json.load(f)
+    data = {}
+    for column in columns:
+        kind = SPEED_TEST_SCHEMA[column]
+        array = np.load(os.path.join(part_dir, column + '.npy'), mmap_mode='r')
+        if kind == 'category':
+            data[column] = pd.Categorical.from_codes(np.asarray(array), categories=categories[column])
+        elif kind == 'datetime':
+            data[column] = np.asarray(array).view('datetime64[ns]')
+        else:
+            data[column] = np.asarray(array)
+    return pd.DataFrame(data)
+
+
+def read_speed_tests(store_dir, start_date=None, end_date=None, columns=None):
+    """Rows of the date partitions in [start_date, end_date] (YYYY-MM-DD, inclusive), selected columns only"""
+    columns = list(columns) if columns else list(SPEED_TEST_SCHEMA)
+    frames = []
+    for date in list_partitions(store_dir):
+        if (start_date and date < start_date) or (end_date and date > end_date):
+            continue
+        partition = os.path.join(store_dir, f'date={date}')
+        for part in sorted(os.listdir(partition)):
+            if not part.endswith('.tmp'):
+                frames.append(_read_part(os.path.join(partition, part), columns))
+    if not frames:
+        return _compact(pd.DataFrame({c: pd.Series(dtype=_READ_DTYPES[c]) for c in SPEED_TEST_SCHEMA}))[columns]
+    # Part categories differ; union them so categoricals survive the concat
+    for column in columns:
+        if SPEED_TEST_SCHEMA[column] == 'category':
+            union = pd.api.types.union_categoricals([f[column] for f in frames], sort_categories=True).categories
+            for frame in frames:
+                frame[column] = frame[column].cat.set_categories(union)
+    return pd.concat(frames, ignore_index=True)
+
+
+if __name__ == "__main__":
+    import sys
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data_files'))
+    sync_speed_test_store(data_dir)
+    store_dir = default_store_dir(data_dir)
+    print(f"[SPEED TEST STORE] {store_dir}: partitions {', '.join(list_partitions(store_dir)) or 'none'}")
@@ -0,0 +1,123 @@
+# subscriber_index.py
+"""
+Inverted index from cell code / site ID / LAC to the MSISDNs seen on them.
+
+Posting lists are sorted, de-duplicated int64 NumPy arrays. All lists of one
+kind are views into a single contiguous array, so looking a key up is a dict
+hit plus a slice, and multi-cell queries are plain sorted-set operations.
+"""
+import re
+import numpy as np
+import pandas as pd
+from block_store import open_data_file
+
+INDEX_KINDS = ('cell', 'site', 'lac')
+
+_LOCATION_PATTERN = re.compile(r"(\d+)-(\w+)-([a-fA-F0-9]+)")
+
+
+def _site_id(cell_codes):
+    return cell_codes.astype(str).str[:6]
+
+
+def _vlrd_pairs(VLRD):
+    if VLRD is None or VLRD.empty or 'MSISDN' not in VLRD.columns:
+        return pd.DataFrame(columns=['MSISDN', 'CELL_CODE', 'LAC'])
+    pairs = pd.DataFrame({
+        'MSISDN': pd.to_numeric(VLRD['MSISDN'], errors='coerce'),
+        'CELL_CODE': VLRD['CELL_CODE'] if 'CELL_CODE' in VLRD.columns else None,
+        'LAC': pd.to_numeric(VLRD['LAC'], errors='coerce') if 'LAC' in VLRD.columns else None,
+    })
+    return pairs
+
+
+def _session_pairs(session_file, ref_df):
+    """Resolve each session row's LAC/SAC to a cell code through the reference data"""
+    try:
+        with open_data_file(session_file) as f:
+            sessions = pd.read_csv(f, sep=';', header=None, usecols=[1, 4], names=['MSISDN', 'LOCATION'],
+                                   dtype={'MSISDN': str, 'LOCATION': str})
+    except (OSError, pd.errors.EmptyDataError) as e:
+        print(f"[SUBSCRIBER INDEX] Could not read session file {session_file}: {e}")
+        return pd.DataFrame(columns=['MSISDN', 'CELL_CODE', 'LAC'])
+
+    parts = sessions['LOCATION'].fillna('').str.extract(_LOCATION_PATTERN)
+    valid = parts[1].notna()
+    sessions = sessions[valid]
+    parts = parts[valid]
+    hex_to_int = lambda values: values.map(lambda v: int(v, 16))
+    pairs = pd.DataFrame({
+        'MSISDN': pd.to_numeric(sessions['MSISDN'], errors='coerce'),
+        'LAC': hex_to_int(parts[1]),
+        'SAC': hex_to_int(parts[2]),
+    })
+    if ref_df is not None and not ref_df.empty:
+        ref_cells = ref_df[['lac', 'cellid', 'cellcode']].drop_duplicates(['lac', 'cellid'])
+        pairs = pairs.merge(ref_cells, left_on=['LAC', 'SAC'], right_on=['lac', 'cellid'], how='left')
+        pairs = pairs.rename(columns={'cellcode': 'CELL_CODE'})
+    else:
+        pairs['CELL_CODE'] = None
+    return pairs[['MSISDN', 'CELL_CODE', 'LAC']]
+
+
+def _posting_lists(keys, msisdns):
+    """Group (key, msisdn) pairs into sorted unique int64 arrays sharing one buffer"""
+    frame = pd.DataFrame({'key': keys, 'msisdn': msisdns}).dropna()
+    if frame.empty:
+        return {}
+    frame['key'] = frame['key'].astype(str).str.strip().str.upper()
+    frame['msisdn'] = frame['msisdn'].astype(np.int64)
+    frame = frame.drop_duplicates().sort_values(['key', 'msisdn'], kind='mergesort')
+    values = frame['msisdn'].to_numpy(dtype=np.int64)
+    unique_keys, starts = np.unique(frame['key'].to_numpy(), return_index=True)
+    ends = np.append(starts[1:], len(values))
+    return {key: values[start:end] for key, start, end in zip(unique_keys, starts, ends)}
+
+
+def build_subscriber_index(VLRD, session_file=None, ref_df=None):
+    """Build cell/site/LAC -> MSISDN posting lists from VLRD and the session dump"""
+    frames = [_vlrd_pairs(VLRD)]
+    if session_file:
+        frames.append(_session_pairs(session_file, ref_df))
+    frames = [frame for frame in frames if not frame.empty]
+    pairs = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=['MSISDN', 'CELL_CODE', 'LAC'])
+
+    lac_keys = pd.to_numeric(pairs['LAC'], errors='coerce').astype('Int64').astype(str).replace('<NA>', np.nan)
+    cell_codes = pairs['CELL_CODE'].where(pairs['CELL_CODE'].notna(), None)
+    index = {
+        'cell': _posting_lists(cell_codes, pairs['MSISDN']),
+        'site': _posting_lists(_site_id(pairs['CELL_CODE']).where(pairs['CELL_CODE'].notna(), None), pairs['MSISDN']),
+        'lac': _posting_lists(lac_keys, pairs['MSISDN']),
+    }
+    print(f"[SUBSCRIBER INDEX] Indexed {len(index['cell'])} cells, {len(index['site'])} sites, {len(index['lac'])} LACs")
+    return index
+
+
+def get_postings(index, kind, key):
+    """Return the sorted MSISDN array for one key (empty array if unknown)"""
+    if kind not in INDEX_KINDS:
+        raise ValueError(f"Unknown index kind '{kind}'")
+    key = str(key).strip().upper()
+    if kind == 'site':
+        key = key[:6]
+    return index.get(kind, {}).get(key, np.empty(0, dtype=np.int64))
+
+
+def query_subscribers(index, cells=None, sites=None, lacs=None, mode='intersect'):
+    """Combine posting lists for the requested keys; 'intersect' or 'union'"""
+    postings = []
+    for kind, keys in (('cell', cells), ('site', sites), ('lac', lacs)):
+        for key in keys or []:
+            postings.append(get_postings(index, kind, key))
+    if not postings:
+        return np.empty(0, dtype=np.int64)
+    if mode == 'union':
+        return np.unique(np.concatenate(postings))
+    # Intersect smallest first so the working set only shrinks
+    postings.sort(key=len)
+    result = postings[0]
+    for posting in postings[1:]:
+        if not len(result):
+            break
+        result = np.intersect1d(result, posting, assume_unique=True)
+    return result
@@ -1,16 +1,37 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, send_file, jsonify
-from device_subscriber_insights import get_device_subscriber_insights
+from flask import Flask, render_template, request, redirect, url_for, session, flash, send_file, jsonify, Response
+from device_subscriber_insights import get_device_subscriber_insights, get_distinct_counts
+from hyperloglog import DEFAULT_PRECISION, MAX_PRECISION, MIN_PRECISION
 from datetime import timedelta
 # Removed Dash imports - now using Chart.js for lightweight visualization
 # from werkzeug.middleware.dispatcher import DispatcherMiddleware
 from werkzeug.serving import run_simple
 
-# from usage_graphs import create_dash_app 
 # from call_drop_rate_dash import create_call_drop_rate_dash_app
 # from hlr_vlr_subs_dash import create_hlr_vlr_subs_dash_app
-from user_location_map import create_location_map
+from user_location_map import build_error_map_data, build_location_map_data, create_location_map
+from map_store import MapArtifactStore, location_map_key, map_key
 from msisdn_data import get_msisdn_data
-from VLR_data import get_user_count
+from block_store import BLOCK_EXTENSION, open_data_file, resolve_data_file
+from VLR_data import get_user_count_cube, query_user_count_cube
+from streaming_export import EXPORT_FORMATS, streaming_export_response
+from subscriber_index import build_subscriber_index, query_subscribers
+from segmentation import FLAGS, GROUP_KINDS, get_segments, segment_counts, segment_mask, segment_rows, segment_table
+from vlrd_index import build_vlrd_index
+from spatial_index import build_site_index, describe, query_nearest, query_radius
+from cell_locator import get_cell_locator
+from mobility import get_mobility_profile, get_mobility_table
+from network_map import get_network_layers, query_bbox
+from coverage_heatmap import HEATMAP_METRICS, get_coverage_pyramid, query_coverage_bbox, query_coverage_point
+from site_performance import get_site_performance, site_performance_rows
+from cell_kpi import TREND_PERIODS, cell_kpi_trend, get_cell_kpis
+from kpi_warehouse import default_store_dir as kpi_warehouse_dir, get_kpi_warehouse, kpi_catalog, kpi_last_date, kpi_window, query_kpis
+from usage_figures import get_usage_arrays
+from chart_payload import chart_etag, chart_response
+from hlr_vlr_series import HLR_VLR_FILE, get_hlr_vlr_series, latest_growth
+from kpi_series import (
+    CALL_DROP_RATE_FILE, DOWNSAMPLE_METHODS, MIN_POINTS,
+    date_axis, downsample_indices, downsample_union, get_kpi_series, json_values, slice_series
+)
 from overview import (
     generate_overall_msisdn_summary, 
     rule_based_pattern_analysis, 
@@ -27,34 +48,27 @@ from RSRP_data import (
     apply_numeric_max_filter,
     apply_auto_detect_filter,
     apply_wildcard_filter,
-    apply_regex_filter
+    apply_regex_filter,
+    iter_rsrp_export_frames
 )
 from lte_utilization import (
     load_lte_utilization_data,
     get_lte_utilization_by_site_id,
     get_lte_utilization_by_cell_code,
     get_all_lte_utilization_data,
-    get_lte_utilization_summary
+    get_lte_utilization_summary,
+    filter_lte_utilization_df
 )
 
 import pandas as pd
+import numpy as np
 import re
 import io
 import os
-import math
 import folium
 import calendar
 import time
 
-def calculate_haversine_distance(lat1, lon1, lat2, lon2):
-    """Calculate the great circle distance between two points on Earth using Haversine formula"""
-    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-    c = 2 * math.asin(math.sqrt(a))
-    return 6371 * c  # Earth radius in km
-
 template_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'templates'))
 static_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'static'))
 
@@ -71,11 +85,13 @@ def auto_detect_usage_files(data_directory=None):
     except OSError:
         return usage_files
     for filename in all_files:
-        match = re.match(r"USERTD_(\d{4})_(\d{2})\.txt", filename)
+        match = re.match(r"USERTD_(\d{4})_(\d{2})\.txt(\.bgz)?$", filename)
         if match:
             year, month = int(match.group(1)), int(match.group(2))
             month_name = calendar.month_name[month]
             month_year_key = f"{month_name} {year}"
+            if not match.group(3) and filename + BLOCK_EXTENSION in all_files:
+                continue  # block-compressed copy takes precedence
             usage_files[month_year_key] = {
                 'filename': os.path.join(data_directory, filename),
                 'year': year,
@@ -88,7 +104,8 @@ def auto_detect_usage_files(data_directory=None):
 def load_usage_data_with_month():
     df_list = []
     for month_year, file_info in USAGE_FILES.items():
-        df = pd.read_csv(file_info['filename'], sep="\t")
+        with open_data_file(file_info['filename']) as f:
+            df = pd.read_csv(f, sep="\t")
         df.columns = [col.upper() for col in df.columns]
         df["MONTH"] = month_year
         df_list.append(df)
@@ -98,10 +115,12 @@ def load_usage_data_with_month():
 data_files_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data_files'))
 REFERENCE_FILE = os.path.join(data_files_dir, "Reference_Data_Cell_Locations_20250403.csv")
 TAC_FILE = os.path.join(data_files_dir, "TACD_UPDATED.csv")
-INPUT_FILE = os.path.join(data_files_dir, "All_2025-4-2_3.txt")
+INPUT_FILE = resolve_data_file(os.path.join(data_files_dir, "All_2025-4-2_3.txt"))
+VLRD_FILE = os.path.join(data_files_dir, 'VLRD_Sample.xlsx')
 USAGE_FILES = auto_detect_usage_files() 
-VLRD = pd.read_excel(os.path.join(data_files_dir, 'VLRD_Sample.xlsx'))
-zte_rsrp_df = pd.read_excel(os.path.join(data_files_dir, 'ZTE RSRP.xlsx'))
+VLRD = pd.read_excel(VLRD_FILE)
+ZTE_RSRP_FILE = os.path.join(data_files_dir, 'ZTE RSRP.xlsx')
+zte_rsrp_df = pd.read_excel(ZTE_RSRP_FILE)
 huawei_rsrp_df = pd.read_excel(os.path.join(data_files_dir, 'Huawei RSRP.xlsx'))
 lte_utilization_df = load_lte_utilization_data()
 USERTD = load_usage_data_with_month()
@@ -110,6 +129,63 @@ USERTD = load_usage_data_with_month()
 ref_df = pd.read_csv(REFERENCE_FILE)
 tac_df = pd.read_csv(TAC_FILE, low_memory=False)
 
+def source_version(*paths):
+    return '-'.join(str(int(os.path.getmtime(f))) if os.path.exists(f) else '0' for f in paths)
+
+# Frames above are loaded once, so caches built from them are keyed on their files' mtimes at load
+REF_VERSION = source_version(REFERENCE_FILE)
+SEGMENT_FRAMES_VERSION = source_version(TAC_FILE, REFERENCE_FILE, VLRD_FILE)
+SITE_FRAMES_VERSION = source_version(ZTE_RSRP_FILE, REFERENCE_FILE)
+
+# Read-only VLRD index sorted by MSISDN with reference coordinates pre-joined
+VLRD_INDEX = build_vlrd_index(VLRD, ref_df, version=source_version(VLRD_FILE, REFERENCE_FILE))
+
+# Grid index over site coordinates for radius / nearest-site queries
+SITE_INDEX = build_site_index(ref_df)
+
+# (lac, cellid) lookup, per-LAC cell lists and LAC centroids for location fallback
+get_cell_locator(ref_df, REF_VERSION)
+
+# Network map layers (and the RSRP/LTE chart ETags) are versioned by the mtimes of the
+# files behind ref_df and the RSRP/LTE frames, taken when those frames were loaded
+NETWORK_MAP_SOURCES = [
+    REFERENCE_FILE,
+    ZTE_RSRP_FILE,
+    os.path.join(data_files_dir, 'Huawei RSRP.xlsx'),
+    os.path.join(data_files_dir, 'LTE Utilization Report - June v2.xlsx'),
+]
+NETWORK_MAP_VERSION = source_version(*NETWORK_MAP_SOURCES)
+
+get_network_layers(NETWORK_MAP_VERSION, ref_df, zte_rsrp_df, huawei_rsrp_df, lte_utilization_df)
+
+# The measured-coverage pyramid (and the speed-test store it reads, see
+# `python speed_test_store.py`) is built on the first heat-map request
+
+# The speed-test eNodeB -> site ID join (per-site measured performance) is built on first use
+
+# Huawei/ZTE cell-level KPI exports (one schema, per-cell rolling stats) are normalised
+# on first use by /overview or /api/cell-kpi, behind get_cell_kpis' version cache
+
+# The KPI warehouse (monthly workbook folders, e.g. 2025_June) is synced on the first
+# /api/kpi-warehouse request, or ahead of time with `python kpi_warehouse.py`
+
+# 3G call-drop-rate series, parsed once per workbook mtime
+if os.path.exists(os.path.join(data_files_dir, CALL_DROP_RATE_FILE)):
+    get_kpi_series(os.path.join(data_files_dir, CALL_DROP_RATE_FILE))
+
+# Daily HLR/VLR subscriber base with 7/30/90-day rolling means and growth rates
+if os.path.exists(os.path.join(data_files_dir, HLR_VLR_FILE)):
+    get_hlr_vlr_series(os.path.join(data_files_dir, HLR_VLR_FILE))
+
+# Distinct-user cube behind /user_count (rebuilt only when USERTD files change)
+get_user_count_cube(USAGE_FILES, VLRD)
+
+# Cell/site/LAC -> MSISDN posting lists for outage-impact queries
+SUBSCRIBER_INDEX = build_subscriber_index(VLRD, INPUT_FILE, ref_df)
+
+# Use HyperLogLog sketches for the home-page distinct counts (exact sets otherwise)
+APPROXIMATE_INSIGHTS = False
+
 # Load rule-based summarization (lightweight alternative to BART)
 summarizer = None
 
@@ -205,6 +281,15 @@ def generate_ai_summary(text, max_length=150):
     return summary
 
 usage_df = load_usage_data_with_month()
+USAGE_VERSION = source_version(*(info['filename'] for info in USAGE_FILES.values()))
+# (subscriber x month) usage arrays behind the usage dashboard
+get_usage_arrays(usage_df, USAGE_FILES, USAGE_VERSION)
+
+def current_segments():
+    return get_segments(get_usage_arrays(usage_df, USAGE_FILES, USAGE_VERSION), tac_df, INPUT_FILE, ref_df, VLRD, SEGMENT_FRAMES_VERSION)
+
+# Network-wide pattern flags (overview rule thresholds) for every subscriber
+current_segments()
 
 SIM_TYPE_MAPPING = {
     '1': ("ESIM", "PRE"),
@@ -219,7 +304,9 @@ SIM_TYPE_MAPPING = {
 latest_result = {}
 result_cache_timeout = 300  # Cache results for 5 minutes
 ai_summary_cache = {}  # Separate cache for AI summaries
-map_cache = {}  # Separate cache for maps
+map_cache = {}  # Separate cache for maps (MSISDN -> stored map file)
+# Content-addressed folium maps, shared by every MSISDN with the same map inputs
+MAP_STORE = MapArtifactStore(os.path.join(static_dir, 'maps'), legacy_dir=static_dir)
 analytics_cache = {}  # Cache for analytics data (RSRP, LTE, etc.)
 filter_cache = {}  # Cache for filtered results
 
@@ -257,14 +344,13 @@ def is_map_cache_valid(msisdn):
     if msisdn not in map_cache:
         return False
     cache_time = map_cache[msisdn].get('_cache_time', 0)
-    map_file = map_cache[msisdn].get('map_file')
-    # Check if cached and file still exists
-    return (time.time() - cache_time) < result_cache_timeout and os.path.exists(map_file)
+    # Check if cached and the map is still in MAP_STORE
+    return (time.time() - cache_time) < result_cache_timeout and MAP_STORE.contains(map_cache[msisdn]['map_key'])
 
-def cache_map(msisdn, map_file):
-    """Cache map file path"""
+def cache_map(msisdn, key):
+    """Cache the MAP_STORE key of an MSISDN's map"""
     map_cache[msisdn] = {
-        'map_file': map_file,
+        'map_key': key,
         '_cache_time': time.time()
     }
 
@@ -294,6 +380,67 @@ def get_cached_analytics_data(cache_key):
         return analytics_cache[cache_key]['data']
     return None
 
+# 'leaflet' serves one static Leaflet page fed by /api/map-data/<msisdn>;
+# 'folium' renders a standalone HTML map per MSISDN, served from MAP_STORE by /map-file/<msisdn>
+MAP_MODE = 'leaflet'
+
+def get_map_url(msisdn):
+    """URL for the map iframe of an MSISDN in the current MAP_MODE"""
+    if MAP_MODE == 'leaflet':
+        return url_for('static', filename='location_map.html') + '?data=' + url_for('map_data', msisdn=msisdn)
+    if msisdn in map_cache:
+        return url_for('stored_map', msisdn=msisdn)
+    return None
+
+def create_error_map(error):
+    map_obj = folium.Map(
+        location=[7.8731, 80.7718],  
+        zoom_start=7,
+        tiles='OpenStreetMap'
+    )
+    folium.Marker(
+        location=[7.8731, 80.7718],
+        popup="Error: " + error,
+        icon=folium.Icon(color='red', icon='exclamation-sign')
+    ).add_to(map_obj)
+    return map_obj
+
+def store_location_map(msisdn, result):
+    """Render the folium map for a result, or reuse the stored one with the same inputs; returns its HTML"""
+    if "error" in result:
+        key = map_key({'error': result["error"]})
+        html = MAP_STORE.get_or_create(key, lambda: create_error_map(result["error"]))
+    else:
+        key = location_map_key(result)
+        html = MAP_STORE.get_or_create(key, lambda: create_location_map(result, show_msisdn=False))
+    cache_map(msisdn, key)
+    return html
+
+def get_result_for_map(msisdn):
+    """Cached result for the MSISDN, loading it when the cache is cold"""
+    if is_cache_valid(msisdn):
+        return latest_result
+    result = get_msisdn_data(
+        msisdn,
+        INPUT_FILE,
+        SIM_TYPE_MAPPING,
+        ref_df,
+        tac_df,
+        usage_df,
+        USAGE_FILES,
+        VLRD_INDEX,
+        lambda site_id: fetch_rsrp_data_by_site_id(site_id, zte_rsrp_df, huawei_rsrp_df),
+        lambda cell_code: fetch_rsrp_data_directly(cell_code, zte_rsrp_df, huawei_rsrp_df, ref_df),
+        lambda site_id: get_lte_utilization_by_site_id(site_id, lte_utilization_df),
+        lambda cell_code: get_lte_utilization_by_cell_code(cell_code, lte_utilization_df),
+        ref_version=REF_VERSION
+    )
+    if "error" in result:
+        return result
+    # Cached like /overview, so the map page and its /api/map-data request share one load
+    cache_result(result, msisdn)
+    return latest_result
+
 def cleanup_expired_caches():
     """Clean up expired cache entries to prevent memory bloat"""
     current_time = time.time()
@@ -316,12 +463,7 @@ def cleanup_expired_caches():
         if (current_time - cache_data.get('_cache_time', 0)) > result_cache_timeout:
             expired_keys.append(msisdn)
     for key in expired_keys:
-        # Also delete the actual map file
-        if 'map_file' in map_cache[key] and os.path.exists(map_cache[key]['map_file']):
-            try:
-                os.remove(map_cache[key]['map_file'])
-            except:
-                pass  # Ignore file deletion errors
+        # Map files are shared and size-bounded by MAP_STORE; only forget the reference
         del map_cache[key]
     
     # Clean up analytics cache
@@ -342,7 +484,7 @@ def cleanup_expired_caches():
 
 @app.route('/')
 def home():
-    insights = get_device_subscriber_insights()
+    insights = get_device_subscriber_insights(approximate=APPROXIMATE_INSIGHTS)
     return render_template('home.html', insights=insights)
 
 @app.route('/index')
@@ -360,19 +502,17 @@ def index():
             ai_summary = generate_overall_msisdn_summary(result, get_summarizer())
             
             # Create map
-            try:
-                map_obj = create_location_map(result)
-                static_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'static'))
-                if not os.path.exists(static_path):
-                    os.makedirs(static_path)
-                map_path = os.path.join(static_path, 'temp_map.html')
-                map_obj.save(map_path)
+            if MAP_MODE == 'leaflet':
                 has_map = True
-            except Exception as e:
-                print(f"Error creating map: {e}")
-                has_map = False
+            else:
+                try:
+                    store_location_map(msisdn, result)
+                    has_map = True
+                except Exception as e:
+                    print(f"Error creating map: {e}")
+                    has_map = False
             
-            return render_template('index.html', result=result, has_map=has_map, ai_summary=ai_summary, from_overview=True)
+            return render_template('index.html', result=result, has_map=has_map, map_url=get_map_url(msisdn), ai_summary=ai_summary, from_overview=True)
     
     return render_template('index.html')
 
@@ -406,6 +546,11 @@ def logout():
 
 @app.route('/map/<msisdn>')
 def show_map(msisdn):  
+    if MAP_MODE == 'leaflet':
+        # The page fetches its markers from /api/map-data; nothing is rendered server-side
+        result = get_result_for_map(msisdn)
+        return render_template('map_display.html', msisdn=msisdn, result=result, map_url=get_map_url(msisdn))
+
     # Check if we have a cached map first
     if is_map_cache_valid(msisdn):
         print(f"[MAP] Using cached map for {msisdn}")
@@ -422,13 +567,14 @@ def show_map(msisdn):
                 tac_df,
                 usage_df,
                 USAGE_FILES,
-                VLRD,
+                VLRD_INDEX,
                 lambda site_id: fetch_rsrp_data_by_site_id(site_id, zte_rsrp_df, huawei_rsrp_df),
                 lambda cell_code: fetch_rsrp_data_directly(cell_code, zte_rsrp_df, huawei_rsrp_df, ref_df),
                 lambda site_id: get_lte_utilization_by_site_id(site_id, lte_utilization_df),
-                lambda cell_code: get_lte_utilization_by_cell_code(cell_code, lte_utilization_df)
+                lambda cell_code: get_lte_utilization_by_cell_code(cell_code, lte_utilization_df),
+                ref_version=REF_VERSION
             )
-        return render_template('map_display.html', msisdn=msisdn, result=result)
+        return render_template('map_display.html', msisdn=msisdn, result=result, map_url=get_map_url(msisdn))
     
     # Generate new map if not cached
     result = get_msisdn_data(
@@ -439,41 +585,34 @@ def show_map(msisdn):
         tac_df,
         usage_df,
         USAGE_FILES,
-        VLRD,
+        VLRD_INDEX,
         lambda site_id: fetch_rsrp_data_by_site_id(site_id, zte_rsrp_df, huawei_rsrp_df),
         lambda cell_code: fetch_rsrp_data_directly(cell_code, zte_rsrp_df, huawei_rsrp_df, ref_df),
         lambda site_id: get_lte_utilization_by_site_id(site_id, lte_utilization_df),
-        lambda cell_code: get_lte_utilization_by_cell_code(cell_code, lte_utilization_df)
+        lambda cell_code: get_lte_utilization_by_cell_code(cell_code, lte_utilization_df),
+        ref_version=REF_VERSION
     )
 
-    if "error" in result:
-        map_obj = folium.Map(
-            location=[7.8731, 80.7718],  
-            zoom_start=7,
-            tiles='OpenStreetMap'
-        )
-
-        folium.Marker(
-            location=[7.8731, 80.7718],
-            popup="Error: " + result["error"],
-            icon=folium.Icon(color='red', icon='exclamation-sign')
-        ).add_to(map_obj)
+    store_location_map(msisdn, result)
+    
+    return render_template('map_display.html', msisdn=msisdn, result=result, map_url=get_map_url(msisdn))
 
-    else:
-        map_obj = create_location_map(result)
+@app.route('/map-file/<msisdn>')
+def stored_map(msisdn):
+    """Folium map HTML of an MSISDN, re-rendered when MAP_STORE evicted it after the page was built"""
+    entry = map_cache.get(msisdn)
+    html = MAP_STORE.get(entry['map_key']) if entry else None
+    if html is None:
+        html = store_location_map(msisdn, get_result_for_map(msisdn))
+    return Response(html, mimetype='text/html')
 
-    static_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'static'))
-    if not os.path.exists(static_path):
-        os.makedirs(static_path)
-    
-    # Use unique filename for each MSISDN
-    map_path = os.path.join(static_path, f'temp_map_{msisdn}.html')
-    map_obj.save(map_path)
-    
-    # Cache the map
-    cache_map(msisdn, map_path)
-    
-    return render_template('map_display.html', msisdn=msisdn, result=result)
+#map markers/popups/legend for the client-rendered map page
+@app.route('/api/map-data/<msisdn>')
+def map_data(msisdn):
+    result = get_result_for_map(msisdn)
+    if "error" in result:
+        return jsonify(build_error_map_data(msisdn, result["error"]))
+    return jsonify(build_location_map_data(result))
 
 #search msisdn
 @app.route('/search', methods=['POST'])
@@ -493,11 +632,12 @@ def search():
         tac_df,
         usage_df,
         USAGE_FILES,
-        VLRD,
+        VLRD_INDEX,
         lambda site_id: fetch_rsrp_data_by_site_id(site_id, zte_rsrp_df, huawei_rsrp_df),
         lambda cell_code: fetch_rsrp_data_directly(cell_code, zte_rsrp_df, huawei_rsrp_df, ref_df),
         lambda site_id: get_lte_utilization_by_site_id(site_id, lte_utilization_df),
-        lambda cell_code: get_lte_utilization_by_cell_code(cell_code, lte_utilization_df)
+        lambda cell_code: get_lte_utilization_by_cell_code(cell_code, lte_utilization_df),
+        ref_version=REF_VERSION
     )
     if "error" in result:
         return render_template('index.html', error=result["error"])
@@ -535,11 +675,12 @@ def overview(msisdn):
             tac_df,
             usage_df,
             USAGE_FILES,
-            VLRD,
+            VLRD_INDEX,
             lambda site_id: fetch_rsrp_data_by_site_id(site_id, zte_rsrp_df, huawei_rsrp_df),
             lambda cell_code: fetch_rsrp_data_directly(cell_code, zte_rsrp_df, huawei_rsrp_df, ref_df),
             lambda site_id: get_lte_utilization_by_site_id(site_id, lte_utilization_df),
-            lambda cell_code: get_lte_utilization_by_cell_code(cell_code, lte_utilization_df)
+            lambda cell_code: get_lte_utilization_by_cell_code(cell_code, lte_utilization_df),
+            ref_version=REF_VERSION
         )
         if "error" in result:
             flash(f"Error loading data for MSISDN {msisdn}: {result['error']}", "error")
@@ -552,20 +693,25 @@ def overview(msisdn):
         print(f"[CACHE HIT] Using cached data for MSISDN: {msisdn}")
         result = latest_result
 
+    site_ids = [result.get('Cellcode')] + [loc.get('CELL_CODE') for loc in result.get('Common Cell Locations', [])]
+    performance = get_site_performance(data_files_dir, zte_rsrp_df, SITE_INDEX, SITE_FRAMES_VERSION)
+    result['Measured Performance'] = site_performance_rows(performance, [s for s in site_ids if s not in ('Not Found', 'Unknown')])
+    result['Cell KPI Trend'] = cell_kpi_trend(get_cell_kpis(data_files_dir), result.get('Cellcode'))
+
     ai_summary = None
     if is_ai_cache_valid(msisdn):
         print("[AI] Using cached AI summary")
         ai_summary = ai_summary_cache[msisdn]['summary']
     
-    has_map = False
-    if is_map_cache_valid(msisdn):
+    has_map = MAP_MODE == 'leaflet'
+    if not has_map and is_map_cache_valid(msisdn):
         print("[MAP] Using cached map")
         has_map = True
     
     if ai_summary is not None and has_map:
         total_time = time.time() - start_time
         print(f"[OVERVIEW] Fast cached overview served in {total_time:.2f} seconds")
-        return render_template('overview.html', result=result, has_map=has_map, ai_summary=ai_summary)
+        return render_template('overview.html', result=result, has_map=has_map, map_url=get_map_url(msisdn), ai_summary=ai_summary)
     
     if ai_summary is None:
         ai_start = time.time()
@@ -582,13 +728,7 @@ def overview(msisdn):
         map_start = time.time()
         print("[MAP] Creating location map...")
         try:
-            map_obj = create_location_map(result)
-            static_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'static'))
-            if not os.path.exists(static_path):
-                os.makedirs(static_path)
-            map_path = os.path.join(static_path, f'temp_map_{msisdn}.html')
-            map_obj.save(map_path)
-            cache_map(msisdn, map_path)
+            store_location_map(msisdn, result)
             has_map = True
             print(f"[MAP] Map created in {time.time() - map_start:.2f} seconds")
         except Exception as e:
@@ -598,14 +738,15 @@ def overview(msisdn):
     total_time = time.time() - start_time
     print(f"[OVERVIEW] Total overview generation time: {total_time:.2f} seconds")
 
-    return render_template('overview.html', result=result, has_map=has_map, ai_summary=ai_summary)
+    return render_template('overview.html', result=result, has_map=has_map, map_url=get_map_url(msisdn), ai_summary=ai_summary)
 
 #user count by site
 @app.route('/user_count')
 def user_count():
     month = request.args.get('month')
     district = request.args.get('district')
-    table_data = get_user_count(month, district, USAGE_FILES, VLRD, ref_df)
+    cube = get_user_count_cube(USAGE_FILES, VLRD)
+    table_data = query_user_count_cube(cube, month, district, ref_df)
 
     if table_data is None or table_data.empty:
         table_data = pd.DataFrame()  
@@ -624,7 +765,8 @@ def user_count():
 def user_count_search():
     month = request.form.get('month')
     district = request.form.get('district')
-    table_data = get_user_count(month, district, USAGE_FILES, VLRD, ref_df)
+    cube = get_user_count_cube(USAGE_FILES, VLRD)
+    table_data = query_user_count_cube(cube, month, district, ref_df)
     return render_template(
         'export_vlr_data.html',
         table_data=table_data.to_dict(orient='records'),
@@ -638,23 +780,334 @@ def user_count_search():
 def download_user_count():
     month = request.form.get('month')
     district = request.form.get('district')
-    df = get_user_count(month, district)
+    export_format = request.form.get('format', 'csv')
+    cube = get_user_count_cube(USAGE_FILES, VLRD)
+    df = query_user_count_cube(cube, month, district, ref_df)
 
     if df.empty:
         return "No data available to download", 204
+    if export_format not in EXPORT_FORMATS:
+        return f"Unsupported export format '{export_format}'", 400
+
+    filename = f"user_count_{month or 'All'}_{district or 'All'}"
+    return streaming_export_response(df, filename, export_format)
+
+#affected subscribers for a cell/site/LAC
+@app.route('/api/affected-subscribers')
+def affected_subscribers():
+    """Return subscribers seen on the given cells, sites or LACs (intersection by default)"""
+    start_time = time.time()
+    cells = [c for c in request.args.getlist('cell') if c.strip()]
+    sites = [s for s in request.args.getlist('site') if s.strip()]
+    lacs = [l for l in request.args.getlist('lac') if l.strip()]
+    mode = request.args.get('mode', 'intersect')
+    limit = request.args.get('limit', 1000, type=int)
+
+    if not (cells or sites or lacs):
+        return jsonify({'error': 'At least one cell, site or lac parameter is required'}), 400
+    if limit is None or limit < 1:
+        return jsonify({'error': 'limit must be a positive integer'}), 400
+    if mode not in ('intersect', 'union'):
+        return jsonify({'error': "mode must be 'intersect' or 'union'"}), 400
+
+    msisdns = query_subscribers(SUBSCRIBER_INDEX, cells=cells, sites=sites, lacs=lacs, mode=mode)
+    return jsonify({
+        'cells': cells,
+        'sites': sites,
+        'lacs': lacs,
+        'mode': mode,
+        'affected_count': int(len(msisdns)),
+        'msisdns': [str(m) for m in msisdns[:limit]],
+        'truncated': bool(len(msisdns) > limit),
+        'elapsed_ms': round((time.time() - start_time) * 1000, 3)
+    })
+
+def _segment_args():
+    """flag/any/exclude (repeatable or comma-separated) and district/site filters, or an error response"""
+    def names(key):
+        return [n.strip() for value in request.args.getlist(key) for n in value.split(',') if n.strip()]
+    args = {
+        'all_of': names('flag'),
+        'any_of': names('any'),
+        'none_of': names('exclude'),
+        'districts': names('district'),
+        'sites': names('site'),
+    }
+    unknown = [n for key in ('all_of', 'any_of', 'none_of') for n in args[key] if n not in FLAGS]
+    if unknown:
+        return None, (jsonify({'error': f"Unknown flag(s): {', '.join(unknown)}", 'flags': list(FLAGS)}), 400)
+    return args, None
+
+#segment flags and what they mean
+@app.route('/api/segments/flags')
+def segment_flags():
+    return jsonify({'flags': FLAGS, 'group_by': list(GROUP_KINDS)})
+
+#subscribers in a segment, e.g. heavy data users on pre-2022 devices in Gampaha:
+#?flag=heavy_data,old_device&district=Gampaha
+@app.route('/api/segments')
+def segments_query():
+    start_time = time.time()
+    args, error = _segment_args()
+    if error:
+        return error
+    limit = request.args.get('limit', 1000, type=int)
+    if limit is None or limit < 1:
+        return jsonify({'error': 'limit must be a positive integer'}), 400
+    export_format = request.args.get('format')
+    if export_format and export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"Unsupported format '{export_format}'"}), 400
+    segments = current_segments()
+    mask = segment_mask(segments, **args)
+    if export_format:
+        return streaming_export_response(segment_table(segments, mask), 'segment', export_format)
+    count = int(mask.sum())
+    return jsonify({
+        **args,
+        'count': count,
+        'by_district': {name: c['subscribers'] for name, c in segment_counts(segments, 'district', mask).items()},
+        'subscribers': segment_rows(segments, mask, limit),
+        'truncated': bool(count > limit),
+        'elapsed_ms': round((time.time() - start_time) * 1000, 3)
+    })
+
+#per-district/site flag counts, optionally within a segment
+@app.route('/api/segments/counts')
+def segments_counts():
+    start_time = time.time()
+    args, error = _segment_args()
+    if error:
+        return error
+    by = request.args.get('by', 'district')
+    if by not in GROUP_KINDS:
+        return jsonify({'error': f"by must be one of {', '.join(GROUP_KINDS)}"}), 400
+    segments = current_segments()
+    counts = segment_counts(segments, by, segment_mask(segments, **args))
+    return jsonify({
+        **args,
+        'by': by,
+        'counts': counts,
+        'elapsed_ms': round((time.time() - start_time) * 1000, 3)
+    })
+
+def _query_point():
+    """lat/lon query parameters, or an error response"""
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    if lat is None or lon is None or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None, (jsonify({'error': 'Valid lat and lon parameters are required'}), 400)
+    return (lat, lon), None
+
+#sites within a radius of a point
+@app.route('/api/sites/nearby')
+def sites_nearby():
+    """Sites within radius_km (default 2) of lat/lon, nearest first"""
+    start_time = time.time()
+    point, error = _query_point()
+    if error:
+        return error
+    radius_km = request.args.get('radius_km', 2.0, type=float)
+    limit = request.args.get('limit', 100, type=int)
+    if radius_km is None or radius_km <= 0:
+        return jsonify({'error': 'radius_km must be positive'}), 400
+    if limit is None or limit < 1:
+        return jsonify({'error': 'limit must be a positive integer'}), 400
+    positions, distances = query_radius(SITE_INDEX, point[0], point[1], radius_km)
+    return jsonify({
+        'lat': point[0],
+        'lon': point[1],
+        'radius_km': radius_km,
+        'site_count': int(len(positions)),
+        'sites': describe(SITE_INDEX, positions[:limit], distances[:limit]),
+        'truncated': bool(len(positions) > limit),
+        'elapsed_ms': round((time.time() - start_time) * 1000, 3)
+    })
 
-    csv_stream = io.StringIO()
-    df.to_csv(csv_stream, index=False)
-    csv_stream.seek(0)
+#k nearest sites to a point
+@app.route('/api/sites/nearest')
+def sites_nearest():
+    """The k (default 5) sites nearest to lat/lon"""
+    start_time = time.time()
+    point, error = _query_point()
+    if error:
+        return error
+    k = request.args.get('k', 5, type=int)
+    if k is None or not 1 <= k <= 1000:
+        return jsonify({'error': 'k must be between 1 and 1000'}), 400
+    positions, distances = query_nearest(SITE_INDEX, point[0], point[1], k)
+    return jsonify({
+        'lat': point[0],
+        'lon': point[1],
+        'k': k,
+        'sites': describe(SITE_INDEX, positions, distances),
+        'elapsed_ms': round((time.time() - start_time) * 1000, 3)
+    })
 
-    filename = f"user_count_{month or 'All'}_{district or 'All'}.csv"
+#network-wide site map (clusters or sites inside a bbox)
+@app.route('/api/network-map')
+def network_map_data():
+    """bbox=minLon,minLat,maxLon,maxLat&zoom=Z -> GeoJSON FeatureCollection"""
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(v) for v in request.args.get('bbox', '-180,-90,180,90').split(','))
+    except ValueError:
+        return jsonify({'error': 'bbox must be minLon,minLat,maxLon,maxLat'}), 400
+    zoom = request.args.get('zoom', 7, type=int)
+    version = NETWORK_MAP_VERSION
+    etag = f'"{version}-{zoom}-{min_lon},{min_lat},{max_lon},{max_lat}"'
+    if request.headers.get('If-None-Match') == etag:
+        return '', 304
+    layers = get_network_layers(version, ref_df, zte_rsrp_df, huawei_rsrp_df, lte_utilization_df)
+    collection = query_bbox(layers, zoom, min_lon, min_lat, max_lon, max_lat)
+    collection['version'] = version
+    response = jsonify(collection)
+    response.headers['ETag'] = etag
+    return response
+
+@app.route('/network-map')
+def network_map():
+    return redirect(url_for('static', filename='network_map.html'))
+
+def _coverage_args():
+    """metric/operator query parameters, or an error response"""
+    metric = request.args.get('metric', 'rsrp')
+    operator = request.args.get('operator', 'All')
+    if metric not in HEATMAP_METRICS:
+        return None, (jsonify({'error': f"metric must be one of {', '.join(HEATMAP_METRICS)}"}), 400)
+    return (metric, operator), None
+
+#measured coverage heat-map cells inside a bbox
+@app.route('/api/coverage')
+def coverage_bbox():
+    """bbox=minLon,minLat,maxLon,maxLat&zoom=Z&metric=rsrp&operator=All"""
+    args, error = _coverage_args()
+    if error:
+        return error
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(v) for v in request.args.get('bbox', '-180,-90,180,90').split(','))
+    except ValueError:
+        return jsonify({'error': 'bbox must be minLon,minLat,maxLon,maxLat'}), 400
+    zoom = request.args.get('zoom', 10, type=int)
+    pyramid = get_coverage_pyramid(data_files_dir)
+    return jsonify(query_coverage_bbox(pyramid, zoom, min_lon, min_lat, max_lon, max_lat, args[0], args[1]))
+
+#measured coverage around one location (e.g. a complaint address)
+@app.route('/api/coverage/point')
+def coverage_point():
+    start_time = time.time()
+    args, error = _coverage_args()
+    if error:
+        return error
+    point, error = _query_point()
+    if error:
+        return error
+    pyramid = get_coverage_pyramid(data_files_dir)
+    result = query_coverage_point(pyramid, point[0], point[1], args[0], args[1])
+    result['operators'] = pyramid['operators']
+    result['elapsed_ms'] = round((time.time() - start_time) * 1000, 3)
+    return jsonify(result)
+
+#crowdsourced measured performance of one site
+@app.route('/api/site-performance/<site_id>')
+def site_performance(site_id):
+    start_time = time.time()
+    performance = get_site_performance(data_files_dir, zte_rsrp_df, SITE_INDEX, SITE_FRAMES_VERSION)
+    rows = site_performance_rows(performance, [site_id])
+    if not rows:
+        return jsonify({'error': f'No speed-test measurements joined to site {site_id}'}), 404
+    result = dict(rows[0])
+    result['elapsed_ms'] = round((time.time() - start_time) * 1000, 3)
+    return jsonify(result)
+
+#serving-cell KPI trend (falls back to the cells of the site), e.g. ?periods=30
+@app.route('/api/cell-kpi/<cellcode>')
+def cell_kpi(cellcode):
+    start_time = time.time()
+    periods = request.args.get('periods', type=int, default=TREND_PERIODS)
+    if periods < 1:
+        return jsonify({'error': 'periods must be a positive integer'}), 400
+    result = cell_kpi_trend(get_cell_kpis(data_files_dir), cellcode, periods)
+    if result['match'] is None:
+        return jsonify({'error': f'No cell KPI exports found for cell {cellcode}'}), 404
+    result['elapsed_ms'] = round((time.time() - start_time) * 1000, 3)
+    return jsonify(result)
+
+#subscriber mobility profile
+@app.route('/api/mobility/<msisdn>')
+def mobility_profile(msisdn):
+    """Radius of gyration, max inter-cell distance, home cell and district count"""
+    profile = get_mobility_profile(VLRD_INDEX, msisdn)
+    if profile['cell_count'] == 0:
+        return jsonify({'error': f'No common cells found for MSISDN {msisdn}'}), 404
+    return jsonify(profile)
+
+#batch mobility profiles for the whole VLRD base
+@app.route('/mobility_export')
+def mobility_export():
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"Unsupported format '{export_format}'"}), 400
+    mobility_class = request.args.get('class')
+    table = get_mobility_table(VLRD_INDEX)
+    if mobility_class:
+        table = table[table['mobility_class'] == mobility_class]
+    return streaming_export_response(table, f"mobility_{mobility_class or 'all'}", export_format)
+
+#sources, KPIs and elements available in the KPI warehouse
+@app.route('/api/kpi-warehouse/catalog')
+def kpi_warehouse_catalog():
+    return jsonify(kpi_catalog(get_kpi_warehouse(data_files_dir)))
+
+#windowed KPI query, e.g. ?element=VMSC05&kpi=3G&days=90
+@app.route('/api/kpi-warehouse')
+def kpi_warehouse_query():
+    start_time = time.time()
+    days = request.args.get('days', type=int)
+    if days is not None and days < 1:
+        return jsonify({'error': 'days must be a positive integer'}), 400
+    try:
+        start, end = (pd.Timestamp(request.args[k]) if request.args.get(k) else None for k in ('start', 'end'))
+    except ValueError:
+        return jsonify({'error': 'start/end must be dates (YYYY-MM-DD)'}), 400
+    element = request.args.get('element')
+    export_format = request.args.get('format')
+    if export_format and export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"Unsupported format '{export_format}'"}), 400
+    kpi, source = request.args.get('kpi'), request.args.get('source')
+    manifest = get_kpi_warehouse(data_files_dir)
+    rows = query_kpis(
+        kpi_warehouse_dir(data_files_dir), manifest,
+        element=element or None,  # canonicalised by query_kpis the same way as at ingest
+        kpi=kpi, source=source, start=start, end=end, days=days,
+    )
+    if export_format:
+        return streaming_export_response(rows, f"kpi_{element or 'all'}", export_format)
+    rows['date'] = rows['date'].dt.strftime('%Y-%m-%d')
+    window_start, window_end = kpi_window(manifest, source, start, end, days)
+    return jsonify({
+        'window_start': window_start.strftime('%Y-%m-%d') if window_start is not None else None,
+        'window_end': window_end.strftime('%Y-%m-%d') if window_end is not None else None,
+        # latest data for the element/KPI; before window_end when that series has stopped
+        'last_date': kpi_last_date(manifest, element or None, kpi, source),
+        'count': len(rows),
+        'rows': rows.to_dict(orient='records'),
+        'elapsed_ms': round((time.time() - start_time) * 1000, 3),
+    })
 
-    return send_file(
-        io.BytesIO(csv_stream.getvalue().encode('utf-8')),
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name=filename
+#approximate distinct devices/subscribers
+@app.route('/api/distinct-counts')
+def distinct_counts():
+    """Approximate distinct IMEIs/MSISDNs over selected shards, days (YYYY-MM-DD) and districts"""
+    precision = request.args.get('precision', DEFAULT_PRECISION, type=int)
+    if not MIN_PRECISION <= precision <= MAX_PRECISION:
+        return jsonify({'error': f'precision must be between {MIN_PRECISION} and {MAX_PRECISION}'}), 400
+    counts = get_distinct_counts(
+        data_files_dir,
+        shards=[s for s in request.args.getlist('shard') if s.strip()],
+        days=[d for d in request.args.getlist('day') if d.strip()],
+        districts=[d for d in request.args.getlist('district') if d.strip()],
+        precision=precision
     )
+    return jsonify(counts)
 
 
 @app.route('/rsrp_ranges_direct/<cell_code>', methods=['GET', 'POST'])
@@ -711,6 +1164,16 @@ def get_rsrp_by_site_id(site_id):
     except Exception as e:
         return jsonify({'error': f'Error fetching RSRP data: {str(e)}'}), 500
 
+@app.route('/rsrp_export')
+def rsrp_export():
+    """Stream ZTE and Huawei RSRP tables (optionally one site) as CSV or NDJSON"""
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"Unsupported export format '{export_format}'"}), 400
+    site_id = request.args.get('site_id', '').strip()
+    frames = iter_rsrp_export_frames(zte_rsrp_df, huawei_rsrp_df, site_id or None)
+    return streaming_export_response(frames, f"rsrp_{site_id or 'All'}", export_format)
+
 @app.route('/filter_rsrp_data', methods=['POST'])
 def filter_rsrp_data():
     start_time = time.time()
@@ -744,11 +1207,12 @@ def filter_rsrp_data():
             tac_df,
             usage_df,
             USAGE_FILES,
-            VLRD,
+            VLRD_INDEX,
             lambda site_id: fetch_rsrp_data_by_site_id(site_id, zte_rsrp_df, huawei_rsrp_df),
             lambda cell_code: fetch_rsrp_data_directly(cell_code, zte_rsrp_df, huawei_rsrp_df, ref_df),
             lambda site_id: get_lte_utilization_by_site_id(site_id, lte_utilization_df),
-            lambda cell_code: get_lte_utilization_by_cell_code(cell_code, lte_utilization_df)
+            lambda cell_code: get_lte_utilization_by_cell_code(cell_code, lte_utilization_df),
+            ref_version=REF_VERSION
         )
         if "error" in result:
             return jsonify({'error': result["error"]}), 404
@@ -944,11 +1408,12 @@ def filter_common_rsrp_data():
             tac_df,
             usage_df,
             USAGE_FILES,
-            VLRD,
+            VLRD_INDEX,
             lambda site_id: fetch_rsrp_data_by_site_id(site_id, zte_rsrp_df, huawei_rsrp_df),
             lambda cell_code: fetch_rsrp_data_directly(cell_code, zte_rsrp_df, huawei_rsrp_df, ref_df),
             lambda site_id: get_lte_utilization_by_site_id(site_id, lte_utilization_df),
-            lambda cell_code: get_lte_utilization_by_cell_code(cell_code, lte_utilization_df)
+            lambda cell_code: get_lte_utilization_by_cell_code(cell_code, lte_utilization_df),
+            ref_version=REF_VERSION
         )
         if "error" in result:
             return jsonify({'error': result["error"]}), 404
@@ -1038,11 +1503,12 @@ def ai_overall_summary():
             tac_df,
             usage_df,
             USAGE_FILES,
-            VLRD,
+            VLRD_INDEX,
             lambda site_id: fetch_rsrp_data_by_site_id(site_id, zte_rsrp_df, huawei_rsrp_df),
             lambda cell_code: fetch_rsrp_data_directly(cell_code, zte_rsrp_df, huawei_rsrp_df, ref_df),
             lambda site_id: get_lte_utilization_by_site_id(site_id, lte_utilization_df),
-            lambda cell_code: get_lte_utilization_by_cell_code(cell_code, lte_utilization_df)
+            lambda cell_code: get_lte_utilization_by_cell_code(cell_code, lte_utilization_df),
+            ref_version=REF_VERSION
         )
         if 'error' in user_data:
             return jsonify({'error': user_data['error']}), 404
@@ -1069,67 +1535,27 @@ def usage_chart_data(msisdn):
     result = latest_result
     monthly_usage = result.get('Monthly Usage', {})
     
-    if not monthly_usage:
+    if not monthly_usage or not monthly_usage.get('months'):
         return jsonify({'error': 'No usage data found'}), 404
     
-    # Prepare data for Chart.js
-    labels = list(monthly_usage.keys())
-    data_values = []
-    
-    for month_data in monthly_usage.values():
-        if isinstance(month_data, dict) and 'Total Usage (MB)' in month_data:
-            # Convert MB to GB for better readability
-            usage_gb = round(month_data['Total Usage (MB)'] / 1024, 2)
-            data_values.append(usage_gb)
-        else:
-            data_values.append(0)
-    
-    return jsonify({
-        'type': 'bar',
-        'data': {
-            'labels': labels,
-            'datasets': [{
-                'label': 'Data Usage (GB)',
-                'data': data_values,
-                'backgroundColor': 'rgba(54, 162, 235, 0.6)',
-                'borderColor': 'rgba(54, 162, 235, 1)',
-                'borderWidth': 1
-            }]
-        },
-        'options': {
-            'responsive': True,
-            'maintainAspectRatio': True,
-            'aspectRatio': 2,
-            'plugins': {
-                'title': {
-                    'display': True,
-                    'text': f'Monthly Data Usage for {msisdn}',
-                    'font': {
-                        'size': 16
-                    }
-                },
-                'legend': {
-                    'display': True,
-                    'position': 'top'
-                }
-            },
-            'scales': {
-                'y': {
-                    'beginAtZero': True,
-                    'title': {
-                        'display': True,
-                        'text': 'Usage (GB)'
-                    }
-                },
-                'x': {
-                    'title': {
-                        'display': True,
-                        'text': 'Month'
-                    }
-                }
-            }
-        }
-    })
+    # The cached result is the data version
+    etag = chart_etag('usage', msisdn, result.get('_cache_time'))
+    if request.headers.get('If-None-Match') == etag:
+        return '', 304
+    
+    # Convert MB to GB for better readability
+    data_values = [round(mb / 1024, 2) for mb in monthly_usage.get('Total', [])]
+    
+    return chart_response('usage', {
+        'labels': monthly_usage['months'],
+        'datasets': [{
+            'label': 'Data Usage (GB)',
+            'data': data_values,
+            'backgroundColor': 'rgba(54, 162, 235, 0.6)',
+            'borderColor': 'rgba(54, 162, 235, 1)',
+            'borderWidth': 1
+        }]
+    }, etag, title=f'Monthly Data Usage for {msisdn}')
 
 @app.route('/api/rsrp-trend-data/<msisdn>')
 def rsrp_trend_data(msisdn):
@@ -1143,6 +1569,11 @@ def rsrp_trend_data(msisdn):
     if not cellcode or cellcode == "Not Found":
         return jsonify({'error': 'No cell code found'}), 404
     
+    # RSRP frames are loaded from the network map sources at startup
+    etag = chart_etag('rsrp_trend', cellcode, NETWORK_MAP_VERSION)
+    if request.headers.get('If-None-Match') == etag:
+        return '', 304
+    
     # Get RSRP data
     rsrp_data = fetch_rsrp_data_directly(cellcode, zte_rsrp_df, huawei_rsrp_df, ref_df)
     
@@ -1151,49 +1582,26 @@ def rsrp_trend_data(msisdn):
     
     # Prepare trend data (showing RSRP ranges)
     labels = ['Range 1 (>-105dBm)', 'Range 2 (-105~-110dBm)', 'Range 3 (-110~-115dBm)', 'Range 4 (<-115dBm)']
-    data_values = []
     colors = ['rgba(76, 175, 80, 0.6)', 'rgba(255, 193, 7, 0.6)', 'rgba(255, 152, 0, 0.6)', 'rgba(244, 67, 54, 0.6)']
     
-    if rsrp_data:
-        first_row = rsrp_data[0]
-        data_values = [
-            float(first_row.get('RSRP Range 1 (>-105dBm) %', 0)),
-            float(first_row.get('RSRP Range 2 (-105~-110dBm) %', 0)),
-            float(first_row.get('RSRP Range 3 (-110~-115dBm) %', 0)),
-            float(first_row.get('RSRP < -115dBm %', 0))
-        ]
-    
-    return jsonify({
-        'type': 'doughnut',
-        'data': {
-            'labels': labels,
-            'datasets': [{
-                'label': 'RSRP Distribution (%)',
-                'data': data_values,
-                'backgroundColor': colors,
-                'borderColor': [color.replace('0.6', '1') for color in colors],
-                'borderWidth': 1
-            }]
-        },
-        'options': {
-            'responsive': True,
-            'maintainAspectRatio': True,
-            'aspectRatio': 1.5,
-            'plugins': {
-                'title': {
-                    'display': True,
-                    'text': f'RSRP Signal Quality Distribution for {cellcode}',
-                    'font': {
-                        'size': 16
-                    }
-                },
-                'legend': {
-                    'display': True,
-                    'position': 'bottom'
-                }
-            }
-        }
-    })
+    first_row = rsrp_data[0]
+    data_values = [
+        float(first_row.get('RSRP Range 1 (>-105dBm) %', 0)),
+        float(first_row.get('RSRP Range 2 (-105~-110dBm) %', 0)),
+        float(first_row.get('RSRP Range 3 (-110~-115dBm) %', 0)),
+        float(first_row.get('RSRP < -115dBm %', 0))
+    ]
+    
+    return chart_response('rsrp_trend', {
+        'labels': labels,
+        'datasets': [{
+            'label': 'RSRP Distribution (%)',
+            'data': data_values,
+            'backgroundColor': colors,
+            'borderColor': [color.replace('0.6', '1') for color in colors],
+            'borderWidth': 1
+        }]
+    }, etag, title=f'RSRP Signal Quality Distribution for {cellcode}')
 
 @app.route('/api/lte-utilization-chart-data/<msisdn>')
 def lte_utilization_chart_data(msisdn):
@@ -1210,6 +1618,11 @@ def lte_utilization_chart_data(msisdn):
     # Get site ID from cellcode
     site_id = str(cellcode)[:6]
     
+    # The LTE utilization report is one of the network map sources loaded at startup
+    etag = chart_etag('lte_utilization', cellcode, NETWORK_MAP_VERSION)
+    if request.headers.get('If-None-Match') == etag:
+        return '', 304
+    
     # Get LTE utilization data
     lte_data = get_lte_utilization_by_site_id(site_id, lte_utilization_df)
     
@@ -1230,108 +1643,58 @@ def lte_utilization_chart_data(msisdn):
         labels.append(cell_id)
         data_values.append(utilization)
     
-    return jsonify({
-        'type': 'line',
-        'data': {
-            'labels': labels,
-            'datasets': [{
-                'label': 'DL Throughput (Mbps)',
-                'data': data_values,
-                'borderColor': 'rgba(75, 192, 192, 1)',
-                'backgroundColor': 'rgba(75, 192, 192, 0.2)',
-                'borderWidth': 2,
-                'fill': True,
-                'tension': 0.1
-            }]
-        },
-        'options': {
-            'responsive': True,
-            'maintainAspectRatio': True,
-            'aspectRatio': 2,
-            'plugins': {
-                'title': {
-                    'display': True,
-                    'text': f'LTE Utilization for Site {site_id}',
-                    'font': {
-                        'size': 16
-                    }
-                },
-                'legend': {
-                    'display': True,
-                    'position': 'top'
-                }
-            },
-            'scales': {
-                'y': {
-                    'beginAtZero': True,
-                    'title': {
-                        'display': True,
-                        'text': 'Throughput (Mbps)'
-                    }
-                },
-                'x': {
-                    'title': {
-                        'display': True,
-                        'text': 'Cell ID'
-                    }
-                }
-            }
-        }
-    })
+    return chart_response('lte_utilization', {
+        'labels': labels,
+        'datasets': [{
+            'label': 'DL Throughput (Mbps)',
+            'data': data_values,
+            'borderColor': 'rgba(75, 192, 192, 1)',
+            'backgroundColor': 'rgba(75, 192, 192, 0.2)',
+            'borderWidth': 2,
+            'fill': True,
+            'tension': 0.1
+        }]
+    }, etag, title=f'LTE Utilization for Site {site_id}')
 
 # --- 3G Call Drop Rate Data API for JS Chart.js Chart ---
+def _downsample_args():
+    """points/method query parameters (points is None when not downsampling), or an error response"""
+    points = request.args.get('points', type=int)
+    method = request.args.get('method', 'lttb')
+    if points is not None and points < MIN_POINTS:
+        return None, (jsonify({'error': f'points must be at least {MIN_POINTS}'}), 400)
+    if method not in DOWNSAMPLE_METHODS:
+        return None, (jsonify({'error': f"method must be one of {', '.join(DOWNSAMPLE_METHODS)}"}), 400)
+    return (points, method), None
+
+#?points=N downsamples the series (LTTB, or method=minmax) for charting
 @app.route('/call-drop-rate-3g-data')
 def call_drop_rate_3g_data():
-    from datetime import datetime
+    args, error = _downsample_args()
+    if error:
+        return error
     try:
-        file_path = os.path.join(data_files_dir, 'Call_Drop_Rate_3G.xls')
+        file_path = os.path.join(data_files_dir, CALL_DROP_RATE_FILE)
         if not os.path.exists(file_path):
             return jsonify({'error': 'Call_Drop_Rate_3G.xls not found'}), 404
 
-        # Try to read sheet 1, fallback to sheet 0 if error
         try:
-            df = pd.read_excel(file_path, sheet_name=1)
-        except Exception:
-            try:
-                df = pd.read_excel(file_path, sheet_name=0)
-            except Exception as e:
-                return jsonify({'error': f'Excel read error: {str(e)}'}), 500
-
-        df = df.rename(columns=lambda x: str(x).strip())
-        available_cols = list(df.columns)
-        # Robustly detect the date and drop columns
-        # Robustly select drop_col
-        drop_col = '3G Call Drop Rate'
-        if drop_col not in df.columns:
-            drop_col = df.columns[-1]  # fallback to last column
-        # Robustly select date_col
-        if 'Start' in df.columns:
-            date_col = 'Start'
-        else:
-            date_col = df.columns[0]  # fallback to first column
-
-        # Keep original date strings for x-axis
-        df = df[df[date_col].notnull()]
-        # Save original date strings before conversion
-        original_dates = df[date_col].astype(str).tolist()
-        # For filtering, convert to datetime (but keep original for x-axis)
-        df[date_col + '_dt'] = pd.to_datetime(df[date_col], errors='coerce')
-        df = df[df[date_col + '_dt'].notnull()]
-        df = df[df[date_col + '_dt'].dt.year >= 2014]
-        df = df.sort_values(date_col + '_dt')
-        df[drop_col] = df[drop_col].replace({pd.NA: None, float('inf'): None, float('-inf'): None})
-        # After filtering/sorting, get the original date strings in the same order
-        x = df[date_col].astype(str).tolist()
-        y = df[drop_col].tolist()
-        # Add a years array for frontend filtering
-        years = df[date_col + '_dt'].dt.year.tolist()
+            series = get_kpi_series(file_path)
+        except Exception as e:
+            return jsonify({'error': f'Excel read error: {str(e)}'}), 500
+
+        window = slice_series(series, min_year=2014)
+        dates, values = series['dates'][window], series['values'][window]
+        keep = downsample_indices(date_axis(dates), values, args[0], args[1])
         return jsonify({
-            "x": x,
-            "y": y,
-            "years": years,
-            "date_col": date_col,
-            "drop_col": drop_col,
-            "available_columns": available_cols
+            "x": series['labels'][window][keep].tolist(),
+            "y": json_values(values[keep]),
+            # years array for frontend filtering
+            "years": series['years'][window][keep].tolist(),
+            "date_col": series['date_col'],
+            "drop_col": series['value_col'],
+            "available_columns": series['columns'],
+            "total_points": len(values)
         })
     except Exception as e:
         return jsonify({'error': f'Internal server error: {str(e)}'}), 500
@@ -1348,20 +1711,24 @@ def call_drop_rate_3g_table():
 
 @app.route('/hlr-vlr-subbase-data')
 def hlr_vlr_subbase_data():
-    import pandas as pd
-    from flask import jsonify
-    file_path = os.path.join(data_files_dir, 'HLR_VLR_Subbase.xls')
+    args, error = _downsample_args()
+    if error:
+        return error
+    file_path = os.path.join(data_files_dir, HLR_VLR_FILE)
     try:
-        df = pd.read_excel(file_path, sheet_name='Daily HLR Subs')
-        df = df.rename(columns=lambda x: str(x).strip())
-        x_col = df.columns[0]
-        x = df[x_col].astype(str).tolist()
-        y_series = {col: df[col].replace({pd.NA: None, float('inf'): None, float('-inf'): None}).tolist() for col in df.columns[1:]}
+        series = get_hlr_vlr_series(file_path)
+        y_cols = series['y_cols']
+        total_points = len(series['dates'])
+        # Daily rows: position is the x axis; keep every series' peaks
+        keep = downsample_union(np.arange(total_points), [series['values'][col] for col in y_cols], args[0], args[1]) if args[0] else slice(None)
         return jsonify({
-            "x": x,
-            "y_series": y_series,
-            "x_col": x_col,
-            "y_cols": list(df.columns[1:])
+            "x": series['labels'][keep].tolist(),
+            "y_series": {col: json_values(series['values'][col][keep]) for col in y_cols},
+            "rolling": {col: {name: json_values(values[keep]) for name, values in series['rolling'][col].items()} for col in y_cols},
+            "latest": latest_growth(series),
+            "x_col": series['x_col'],
+            "y_cols": y_cols,
+            "total_points": total_points
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1406,6 +1773,26 @@ def lte_utilization_data():
     except Exception as e:
         return jsonify({'error': f'Error fetching LTE utilization data: {str(e)}'}), 500
 
+@app.route('/lte-utilization-data/export')
+def lte_utilization_export():
+    """Stream the (optionally filtered) LTE utilization table as CSV or NDJSON"""
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"Unsupported export format '{export_format}'"}), 400
+    if lte_utilization_df is None:
+        return jsonify({'error': 'LTE utilization data not available'}), 404
+
+    filters = {
+        'Site ID': request.args.get('site_id', ''),
+        'Cell ID': request.args.get('cell_id', ''),
+        'District': request.args.get('district', ''),
+        'Region': request.args.get('region', '')
+    }
+    sort_by = request.args.get('sort_by', 'Site ID')
+    sort_order = request.args.get('sort_order', 'asc')
+    df = filter_lte_utilization_df(lte_utilization_df, filters, sort_by, sort_order)
+    return streaming_export_response(df, 'lte_utilization', export_format)
+
 @app.route('/lte-utilization-by-site/<site_id>')
 def lte_utilization_by_site(site_id):
     """Get LTE utilization data for a specific Site ID"""
@@ -1475,11 +1862,12 @@ def filter_lte_utilization_data():
             tac_df,
             usage_df,
             USAGE_FILES,
-            VLRD,
+            VLRD_INDEX,
             lambda site_id: fetch_rsrp_data_by_site_id(site_id, zte_rsrp_df, huawei_rsrp_df),
             lambda cell_code: fetch_rsrp_data_directly(cell_code, zte_rsrp_df, huawei_rsrp_df, ref_df),
             lambda site_id: get_lte_utilization_by_site_id(site_id, lte_utilization_df),
-            lambda cell_code: get_lte_utilization_by_cell_code(cell_code, lte_utilization_df)
+            lambda cell_code: get_lte_utilization_by_cell_code(cell_code, lte_utilization_df),
+            ref_version=REF_VERSION
         )
         if "error" in result:
             return jsonify({'error': result["error"]}), 404
@@ -1597,11 +1985,12 @@ def filter_common_lte_data():
         tac_df,
         usage_df,
         USAGE_FILES,
-        VLRD,
+        VLRD_INDEX,
         lambda site_id: fetch_rsrp_data_by_site_id(site_id, zte_rsrp_df, huawei_rsrp_df),
         lambda cell_code: fetch_rsrp_data_directly(cell_code, zte_rsrp_df, huawei_rsrp_df, ref_df),
         lambda site_id: get_lte_utilization_by_site_id(site_id, lte_utilization_df),
-        lambda cell_code: get_lte_utilization_by_cell_code(cell_code, lte_utilization_df)
+        lambda cell_code: get_lte_utilization_by_cell_code(cell_code, lte_utilization_df),
+        ref_version=REF_VERSION
     )
     
     if "error" in result:
@@ -1676,177 +2065,112 @@ def lte_utilization_table():
 
 @app.route('/api/call-drop-rate-chart-data/<msisdn>')
 def call_drop_rate_chart_data(msisdn):
-    """Return 3G Call Drop Rate data as JSON for Chart.js"""
+    """Return 3G Call Drop Rate data as JSON for Chart.js (last 10 records, or the full range downsampled to ?points=N)"""
     if not is_cache_valid(msisdn):
         return jsonify({'error': 'No data cached for this MSISDN'}), 404
+    args, error = _downsample_args()
+    if error:
+        return error
     
     try:
-        # Read the Call Drop Rate data file
-        file_path = os.path.join(data_files_dir, 'Call_Drop_Rate_3G.xls')
+        file_path = os.path.join(data_files_dir, CALL_DROP_RATE_FILE)
         if not os.path.exists(file_path):
             return jsonify({'error': 'Call_Drop_Rate_3G.xls not found'}), 404
 
-        # Try to read sheet 1, fallback to sheet 0 if error
+        # The series is re-parsed per workbook mtime, so the mtime is the data version
+        etag = chart_etag('call_drop_rate', os.path.getmtime(file_path), args)
+        if request.headers.get('If-None-Match') == etag:
+            return '', 304
+
         try:
-            df = pd.read_excel(file_path, sheet_name=1)
-        except Exception:
-            try:
-                df = pd.read_excel(file_path, sheet_name=0)
-            except Exception as e:
-                return jsonify({'error': f'Excel read error: {str(e)}'}), 500
-
-        df = df.rename(columns=lambda x: str(x).strip())
-        
-        # Get the first date column and first data column for chart
-        date_col = df.columns[0]
-        drop_col = '3G Call Drop Rate'
-        if drop_col not in df.columns:
-            # Try alternative column names
-            for col in df.columns:
-                if 'drop' in col.lower() and 'rate' in col.lower():
-                    drop_col = col
-                    break
-        
-        if drop_col not in df.columns:
-            return jsonify({'error': 'Call drop rate column not found'}), 404
-        
-        # Prepare data for Chart.js (limit to last 10 records)
-        df_limited = df.tail(10)
-        labels = df_limited[date_col].astype(str).tolist()
-        data_values = df_limited[drop_col].fillna(0).tolist()
+            series = get_kpi_series(file_path)
+        except Exception as e:
+            return jsonify({'error': f'Excel read error: {str(e)}'}), 500
+
+        # Prepare data for Chart.js (limit to last 10 records unless downsampling)
+        window = slice_series(series, last=None if args[0] else 10)
+        keep = downsample_indices(date_axis(series['dates'][window]), series['values'][window], args[0], args[1])
+        labels = series['labels'][window][keep].tolist()
+        data_values = json_values(series['values'][window][keep], fill=0)
         
-        return jsonify({
-            'type': 'line',
-            'data': {
-                'labels': labels,
-                'datasets': [{
-                    'label': 'Call Drop Rate (%)',
-                    'data': data_values,
-                    'borderColor': 'rgba(255, 99, 132, 1)',
-                    'backgroundColor': 'rgba(255, 99, 132, 0.2)',
-                    'borderWidth': 2,
-                    'fill': False,
-                    'tension': 0.1
-                }]
-            },
-            'options': {
-                'responsive': True,
-                'maintainAspectRatio': True,
-                'aspectRatio': 2,
-                'plugins': {
-                    'title': {
-                        'display': True,
-                        'text': '3G Call Drop Rate Trend',
-                        'font': {
-                            'size': 16
-                        }
-                    },
-                    'legend': {
-                        'display': True,
-                        'position': 'top'
-                    }
-                },
-                'scales': {
-                    'y': {
-                        'beginAtZero': True,
-                        'title': {
-                            'display': True,
-                            'text': 'Drop Rate (%)'
-                        }
-                    },
-                    'x': {
-                        'title': {
-                            'display': True,
-                            'text': 'Date'
-                        }
-                    }
-                }
-            }
-        })
+        return chart_response('call_drop_rate', {
+            'labels': labels,
+            'datasets': [{
+                'label': 'Call Drop Rate (%)',
+                'data': data_values,
+                'borderColor': 'rgba(255, 99, 132, 1)',
+                'backgroundColor': 'rgba(255, 99, 132, 0.2)',
+                'borderWidth': 2,
+                'fill': False,
+                'tension': 0.1
+            }]
+        }, etag)
         
     except Exception as e:
         return jsonify({'error': f'Error processing call drop rate data: {str(e)}'}), 500
 
 @app.route('/api/hlr-vlr-chart-data/<msisdn>')
 def hlr_vlr_chart_data(msisdn):
-    """Return HLR/VLR subscriber data as JSON for Chart.js"""
+    """Return HLR/VLR subscriber data as JSON for Chart.js (last 10 records, or the full range downsampled to ?points=N)"""
     if not is_cache_valid(msisdn):
         return jsonify({'error': 'No data cached for this MSISDN'}), 404
+    args, error = _downsample_args()
+    if error:
+        return error
     
     try:
-        # Read the HLR/VLR data file
-        file_path = os.path.join(data_files_dir, 'HLR_VLR_Subbase.xls')
+        # Cached HLR/VLR series (shared with /hlr-vlr-subbase-data)
+        file_path = os.path.join(data_files_dir, HLR_VLR_FILE)
         if not os.path.exists(file_path):
             return jsonify({'error': 'HLR_VLR_Subbase.xls not found'}), 404
         
-        df = pd.read_excel(file_path, sheet_name='Daily HLR Subs')
-        df = df.rename(columns=lambda x: str(x).strip())
+        # The series follows the workbook mtime, so the mtime is the data version
+        etag = chart_etag('hlr_vlr', os.path.getmtime(file_path), args)
+        if request.headers.get('If-None-Match') == etag:
+            return '', 304
         
-        # Get the date column (first column) and data columns
-        date_col = df.columns[0]
+        series = get_hlr_vlr_series(file_path)
+        colors = ['rgba(54, 162, 235, 0.6)', 'rgba(255, 99, 132, 0.6)', 'rgba(255, 206, 86, 0.6)', 'rgba(75, 192, 192, 0.6)']
+        y_cols = series['y_cols'][:len(colors)]  # Limit to available colors
         
-        # Prepare data for Chart.js (limit to last 10 records)
-        df_limited = df.tail(10)
-        labels = df_limited[date_col].astype(str).tolist()
+        # Prepare data for Chart.js (limit to last 10 records unless downsampling)
+        total_points = len(series['dates'])
+        if args[0]:
+            keep = downsample_union(np.arange(total_points), [series['values'][col] for col in y_cols], args[0], args[1])
+        else:
+            keep = slice(max(total_points - 10, 0), total_points)
+        labels = series['labels'][keep].tolist()
         
         # Get data for each series (excluding the date column)
         datasets = []
-        colors = ['rgba(54, 162, 235, 0.6)', 'rgba(255, 99, 132, 0.6)', 'rgba(255, 206, 86, 0.6)', 'rgba(75, 192, 192, 0.6)']
         
-        for i, col in enumerate(df.columns[1:]):
-            if i < len(colors):  # Limit to available colors
-                data_values = df_limited[col].fillna(0).tolist()
-                datasets.append({
-                    'label': col,
-                    'data': data_values,
-                    'backgroundColor': colors[i],
-                    'borderColor': colors[i].replace('0.6', '1'),
-                    'borderWidth': 1
-                })
+        for i, col in enumerate(y_cols):
+            datasets.append({
+                'label': col,
+                'data': json_values(series['values'][col][keep], fill=0),
+                'backgroundColor': colors[i],
+                'borderColor': colors[i].replace('0.6', '1'),
+                'borderWidth': 1
+            })
         
-        return jsonify({
-            'type': 'bar',
-            'data': {
-                'labels': labels,
-                'datasets': datasets
-            },
-            'options': {
-                'responsive': True,
-                'plugins': {
-                    'title': {
-                        'display': True,
-                        'text': 'HLR/VLR Subscriber Base Trend'
-                    },
-                    'legend': {
-                        'display': True,
-                        'position': 'top'
-                    }
-                },
-                'scales': {
-                    'y': {
-                        'beginAtZero': True,
-                        'title': {
-                            'display': True,
-                            'text': 'Subscriber Count'
-                        }
-                    },
-                    'x': {
-                        'title': {
-                            'display': True,
-                            'text': 'Date'
-                        }
-                    }
-                }
-            }
-        })
+        return chart_response('hlr_vlr', {
+            'labels': labels,
+            'datasets': datasets
+        }, etag, extra={'latest': latest_growth(series)})
         
     except Exception as e:
         return jsonify({'error': f'Error processing HLR/VLR data: {str(e)}'}), 500
 
-# Dash apps removed - now using Chart.js for lightweight visualization
-# dash_app = create_dash_app(app, latest_result)
+# Per-MSISDN usage dashboard (/usage-graph/?msisdn=...), mounted on the Flask app when Dash is installed
+try:
+    from usage_graphs import create_dash_app
+except ImportError:
+    print("[USAGE] Dash not installed; /usage-graph/ dashboard disabled")
+else:
+    usage_dash_app = create_dash_app(app, lambda: get_usage_arrays(usage_df, USAGE_FILES, USAGE_VERSION))
+
+# Other Dash apps removed - now using Chart.js for lightweight visualization
 # application = DispatcherMiddleware(app.wsgi_app, {
-#     '/usage-graph': dash_app.server,
 #     '/call-drop-rate-graph': call_drop_rate_dash_app.server,
 #     '/hlr-vlr-subbase-graph': hlr_vlr_subbase_dash_app.server,
 # })
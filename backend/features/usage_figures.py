@@ -0,0 +1,161 @@
+# usage_figures.py
+"""
+Per-MSISDN monthly usage arrays and the usage dashboard's figure JSON.
+
+The monthly usage files are grouped once into (subscriber x month) NumPy
+arrays per metric. A subscriber's usage is a searchsorted lookup plus a row
+slice, rather than a scan of usage_df. Figures are built as plain Plotly
+JSON dicts (no plotly objects) and kept in a small LRU keyed by MSISDN and
+data version. Repeat views and concurrent users get the prebuilt dicts.
+"""
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+# "Monthly Usage" key -> usage file column (upper-cased by the loader)
+USAGE_METRICS = {
+    '2G': 'VOLUME_2G_MB',
+    '3G': 'VOLUME_3G_MB',
+    '4G': 'VOLUME_4G_MB',
+    '5G': 'VOLUME_5G_MB',
+    'outgoing_voice': 'OUTGOING_VOICE',
+    'incoming_voice': 'INCOMING_VOICE',
+    'outgoing_sms': 'OUTGOING_SMS',
+    'incoming_sms': 'INCOMING_SMS',
+}
+VOICE_METRICS = ('outgoing_voice', 'incoming_voice')
+FIGURE_CACHE_SIZE = 128
+NO_DATA_TEXT = 'No data available. Please search for an MSISDN first.'
+
+_usage_arrays_cache = {}
+_figure_cache = OrderedDict()  # (version, msisdn) -> figures, least recently used first
+_figure_lock = threading.Lock()
+
+
+def build_usage_arrays(usage_df, usage_files):
+    """Sorted MSISDNs, months in calendar order and a (subscriber x month) array per metric"""
+    months = sorted(usage_files, key=lambda m: (usage_files[m]['year'], usage_files[m]['month']))
+    df = usage_df.assign(MSISDN=pd.to_numeric(usage_df['MSISDN'], errors='coerce')).dropna(subset=['MSISDN'])
+    columns = [c for c in USAGE_METRICS.values() if c in df.columns]
+    grouped = df.groupby(['MSISDN', 'MONTH'])[columns].sum()
+    msisdns = np.unique(grouped.index.get_level_values('MSISDN').to_numpy(dtype=np.int64))
+    rows = np.searchsorted(msisdns, grouped.index.get_level_values('MSISDN').to_numpy(dtype=np.int64))
+    month_pos = {m: i for i, m in enumerate(months)}
+    cols = grouped.index.get_level_values('MONTH').map(month_pos).to_numpy(dtype=float)
+    known = ~np.isnan(cols)
+    arrays = {}
+    for key, column in USAGE_METRICS.items():
+        table = np.zeros((len(msisdns), len(months)))
+        if column in grouped.columns:
+            table[rows[known], cols[known].astype(np.int64)] = grouped[column].to_numpy(dtype=float)[known]
+        arrays[key] = table
+    return {'msisdns': msisdns, 'months': months, 'metrics': arrays}
+
+
+def get_usage_arrays(usage_df, usage_files, data_version):
+    """Usage arrays for usage_df, rebuilt when data_version (the caller's version of usage_df, e.g. file mtimes) changes"""
+    version = (data_version, tuple(usage_files))
+    if _usage_arrays_cache.get('version') != version:
+        arrays = build_usage_arrays(usage_df, usage_files)
+        arrays['version'] = version
+        _usage_arrays_cache['arrays'] = arrays
+        _usage_arrays_cache['version'] = version
+        print(f"[USAGE] Indexed {len(arrays['msisdns'])} subscribers x {len(arrays['months'])} months")
+    return _usage_arrays_cache['arrays']
+
+
+def monthly_usage(arrays, msisdn):
+    """The subscriber's "Monthly Usage" dict (same layout as get_msisdn_data), or None when not in the usage files"""
+    try:
+        msisdn = int(msisdn)
+    except (TypeError, ValueError):
+        return None
+    row = int(np.searchsorted(arrays['msisdns'], msisdn))
+    if row >= len(arrays['msisdns']) or arrays['msisdns'][row] != msisdn:
+        return None
+    usage = {'months': list(arrays['months'])}
+    for key, table in arrays['metrics'].items():
+        values = table[row]
+        # get_msisdn_data rounds voice minutes and truncates volumes/counts
+        usage[key] = np.round(values, 2).tolist() if key in VOICE_METRICS else np.trunc(values).astype(np.int64).tolist()
+    usage['Total'] = [sum(v) for v in zip(usage['2G'], usage['3G'], usage['4G'], usage['5G'])]
+    return usage
+
+
+def _layout(title, yaxis_title, **extra):
+    return {'title': {'text': title}, 'xaxis': {'title': {'text': 'Month'}},
+            'yaxis': {'title': {'text': yaxis_title}, **extra}, 'template': 'plotly_white'}
+
+
+def _empty_figure(title, yaxis_title):
+    layout = _layout(f'{title} - No Data', yaxis_title, showticklabels=False)
+    layout['xaxis']['showticklabels'] = False
+    layout['annotations'] = [{'text': NO_DATA_TEXT, 'xref': 'paper', 'yref': 'paper', 'x': 0.5, 'y': 0.5,
+                              'xanchor': 'center', 'yanchor': 'middle', 'showarrow': False,
+                              'font': {'size': 16, 'color': 'gray'}}]
+    return {'data': [], 'layout': layout}
+
+
+def _line(x, y, name):
+    return {'type': 'scatter', 'x': x, 'y': y, 'mode': 'lines+markers', 'name': name}
+
+
+def _gb(values):
+    return np.round(np.asarray(values, dtype=float) / 1024, 2).tolist()
+
+
+# graph id -> (title, y axis title); also the no-data figures, built once
+FIGURE_TITLES = {
+    'usage-graph': ('Monthly Usage by Network Type', 'Usage (GB)'),
+    'total-usage-graph': ('Total Monthly Usage', 'Total Usage (GB)'),
+    'voice-usage-graph': ('Monthly Incoming & Outgoing Voice Usage', 'Voice Minutes'),
+    'sms-usage-graph': ('Monthly Incoming & Outgoing SMS Usage', 'SMS Count'),
+}
+EMPTY_FIGURES = {graph: _empty_figure(*titles) for graph, titles in FIGURE_TITLES.items()}
+
+
+def build_usage_figures(usage):
+    """graph id -> Plotly figure JSON for one subscriber's monthly usage"""
+    if not usage or not usage.get('months'):
+        return EMPTY_FIGURES
+    months = usage['months']
+    titles = FIGURE_TITLES
+    return {
+        'usage-graph': {
+            'data': [_line(months, _gb(usage[tech]), tech) for tech in ('2G', '3G', '4G', '5G') if usage.get(tech)],
+            'layout': _layout(*titles['usage-graph'], tickformat='.2f'),
+        },
+        'total-usage-graph': {
+            'data': [{'type': 'bar', 'x': months, 'y': _gb(usage['Total']), 'name': 'Total Usage'}] if usage.get('Total') else [],
+            'layout': _layout(*titles['total-usage-graph'], tickformat='.2f'),
+        },
+        'voice-usage-graph': {
+            'data': [_line(months, usage['incoming_voice'], 'Incoming Voice'),
+                     _line(months, usage['outgoing_voice'], 'Outgoing Voice')],
+            'layout': _layout(*titles['voice-usage-graph']),
+        },
+        'sms-usage-graph': {
+            'data': [_line(months, usage[key], name) for key, name in (('incoming_sms', 'Incoming SMS'), ('outgoing_sms', 'Outgoing SMS'))
+                     if usage.get(key)],
+            'layout': _layout(*titles['sms-usage-graph']),
+        },
+    }
+
+
+def get_usage_figures(arrays, msisdn, max_entries=FIGURE_CACHE_SIZE):
+    """Figure JSON for the subscriber from the LRU, built from the usage arrays on a miss"""
+    key = (arrays['version'], str(msisdn))
+    with _figure_lock:
+        figures = _figure_cache.get(key)
+        if figures is not None:
+            _figure_cache.move_to_end(key)
+            return figures
+    # Built outside the lock; two concurrent misses for one MSISDN just build it twice
+    figures = build_usage_figures(monthly_usage(arrays, msisdn))
+    with _figure_lock:
+        _figure_cache[key] = figures
+        _figure_cache.move_to_end(key)
+        while len(_figure_cache) > max_entries:
+            _figure_cache.popitem(last=False)
+    return figures
@@ -4,13 +4,16 @@
 import folium
 from folium import Map, Marker, Popup, Icon, Element
 
-def create_location_map(result_data):
+def create_location_map(result_data, show_msisdn=True):
+    # show_msisdn=False renders a map shareable by every subscriber on the same cell
     try:
         lat = result_data.get('Lat', 'Not Found')
         lon = result_data.get('Lon', 'Not Found')
         sitename = result_data.get('Sitename', 'Unknown Site')
         district = result_data.get('District', 'Unknown District')
         msisdn = result_data.get('MSISDN', 'Unknown')
+        msisdn_row = f"<tr><td><strong>MSISDN:</strong></td><td>{msisdn}</td></tr>" if show_msisdn else ""
+        msisdn_line = f"<p><strong>MSISDN:</strong> {msisdn}</p>" if show_msisdn else ""
         default_lat, default_lon = 7.8731, 80.7718 # Default to Colombo
         if lat != 'Not Found' and lon != 'Not Found':
             try:
@@ -38,7 +41,7 @@ def create_location_map(result_data):
                 📱 User Location
             </h5>
             <table style='width: 100%; font-size: 12px;'>
-                <tr><td><strong>MSISDN:</strong></td><td>{msisdn}</td></tr>
+                {msisdn_row}
                 <tr><td><strong>Site:</strong></td><td>{sitename}</td></tr>
                 <tr><td><strong>District:</strong></td><td>{district}</td></tr>
                 <tr><td><strong>Region:</strong></td><td>{result_data.get('Region', 'Unknown')}</td></tr>
@@ -53,7 +56,7 @@ def create_location_map(result_data):
             folium.Marker(
                 location=[center_lat, center_lon],
                 popup=folium.Popup(popup_content, max_width=320),
-                tooltip=f"👤 User: {msisdn} | {district}",
+                tooltip=f"👤 User: {msisdn} | {district}" if show_msisdn else f"👤 User | {district}",
                 icon=folium.Icon(
                     color='red', 
                     icon='user', 
@@ -68,7 +71,7 @@ def create_location_map(result_data):
                     <div style='width: 200px;'>
                         <h6 style='color: #FF5722;'>Location Not Found</h6>
                         <p>Showing default Sri Lanka location</p>
-                        <p><strong>MSISDN:</strong> {msisdn}</p>
+                        {msisdn_line}
                         <p><strong>Coordinates:</strong> Not available</p>
                     </div>
                     """, 
@@ -110,3 +113,77 @@ def create_location_map(result_data):
             icon=folium.Icon(color='red', icon='exclamation-triangle', prefix='fa')
         ).add_to(map_obj)
         return map_obj
+
+# Client-rendered map payloads (static Leaflet page + JSON instead of folium HTML)
+DEFAULT_CENTER = [7.8731, 80.7718]
+
+def _marker_position(result_data):
+    lat = result_data.get('Lat', 'Not Found')
+    lon = result_data.get('Lon', 'Not Found')
+    if lat == 'Not Found' or lon == 'Not Found':
+        return None
+    try:
+        return [float(lat), float(lon)]
+    except (ValueError, TypeError):
+        return None
+
+def build_location_map_data(result_data):
+    """Markers, popup rows and legend for one subscriber, in the shape location_map.js renders"""
+    msisdn = str(result_data.get('MSISDN', 'Unknown'))
+    sitename = result_data.get('Sitename', 'Unknown Site')
+    district = result_data.get('District', 'Unknown District')
+    region = result_data.get('Region', 'Unknown')
+    position = _marker_position(result_data)
+    if position is not None:
+        marker = {
+            'position': position,
+            'color': 'red',
+            'icon': 'user',
+            'tooltip': f"👤 User: {msisdn} | {district}",
+            'title': '📱 User Location',
+            'rows': [
+                ['MSISDN', msisdn],
+                ['Site', sitename],
+                ['District', district],
+                ['Region', region],
+                ['Cell Code', result_data.get('Cellcode', 'Unknown')],
+                ['LAC', result_data.get('LAC', 'Unknown')],
+                ['SAC', result_data.get('SAC', 'Unknown')],
+                ['Coordinates', f"{position[0]}, {position[1]}"],
+            ],
+        }
+    else:
+        marker = {
+            'position': DEFAULT_CENTER,
+            'color': 'gray',
+            'icon': 'question-circle',
+            'tooltip': 'Location not available',
+            'title': 'Location Not Found',
+            'note': 'Showing default Sri Lanka location',
+            'rows': [['MSISDN', msisdn], ['Coordinates', 'Not available']],
+        }
+    return {
+        'center': position or DEFAULT_CENTER,
+        'zoom': 12 if position is not None else 7,
+        'found_location': position is not None,
+        'markers': [marker],
+        'legend': [['District', district], ['Region', region]],
+    }
+
+def build_error_map_data(msisdn, error):
+    """Default-location payload carrying an error marker"""
+    return {
+        'center': DEFAULT_CENTER,
+        'zoom': 7,
+        'found_location': False,
+        'markers': [{
+            'position': DEFAULT_CENTER,
+            'color': 'red',
+            'icon': 'exclamation-triangle',
+            'tooltip': 'Error',
+            'title': 'Map Error',
+            'note': f"Error: {error}",
+            'rows': [['MSISDN', str(msisdn)]],
+        }],
+        'legend': [],
+    }
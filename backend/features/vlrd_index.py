@@ -0,0 +1,86 @@
+# vlrd_index.py
+"""
+Read-only VLRD index: the VLRD rows sorted by MSISDN, with every cell code
+pre-joined to its reference coordinates.
+
+Each column is held as a NumPy array with writeable=False, and a subscriber's
+rows form one contiguous range located with a binary search. Lookups return
+views into those arrays, so no row is copied and no caller can mutate the
+shared data.
+"""
+import numpy as np
+import pandas as pd
+
+VLRD_COLUMNS = ['CELL_CODE', 'SITE_NAME', 'DISTRICT', 'LAC', 'CELL']
+
+
+def _read_only(values):
+    array = np.array(values, copy=True)
+    array.flags.writeable = False
+    return array
+
+
+def build_vlrd_index(VLRD, ref_df=None, version=None):
+    """
+    Sort VLRD by MSISDN once and attach LON/LAT from the reference cell list.
+    version identifies the source data (e.g. file mtimes) for caches built on the index.
+    """
+    if VLRD is None or VLRD.empty or 'MSISDN' not in VLRD.columns:
+        frame = pd.DataFrame(columns=['MSISDN'] + VLRD_COLUMNS + ['LON', 'LAT'])
+    else:
+        frame = VLRD.copy()
+        frame['MSISDN'] = pd.to_numeric(frame['MSISDN'], errors='coerce')
+        frame = frame[frame['MSISDN'].notna()]
+        frame['MSISDN'] = frame['MSISDN'].astype(np.int64)
+        for col in VLRD_COLUMNS:
+            if col not in frame.columns:
+                frame[col] = 'Unknown'
+        if ref_df is not None and not ref_df.empty and 'CELL_CODE' in VLRD.columns:
+            # First reference row per cell code, same as ref_df[...].iloc[0]
+            coords = ref_df.drop_duplicates('cellcode')[['cellcode', 'lon', 'lat']]
+            frame = frame.merge(coords, left_on='CELL_CODE', right_on='cellcode', how='left')
+            frame = frame.rename(columns={'lon': 'LON', 'lat': 'LAT'})
+        else:
+            frame['LON'] = np.nan
+            frame['LAT'] = np.nan
+        frame = frame.sort_values('MSISDN', kind='mergesort')
+
+    columns = {}
+    for col in VLRD_COLUMNS + ['LON', 'LAT']:
+        values = frame[col].astype(object)
+        if col in ('LON', 'LAT'):
+            values = values.where(frame[col].notna(), 'Not Found')
+        columns[col] = _read_only(values.to_numpy())
+    return {
+        'msisdn': _read_only(frame['MSISDN'].to_numpy(dtype=np.int64)),
+        'columns': columns,
+        'size': len(frame),
+        'version': version,
+    }
+
+
+def is_vlrd_index(obj):
+    return isinstance(obj, dict) and 'msisdn' in obj and 'columns' in obj
+
+
+def get_row_range(index, msisdn):
+    """Return (start, end) of the MSISDN's rows in the sorted index"""
+    try:
+        key = np.int64(int(msisdn))
+    except (TypeError, ValueError):
+        return 0, 0
+    keys = index['msisdn']
+    return int(np.searchsorted(keys, key, side='left')), int(np.searchsorted(keys, key, side='right'))
+
+
+def get_common_cells(index, msisdn):
+    """Return the subscriber's VLRD rows as {column: read-only array view}"""
+    start, end = get_row_range(index, msisdn)
+    return {col: values[start:end] for col, values in index['columns'].items()}
+
+
+def iter_common_cells(index, msisdn):
+    """Yield one dict per VLRD row of the subscriber, in the shape used by get_msisdn_data"""
+    cells = get_common_cells(index, msisdn)
+    for i in range(len(cells['CELL_CODE'])):
+        yield {col: cells[col][i] for col in cells}
@@ -0,0 +1,58 @@
+// Renders the JSON payload from /api/map-data/<msisdn> (passed as ?data=<url>) with Leaflet
+(function () {
+  const MARKER_COLORS = { red: '#d63e2a', gray: '#575757', blue: '#38aadd', green: '#72b026' };
+
+  function escapeHtml(value) {
+    const div = document.createElement('div');
+    div.textContent = value === null || value === undefined ? '' : String(value);
+    return div.innerHTML;
+  }
+
+  function popupHtml(marker) {
+    const rows = (marker.rows || [])
+      .map(([label, value]) => `<tr><td><strong>${escapeHtml(label)}:</strong></td><td>${escapeHtml(value)}</td></tr>`)
+      .join('');
+    const note = marker.note ? `<p>${escapeHtml(marker.note)}</p>` : '';
+    return `<div class="map-popup"><h5>${escapeHtml(marker.title)}</h5>${note}<table>${rows}</table></div>`;
+  }
+
+  function addLegend(map, legend) {
+    if (!legend || !legend.length) return;
+    const control = L.control({ position: 'topright' });
+    control.onAdd = function () {
+      const div = L.DomUtil.create('div', 'map-legend');
+      div.innerHTML = legend.map(([label, value]) => `<strong>${escapeHtml(label)}:</strong> ${escapeHtml(value)}`).join('<br>');
+      return div;
+    };
+    control.addTo(map);
+  }
+
+  function render(data) {
+    const map = L.map('map').setView(data.center, data.zoom);
+    L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png', {
+      maxZoom: 19,
+      attribution: '&copy; OpenStreetMap contributors'
+    }).addTo(map);
+    (data.markers || []).forEach(marker => {
+      const color = MARKER_COLORS[marker.color] || marker.color || MARKER_COLORS.blue;
+      L.circleMarker(marker.position, { radius: 9, color: color, fillColor: color, fillOpacity: 0.8 })
+        .bindPopup(popupHtml(marker), { maxWidth: 320 })
+        .bindTooltip(escapeHtml(marker.tooltip))
+        .addTo(map);
+    });
+    addLegend(map, data.legend);
+  }
+
+  const dataUrl = new URLSearchParams(window.location.search).get('data');
+  if (!dataUrl) {
+    render({ center: [7.8731, 80.7718], zoom: 7, markers: [], legend: [] });
+    return;
+  }
+  fetch(dataUrl, { credentials: 'same-origin' })
+    .then(response => response.json())
+    .then(render)
+    .catch(error => {
+      console.error('Error loading map data:', error);
+      render({ center: [7.8731, 80.7718], zoom: 7, markers: [], legend: [['Error', 'Map data unavailable']] });
+    });
+})();
@@ -0,0 +1,90 @@
+// Network-wide site map: fetches server-clustered GeoJSON for the current view from /api/network-map
+(function () {
+  const DATA_URL = '/api/network-map';
+  const LEGENDS = {
+    rsrp: [['#2e7d32', 'Good (>= 80% above -110 dBm)'], ['#f9a825', 'Fair (60-80%)'], ['#c62828', 'Poor (< 60%)'], ['#9e9e9e', 'No RSRP data']],
+    utilization: [['#2e7d32', 'Low (< 50%)'], ['#f9a825', 'Medium (50-80%)'], ['#c62828', 'High (>= 80%)'], ['#9e9e9e', 'No utilization data']]
+  };
+  let colorBy = 'rsrp';
+  let lastData = null;
+  let requestId = 0;
+
+  const map = L.map('map').setView([7.8731, 80.7718], 7);
+  L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png', {
+    maxZoom: 19,
+    attribution: '&copy; OpenStreetMap contributors'
+  }).addTo(map);
+  const layer = L.layerGroup().addTo(map);
+
+  function escapeHtml(value) {
+    const div = document.createElement('div');
+    div.textContent = value === null || value === undefined ? '' : String(value);
+    return div.innerHTML;
+  }
+
+  function popupHtml(p) {
+    const rsrp = p.good_rsrp_pct === null ? 'N/A' : `${p.good_rsrp_pct}%`;
+    const util = p.cell_utilization_pct === null ? 'N/A' : `${p.cell_utilization_pct}%`;
+    if (p.cluster) {
+      return `<strong>${p.count} sites</strong><br>Avg RSRP > -110 dBm: ${rsrp}<br>Avg cell utilization: ${util}` +
+        `<br>Poor RSRP sites: ${p.poor_rsrp_sites}<br>High utilization sites: ${p.high_util_sites}`;
+    }
+    return `<strong>${escapeHtml(p.sitename)}</strong> (${escapeHtml(p.site_id)})<br>District: ${escapeHtml(p.district)}` +
+      `<br>RSRP > -110 dBm: ${rsrp}<br>Cell utilization: ${util}`;
+  }
+
+  function render() {
+    layer.clearLayers();
+    if (!lastData) return;
+    lastData.features.forEach(feature => {
+      const p = feature.properties;
+      const [lon, lat] = feature.geometry.coordinates;
+      const color = colorBy === 'rsrp' ? p.rsrp_color : p.utilization_color;
+      const radius = p.cluster ? Math.min(8 + Math.sqrt(p.count) * 2, 30) : 6;
+      const marker = L.circleMarker([lat, lon], { radius: radius, color: color, fillColor: color, fillOpacity: 0.7, weight: 1 })
+        .bindPopup(popupHtml(p));
+      if (p.cluster) {
+        marker.bindTooltip(String(p.count), { permanent: true, direction: 'center', className: 'cluster-count' });
+        marker.on('dblclick', () => map.setView([lat, lon], map.getZoom() + 2));
+      }
+      marker.addTo(layer);
+    });
+  }
+
+  function load() {
+    const b = map.getBounds();
+    const bbox = [b.getWest(), b.getSouth(), b.getEast(), b.getNorth()].map(v => v.toFixed(4)).join(',');
+    const id = ++requestId;
+    fetch(`${DATA_URL}?bbox=${bbox}&zoom=${map.getZoom()}`, { credentials: 'same-origin' })
+      .then(response => response.json())
+      .then(data => {
+        if (id !== requestId) return; // a newer view was requested meanwhile
+        lastData = data;
+        render();
+      })
+      .catch(error => console.error('Error loading network map:', error));
+  }
+
+  const control = L.control({ position: 'topright' });
+  control.onAdd = function () {
+    const div = L.DomUtil.create('div', 'map-control');
+    L.DomEvent.disableClickPropagation(div);
+    div.innerHTML = '<label><input type="radio" name="colorBy" value="rsrp" checked> RSRP quality</label><br>' +
+      '<label><input type="radio" name="colorBy" value="utilization"> LTE utilization</label><div class="legend mt-1"></div>';
+    const legend = div.querySelector('.legend');
+    const drawLegend = () => {
+      legend.innerHTML = LEGENDS[colorBy].map(([c, label]) => `<span class="legend-swatch" style="background:${c}"></span>${label}`).join('<br>');
+    };
+    div.querySelectorAll('input').forEach(input => input.addEventListener('change', event => {
+      colorBy = event.target.value;
+      drawLegend();
+      render();
+    }));
+    drawLegend();
+    return div;
+  };
+  control.addTo(map);
+
+  map.on('moveend', load);
+  load();
+})();